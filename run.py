@@ -10,6 +10,12 @@ SRC_DIR = os.path.join(ROOT, "src")
 
 process1 = None
 process2 = None
+stt_process = None
+
+# Set NAO_STT_SERVER (e.g. "127.0.0.1:5010") to have the sidecar use a shared
+# stt_server.py, started here; further reception points can then run their own
+# body.py / sidecar.py pair against it (NAO_BODY_URL, NAO_MIC_INDEX, NAO_KIOSK).
+STT_SERVER = os.environ.get("NAO_STT_SERVER")
 
 def run_python2_script():
     global process1
@@ -25,6 +31,14 @@ def run_python3_script():
         cwd=SRC_DIR
     )
 
+def start_stt_server():
+    global stt_process
+    port = STT_SERVER.rpartition(":")[2]
+    stt_process = subprocess.Popen(
+        ["python3", "stt_server.py", "--port", port],
+        cwd=SRC_DIR
+    )
+
 def terminate_processes(signal_received, frame):
     """Handles termination when Ctrl+C is pressed."""
     print("\nTerminating processes...")
@@ -37,12 +51,19 @@ def terminate_processes(signal_received, frame):
         process2.terminate()  # Terminate Python 3 process
         process2.wait()
 
+    if stt_process:
+        stt_process.terminate()
+        stt_process.wait()
+
     sys.exit(0)  # Exit cleanly
 
 if __name__ == "__main__":
     # Register signal handler for Ctrl+C
     signal.signal(signal.SIGINT, terminate_processes)
 
+    if STT_SERVER:
+        start_stt_server()
+
     p1 = multiprocessing.Process(target=run_python2_script)
     p2 = multiprocessing.Process(target=run_python3_script)
 
@@ -0,0 +1,306 @@
+"""
+Audio helpers shared by the sidecar capture loop.
+
+Everything here works on plain NumPy int16 blocks so it can be exercised
+without a microphone attached.
+"""
+
+from __future__ import annotations
+import functools
+import math
+import threading
+import numpy as np
+
+WHISPER_SR = 16000      # faster-whisper expects 16 kHz mono float32
+
+
+def block_rms(block: np.ndarray) -> float:
+    """RMS level of an int16 block, normalised so full scale = 1.0."""
+    if block.size == 0:
+        return 0.0
+    x = block.astype(np.float32)
+    return math.sqrt(float(np.dot(x, x)) / x.size) / 32768.0
+
+
+def block_levels(pcm: np.ndarray, block_size: int) -> np.ndarray:
+    """block_rms of every whole block of an int16 buffer, in one pass."""
+    n = len(pcm) // block_size
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    x = pcm[:n * block_size].astype(np.float32).reshape(n, block_size)
+    return np.sqrt(np.einsum("ij,ij->i", x, x) / block_size) / 32768.0
+
+
+def noise_level(pcm: np.ndarray, block_size: int) -> float:
+    """Median block level of ambient audio: a noise floor that a short sound does not move."""
+    levels = block_levels(pcm, block_size)
+    return float(np.median(levels)) if levels.size else 0.0
+
+
+@functools.lru_cache(maxsize=8)
+def _lowpass_taps(sr_in: int, sr_out: int, num_taps: int = 63) -> np.ndarray:
+    """Hann-windowed sinc anti-aliasing filter for downsampling sr_in -> sr_out."""
+    cutoff = 0.5 * sr_out / sr_in * 0.9          # a little below the new Nyquist
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def to_int16(audio: np.ndarray) -> np.ndarray:
+    """
+    int16 PCM of int16 or float ([-1, 1], clipped) audio, the two formats
+    resample() accepts; anything else is a TypeError
+    """
+    if audio.dtype == np.int16:
+        return np.ascontiguousarray(audio)
+    if np.issubdtype(audio.dtype, np.floating):
+        return (np.clip(audio, -1.0, 1.0) * 32767.0).astype(np.int16)
+    raise TypeError(f"expected int16 PCM or float audio in [-1, 1], got {audio.dtype}")
+
+
+def resample(audio: np.ndarray, sr_in: int, sr_out: int = WHISPER_SR) -> np.ndarray:
+    """
+    Vectorized resampler for the STT path.
+    - Accepts int16 PCM or float32 in [-1, 1]; always returns float32
+    - Downsampling low-passes first; integer ratios (48k -> 16k) are a plain
+      decimation, others (44.1k -> 16k) use linear interpolation
+    """
+    if audio.dtype == np.int16:
+        x = audio.astype(np.float32) / 32768.0
+    else:
+        x = np.asarray(audio, dtype=np.float32)
+
+    if sr_in == sr_out or x.size == 0:
+        return x
+
+    if sr_out < sr_in:
+        x = np.convolve(x, _lowpass_taps(sr_in, sr_out), mode="same")
+
+    if sr_in % sr_out == 0:
+        return np.ascontiguousarray(x[::sr_in // sr_out])
+
+    n_out = int(round(x.size * sr_out / sr_in))
+    t = np.arange(n_out, dtype=np.float64) * (sr_in / sr_out)
+    return np.interp(t, np.arange(x.size), x).astype(np.float32)
+
+
+class Endpointer:
+    """
+    Cheap energy-based voice-activity endpointing.
+
+    - Feed fixed-size int16 blocks with push(), in stream order
+    - A block is speech when its RMS clears both VAD threshold and
+      noise_ratio x the running noise floor (adapted on silent blocks)
+    - Returns (start, end) absolute sample offsets once trailing silence
+      reaches hangover_ms, or the utterance hits max_utterance_s
+    - Utterances with less than min_speech_ms of speech are dropped (clicks, coughs)
+    """
+    def __init__(self, sample_rate: int, block_size: int,
+                 hangover_ms: float = 700, max_utterance_s: float = 15.0,
+                 pre_roll_ms: float = 300, min_speech_ms: float = 250,
+                 threshold: float = 0.015, noise_ratio: float = 3.0):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        block_ms = 1000.0 * block_size / sample_rate
+        self.block_ms = block_ms
+        self.hangover_blocks = max(1, math.ceil(hangover_ms / block_ms))
+        self.pre_roll_samples = int(math.ceil(pre_roll_ms / block_ms)) * block_size
+        self.min_speech_blocks = max(1, math.ceil(min_speech_ms / block_ms))
+        self.max_samples = int(max_utterance_s * sample_rate)
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.noise_floor = threshold / noise_ratio
+
+        self.pos = 0            # samples consumed so far
+        self.start = None       # start offset of the open utterance (None = idle)
+        self.speech_blocks = 0
+        self.silent_run = 0
+        self.trailing_ms = 0.0  # hangover paid by the last closed utterance
+
+    def reset(self, pos: int):
+        """Drop any open utterance and continue from absolute sample offset pos."""
+        self.pos = pos
+        self.start = None
+        self.speech_blocks = 0
+        self.silent_run = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self.start is not None
+
+    def is_speech(self, rms: float) -> bool:
+        return rms > max(self.threshold, self.noise_floor * self.noise_ratio)
+
+    def speech_ms(self, pcm: np.ndarray) -> float:
+        """Milliseconds of a buffer whose blocks would count as speech right now."""
+        levels = block_levels(pcm, self.block_size)
+        floor = max(self.threshold, self.noise_floor * self.noise_ratio)
+        return float(np.count_nonzero(levels > floor)) * self.block_ms
+
+    def cut(self):
+        """Close the open utterance here: its (start, end), or None if too little speech."""
+        return self._close() if self.start is not None else None
+
+    def push(self, block: np.ndarray):
+        rms = block_rms(block)
+        speech = self.is_speech(rms)
+        block_start = self.pos
+        self.pos += len(block)
+
+        if self.start is None:
+            if not speech:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+                return None
+            self.start = max(0, block_start - self.pre_roll_samples)
+            self.speech_blocks = 1
+            self.silent_run = 0
+            return None
+
+        if speech:
+            self.speech_blocks += 1
+            self.silent_run = 0
+        else:
+            self.silent_run += 1
+
+        if self.silent_run < self.hangover_blocks and self.pos - self.start < self.max_samples:
+            return None
+        return self._close()
+
+    def _close(self):
+        span = (self.start, self.pos)
+        enough = self.speech_blocks >= self.min_speech_blocks
+        self.trailing_ms = self.silent_run * self.block_ms
+        self.start = None
+        self.speech_blocks = 0
+        self.silent_run = 0
+        return span if enough else None
+
+
+class RingBuffer:
+    """
+    Fixed-size int16 ring buffer, written by the PortAudio callback.
+
+    - Storage is mirrored (every sample is stored twice, `capacity` apart), so
+      any window of up to `capacity` samples is one contiguous slice and
+      view() never has to copy
+    - Positions are absolute sample counts since the stream started
+    - Views alias the live buffer: consume (or copy) them before the writer
+      laps them, i.e. within `capacity` samples
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = np.zeros(2 * capacity, dtype=np.int16)
+        self.write_pos = 0
+        self._cond = threading.Condition()
+
+    def write(self, samples: np.ndarray):
+        cap = self.capacity
+        n = len(samples)
+        skipped = 0
+        if n > cap:
+            skipped = n - cap
+            samples = samples[skipped:]
+            n = cap
+
+        i = (self.write_pos + skipped) % cap
+        first = min(n, cap - i)
+        self._buf[i:i + first] = samples[:first]
+        self._buf[i + cap:i + cap + first] = samples[:first]
+        rest = n - first
+        if rest:
+            self._buf[:rest] = samples[first:]
+            self._buf[cap:cap + rest] = samples[first:]
+
+        with self._cond:
+            self.write_pos += skipped + n
+            self._cond.notify_all()
+
+    def oldest(self) -> int:
+        """Oldest absolute position still held in the buffer."""
+        return max(0, self.write_pos - self.capacity)
+
+    def wait_until(self, pos: int, timeout: float | None = None) -> bool:
+        """Block until at least `pos` samples have been written."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.write_pos >= pos, timeout)
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        """Read-only zero-copy view of samples [start, end)."""
+        if start < self.oldest() or end > self.write_pos or end - start > self.capacity:
+            raise ValueError(
+                f"window [{start}, {end}) not in buffer [{self.oldest()}, {self.write_pos})"
+            )
+        i = start % self.capacity
+        out = self._buf[i:i + (end - start)]
+        out.flags.writeable = False
+        return out
+
+
+class MicStream:
+    """
+    One long-lived PyAudio input stream feeding a RingBuffer through a callback.
+
+    - Opens the device once, at its defaultSampleRate (so no invalid-rate errors)
+    - Keeps capturing while the rest of the pipeline works, so nothing said
+      between utterances is lost
+    """
+    def __init__(self, device_index: int, frames_per_buffer: int = 1024,
+                 ring_seconds: float = 30.0):
+        self.device_index = device_index
+        self.frames_per_buffer = frames_per_buffer
+        self.ring_seconds = ring_seconds
+        self.sample_rate = 0
+        self.ring = None
+        self.overflows = 0
+        self._pa = None
+        self._stream = None
+
+    def open(self) -> "MicStream":
+        import pyaudio
+
+        self._pa = pyaudio.PyAudio()
+        dev_info = self._pa.get_device_info_by_index(self.device_index)
+        self.sample_rate = int(dev_info["defaultSampleRate"])
+        max_in = dev_info.get("maxInputChannels", 0)
+
+        print(f"\n[Record] Using device {self.device_index}: {dev_info.get('name')}")
+        print(f"[Record] defaultSampleRate={self.sample_rate}, maxInputChannels={max_in}")
+
+        if max_in <= 0:
+            self._pa.terminate()
+            raise RuntimeError("Selected device has no input channels (not a mic).")
+
+        self.ring = RingBuffer(int(self.ring_seconds * self.sample_rate))
+        self._continue = pyaudio.paContinue
+        self._stream = self._pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sample_rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+        )
+        self._stream.start_stream()
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status:
+            self.overflows += 1
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return (None, self._continue)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
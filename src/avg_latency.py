@@ -1,26 +1,317 @@
-# quick_latency_summary.py
+# Latency summary for latency_log.csv (and its rotated latency_log.<date>.csv files).
+# A kiosk's own latency_log_<kiosk>.csv is only read when asked for (--kiosk).
+#
+# Streams the rows, so memory does not grow with the log: each metric goes
+# into a mergeable quantile sketch (relative error 1%) instead of a list.
+#
+#   python3 avg_latency.py                                 # latency_log.csv (+ rotated) here
+#   python3 avg_latency.py --kiosk lobby --kiosk lab       # those kiosks' logs instead
+#   python3 avg_latency.py logs/*.csv --by-intent --window 1h   # per clock hour
+#   python3 avg_latency.py --window 1h --step 5m           # last hour, every 5 minutes
+#   python3 avg_latency.py --json today.json
+#   python3 avg_latency.py --baseline last_week.json --max-regression 0.10   # exit 2 if p95 got worse
+import argparse
 import csv
+import glob
+import json
+import math
+import os
+import sys
+import time
 
 LATENCY_CSV = "latency_log.csv"
+METRICS = ["stt_ms", "plan_ms", "speak_ms", "total_ms", "ttfa_ms"]
+QUANTILES = [50, 90, 95, 99]
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+MAX_WINDOWS = 500       # per-window sketches kept; older windows are dropped from the report
+
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch style).
+    - A value x > 0 lands in bucket ceil(log_gamma(x)); any quantile is then
+      within `accuracy` relative error of the true value
+    - Memory is one counter per occupied bucket (a few hundred for
+      millisecond latencies), not per sample
+    - merge() adds another sketch with the same accuracy
+    """
+    def __init__(self, accuracy: float = 0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        self.total += x
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if x <= 0:
+            self.zeros += 1
+            return
+        i = math.ceil(math.log(x) / self._log_gamma)
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+
+    def merge(self, other: "QuantileSketch"):
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        seen = self.zeros
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                # bucket midpoint (in relative terms), clamped to what was seen
+                value = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        out = {"count": self.count, "mean": round(self.total / self.count, 2) if self.count else None}
+        for p in QUANTILES:
+            out[f"p{p}"] = round(self.quantile(p / 100), 2) if self.count else None
+        out["max"] = round(self.max, 2) if self.count else None
+        return out
+
+
+def parse_window(text: str) -> int:
+    """'90s', '15m', '1h', '1d' -> seconds."""
+    unit = text[-1].lower()
+    if unit in WINDOW_UNITS:
+        return int(float(text[:-1]) * WINDOW_UNITS[unit])
+    return int(text)
+
+
+def kiosk_logs(kiosk: str | None = None) -> list:
+    """The live log sidecar.py writes for `kiosk` (None = single kiosk) and a glob of its rotated files."""
+    root, ext = os.path.splitext(f"latency_log_{kiosk}.csv" if kiosk else LATENCY_CSV)
+    return [root + ext, f"{root}.*{ext}"]
+
+
+def log_files(paths, kiosks=()):
+    """
+    Files/globs plus each kiosk's logs; with neither, latency_log.csv and its
+    rotated latency_log.<date>.csv (not the per-kiosk latency_log_<kiosk>.csv).
+    """
+    patterns = list(paths)
+    for kiosk in kiosks:
+        patterns += kiosk_logs(kiosk)
+    files = []
+    for p in patterns or kiosk_logs():
+        # a plain path is kept even if missing, so rows() can warn about it
+        files += sorted(glob.glob(p)) or ([] if glob.has_magic(p) else [p])
+    # rotated files (<log>.<date>.csv) sort before their live <log>.csv
+    return sorted(set(files), key=lambda f: (os.path.basename(f).count(".") < 2, f))
+
+
+def rows(files):
+    for path in files:
+        try:
+            with open(path, newline="") as f:
+                yield from csv.DictReader(f)
+        except FileNotFoundError:
+            print(f"[WARN] {path} not found", file=sys.stderr)
+
+
+class Report:
+    """
+    Sketches per metric: overall, per intent and per time window.
+    - Rolling windows: window_s long, one starting every step_s (aligned to
+      the epoch); a row counts in every window that covers it. step_s
+      defaults to window_s, i.e. non-overlapping windows
+    - Only the newest max_windows windows are kept, so memory stays bounded
+      on a long log; windows_dropped counts the ones evicted
+    """
+    def __init__(self, window_s: int = 0, by_intent: bool = False, accuracy: float = 0.01,
+                 step_s: int = 0, max_windows: int = MAX_WINDOWS):
+        self.window_s = window_s
+        self.step_s = step_s or window_s
+        self.max_windows = max_windows
+        self.windows_dropped = 0
+        self.by_intent = by_intent
+        self.accuracy = accuracy
+        self.rows = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.overall = {}
+        self.intents = {}
+        self.windows = {}
+        self.skipped = {}       # reason -> chunks that never reached STT (source skip:<reason>)
+
+    def _add(self, group: dict, metric: str, value: float):
+        sketch = group.get(metric)
+        if sketch is None:
+            sketch = group[metric] = QuantileSketch(self.accuracy)
+        sketch.add(value)
+
+    def add(self, row: dict):
+        source = row.get("source") or ""
+        if source.startswith("skip:"):
+            st = self.skipped.setdefault(source[5:], {"chunks": 0, "audio_ms": 0.0, "stt_avoided_ms": 0.0})
+            st["chunks"] += 1
+            st["audio_ms"] += _float(row.get("audio_ms")) or 0.0
+            st["stt_avoided_ms"] += _float(row.get("stt_avoided_ms")) or 0.0
+            return
+        self.rows += 1
+        ts = _float(row.get("ts"))
+        if ts is not None:
+            self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+            self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        groups = [self.overall]
+        if self.by_intent:
+            groups.append(self.intents.setdefault(row.get("intent") or "unknown", {}))
+        if self.window_s and ts is not None:
+            start = int(ts // self.step_s * self.step_s)
+            while start > ts - self.window_s:
+                window = self._window(start)
+                if window is not None:
+                    groups.append(window)
+                start -= self.step_s
+        for metric in METRICS:
+            value = _float(row.get(metric))
+            if value is not None:
+                for g in groups:
+                    self._add(g, metric, value)
+
+    def _window(self, start: int):
+        """Sketches of the window starting at `start`; None if it is older than every kept one."""
+        window = self.windows.get(start)
+        if window is None:
+            if len(self.windows) >= self.max_windows:
+                oldest = min(self.windows)
+                if start < oldest:
+                    return None
+                del self.windows[oldest]
+                self.windows_dropped += 1
+            window = self.windows[start] = {}
+        return window
+
+    def to_json(self) -> dict:
+        summarize = lambda group: {m: group[m].summary() for m in METRICS if m in group}
+        out = {"rows": self.rows, "first_ts": self.first_ts, "last_ts": self.last_ts,
+               "accuracy": self.accuracy, "overall": summarize(self.overall)}
+        if self.skipped:
+            out["skipped"] = {k: {m: round(v, 2) for m, v in st.items()} for k, st in self.skipped.items()}
+        if self.by_intent:
+            out["intents"] = {k: summarize(v) for k, v in sorted(self.intents.items())}
+        if self.window_s:
+            out["window_s"] = self.window_s
+            out["step_s"] = self.step_s
+            out["windows_dropped"] = self.windows_dropped
+            out["windows"] = {str(k): summarize(v) for k, v in sorted(self.windows.items())}
+        return out
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def print_table(title: str, group: dict):
+    print(f"\n{title}")
+    print(f"  {'metric':<10}{'n':>7}{'mean':>10}" + "".join(f"{'p' + str(p):>10}" for p in QUANTILES)
+          + f"{'max':>10}")
+    for metric, s in group.items():
+        print(f"  {metric:<10}{s['count']:>7}{s['mean']:>10.1f}"
+              + "".join(f"{s['p' + str(p)]:>10.1f}" for p in QUANTILES) + f"{s['max']:>10.1f}")
+
+
+def regressions(current: dict, baseline: dict, max_ratio: float, quantile: str = "p95"):
+    """[(scope, metric, base, now)] where `quantile` grew by more than max_ratio."""
+    out = []
+    scopes = [("overall", current.get("overall", {}), baseline.get("overall", {}))]
+    for intent, group in current.get("intents", {}).items():
+        scopes.append((f"intent={intent}", group, baseline.get("intents", {}).get(intent, {})))
+    for scope, now, base in scopes:
+        for metric, s in now.items():
+            b = base.get(metric, {}).get(quantile)
+            n = s.get(quantile)
+            if b and n is not None and n > b * (1 + max_ratio):
+                out.append((scope, metric, b, n))
+    return out
+
 
 def main():
-    rows = []
-    with open(LATENCY_CSV, newline="") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
+    p = argparse.ArgumentParser(description="Latency percentiles from latency_log.csv files.")
+    p.add_argument("files", nargs="*",
+                   help="log files or globs (default: latency_log.csv and latency_log.<date>.csv)")
+    p.add_argument("--kiosk", action="append", default=[],
+                   help="read latency_log_<kiosk>.csv and its rotated files (repeatable)")
+    p.add_argument("--window", default=None, help="rolling window length, e.g. 15m, 1h, 1d")
+    p.add_argument("--step", default=None,
+                   help="start a window this often, e.g. 5m (default: the window length)")
+    p.add_argument("--max-windows", type=int, default=MAX_WINDOWS,
+                   help="keep only the newest N windows (default %(default)s)")
+    p.add_argument("--by-intent", action="store_true", help="break down by intent")
+    p.add_argument("--json", default=None, help="write the report here ('-' = stdout)")
+    p.add_argument("--baseline", default=None, help="earlier --json report to compare against")
+    p.add_argument("--max-regression", type=float, default=0.10,
+                   help="allowed p95 growth vs the baseline (0.10 = 10%%)")
+    args = p.parse_args()
+
+    files = log_files(args.files, args.kiosk)
+    report = Report(parse_window(args.window) if args.window else 0, args.by_intent,
+                    step_s=parse_window(args.step) if args.step else 0, max_windows=args.max_windows)
+    for row in rows(files):
+        report.add(row)
+    result = report.to_json()
+    result["files"] = files
 
-    if not rows:
+    if not report.rows and not report.skipped:
         print("No latency rows logged yet.")
         return
 
-    def avg(col):
-        vals = [float(r[col]) for r in rows]
-        return sum(vals) / len(vals)
+    if args.json == "-":
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"Samples: {report.rows} from {len(files)} file(s)")
+        print_table("Overall (ms)", result["overall"])
+        for reason, st in result.get("skipped", {}).items():
+            print(f"  skipped ({reason}): {st['chunks']} chunks, {st['audio_ms'] / 1000:.1f}s of audio, "
+                  f"~{st['stt_avoided_ms'] / 1000:.1f}s of STT avoided")
+        for intent, group in result.get("intents", {}).items():
+            print_table(f"Intent {intent} (ms)", group)
+        if result.get("windows"):
+            dropped = f", {report.windows_dropped} older ones dropped" if report.windows_dropped else ""
+            print(f"\nWindows of {report.window_s}s every {report.step_s}s (start, local time{dropped})")
+        for start, group in result.get("windows", {}).items():
+            if "total_ms" in group:
+                s = group["total_ms"]
+                label = time.strftime("%Y-%m-%d %H:%M", time.localtime(int(start)))
+                print(f"  window {label}: n={s['count']} total_ms p50={s['p50']:.0f} p95={s['p95']:.0f}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        worse = regressions(result, baseline, args.max_regression)
+        for scope, metric, b, n in worse:
+            print(f"[REGRESSION] {scope} {metric} p95 {b:.1f} -> {n:.1f} ms "
+                  f"(+{(n / b - 1) * 100:.0f}%)", file=sys.stderr)
+        if worse:
+            sys.exit(2)
+        print(f"No p95 regression above {args.max_regression:.0%} vs {args.baseline}", file=sys.stderr)
 
-    print(f"Samples: {len(rows)}")
-    for col in ["stt_ms", "plan_ms", "speak_ms", "total_ms"]:
-        print(f"{col:10}: mean = {avg(col):.2f} ms")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,91 @@
+# Benchmark: intent classification throughput on a generated corpus,
+# previous substring classifier vs the compiled single-pass one.
+# Also checks that every TEST_DATA label in eval_intent_metrics.py still matches.
+#
+#   python3 bench_intent.py            # 200k queries
+#   python3 bench_intent.py 1000000
+import collections
+import random
+import sys
+import time
+
+from intent import classify_intent, classify_intent_detail, classify_intents
+from eval_intent_metrics import TEST_DATA
+
+TEMPLATES = [
+    "where is the {x}", "can you locate {x} for me", "how do I find the {x}",
+    "who is professor {n}", "give me the email of {n}", "faculty contact for {n}",
+    "when does the {x} open", "what are the {x} timings", "is the {x} open on sunday",
+    "hello nao", "hi there, this is my first visit to delhi", "hey",
+    "thank you so much", "okay bye", "what is the weather like today",
+    "tell me something interesting about this campus", "which bus goes to the metro",
+]
+PLACES = ["library", "robotics lab", "canteen", "gym", "room 314", "midas lab", "admin office"]
+NAMES = ["sharma", "verma", "gupta", "shroff", "jalote", "majumdar", "anand"]
+
+
+def legacy_classify_intent(query):
+    """The previous format.classify_intent (substring matching, five passes)."""
+    q = query.lower()
+    if any(w in q for w in ["who is", "faculty", "professor", "prof", "contact", "email"]):
+        return "contact"
+    if any(w in q for w in ["where is", "locate", "find", "location", "room", "lab"]):
+        return "directory"
+    if any(word in q for word in ["hello", "hi", "hey"]):
+        return "greeting"
+    if "thank" in q or "bye" in q:
+        return "close"
+    if any(w in q for w in ["open", "close", "when", "hours"]):
+        return "hours"
+    return "out_of_scope"
+
+
+def corpus(n, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(x=rng.choice(PLACES), n=rng.choice(NAMES))
+            for _ in range(n)]
+
+
+def throughput(label, fn, queries, runs=3):
+    """Best of `runs`, as single runs vary by +-20% on a shared machine."""
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(queries)
+        times.append(time.perf_counter() - t0)
+    dt = min(times)
+    print(f"{label:<34}{len(queries) / dt:>12,.0f} queries/s  ({dt * 1e6 / len(queries):.2f} us/query)")
+
+
+def check_test_data():
+    wrong = [(text, gold, classify_intent_detail(text)) for text, gold in TEST_DATA
+             if classify_intent(text) != gold]
+    for text, gold, (pred, keywords) in wrong:
+        print(f"  MISMATCH {text!r}: gold={gold} pred={pred} keywords={keywords}")
+    print(f"TEST_DATA: {len(TEST_DATA) - len(wrong)}/{len(TEST_DATA)} labels match")
+    return not wrong
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    queries = corpus(n)
+    print(f"Corpus: {n} generated queries\n")
+
+    throughput("legacy (substring loops)", lambda qs: [legacy_classify_intent(q) for q in qs], queries)
+    throughput("compiled, classify_intent", lambda qs: [classify_intent(q) for q in qs], queries)
+    throughput("compiled, classify_intents (batch)", classify_intents, queries)
+
+    changed = collections.Counter((a, b) for a, b in zip(map(legacy_classify_intent, queries),
+                                                          classify_intents(queries)) if a != b)
+    print(f"\nLabels that differ from the legacy classifier: {sum(changed.values()) / n:.1%} "
+          f"(intended, see intent.py)")
+    for (old, new), count in changed.most_common():
+        print(f"  {old:>12} -> {new:<12}{count / n:6.1%}")
+    print()
+
+    if not check_test_data():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmark: KB lookups on a synthetic campus-wide KB, old linear fuzzy scan vs kb_index
+#
+#   python3 bench_kb_index.py            # 50k entries
+#   python3 bench_kb_index.py 200000
+import random
+import sys
+import time
+
+from bench_util import percentile
+from kb_index import KBIndex
+
+QUERIES = 500
+SYLLABLES = ["ra", "jiv", "sha", "ma", "an", "gu", "pta", "de", "ba", "shi", "kar", "vi",
+             "nay", "ak", "sub", "ram", "ni", "kh", "il", "so", "nal", "tan", "moy", "deb"]
+TOPICS = ["Robotics", "Vision", "Systems", "Security", "Quantum", "Networks", "Data", "Language",
+          "Biology", "Design", "Graphics", "Theory", "Signal", "Wireless", "Energy", "Health"]
+
+
+def word(rng, n=3):
+    return "".join(rng.choice(SYLLABLES) for _ in range(n)).capitalize()
+
+
+def synthetic_kb(n: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    kb = {"rooms": {}, "labs": {}, "contacts": {}, "hours": {}}
+    for i in range(n // 4):
+        kb["rooms"][f"{i:05d}"] = {"name": f"{word(rng)} Room",
+                                   "location": f"Block {rng.choice('ABCD')}, {rng.randint(1, 9)} floor"}
+    for i in range(n // 4):
+        name = f"{word(rng)} {rng.choice(TOPICS)} Lab"
+        kb["labs"][f"lab_{i}"] = {"name": name,
+                                  "location": f"R&D Block, {rng.randint(1, 9)} floor {rng.choice('AB')}{rng.randint(100, 999)}"}
+    for i in range(n // 2):
+        first, last = word(rng, 2), word(rng)
+        kb["contacts"][f"c_{i}"] = {"name": f"{first} {last}",
+                                    "email": f"{first.lower()}{i}@iiitd.ac.in",
+                                    "office": f"Room {rng.choice('AB')}-{rng.randint(100, 799)}"}
+    kb["hours"] = {"canteen": "8 AM - 10 PM", "library": "9 AM - 7 PM", "gym": "6 AM - 9 PM"}
+    return kb
+
+
+# ---- previous implementation (format.fuzzy_match + linear scans), kept for comparison ----
+def fuzzy_match(q, text):
+    q = q.lower()
+    text = text.lower()
+    return q in text or text in q or any(w in text for w in q.split())
+
+
+def linear_directory(kb, query):
+    q = query.lower()
+    out = []
+    for room_id, info in kb["rooms"].items():
+        if fuzzy_match(q, f"{room_id} {info['name']} {info['location']}"):
+            out.append(info["name"])
+    for lab_id, info in kb["labs"].items():
+        if fuzzy_match(q, f"{lab_id} {info['name']} {info['location']}"):
+            out.append(info["name"])
+    return out
+
+
+def linear_contact(kb, query):
+    q = query.lower()
+    return [info["name"] for info in kb["contacts"].values()
+            if fuzzy_match(q, f"{info['name']} {info['email']} {info['office']}")]
+
+
+def run(label, fn, queries):
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    print(f"{label:<28}p50={percentile(times, 50):8.3f} ms  p99={percentile(times, 99):8.3f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    kb = synthetic_kb(n)
+    rng = random.Random(1)
+
+    t0 = time.perf_counter()
+    index = KBIndex(kb)
+    print(f"KB entries: {n}, index build: {(time.perf_counter() - t0) * 1000:.0f} ms\n")
+
+    labs = list(kb["labs"].values())
+    contacts = list(kb["contacts"].values())
+    dir_q = [f"where is the {rng.choice(labs)['name']}" for _ in range(QUERIES)]
+    con_q = [f"who is professor {rng.choice(contacts)['name'].split()[-1]}" for _ in range(QUERIES)]
+
+    # linear scans are slow on big KBs; a tenth of the queries is enough to time them
+    run("directory, linear scan", lambda q: linear_directory(kb, q), dir_q[:QUERIES // 10])
+    run("directory, kb_index", lambda q: index.search(q, ("rooms", "labs")), dir_q)
+    run("contact, linear scan", lambda q: linear_contact(kb, q), con_q[:QUERIES // 10])
+    run("contact, kb_index", lambda q: index.search(q, ("contacts",)), con_q)
+
+    hits = sum(index.search(q, ("rooms", "labs"), k=1)[0][3]["name"] in q for q in dir_q)
+    print(f"\nDirectory top-1 contains the asked lab: {hits}/{len(dir_q)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Benchmark: kb.json hot reload on a synthetic campus-wide KB. Full build vs
+# incremental reload after one edit, and lookup latency while reloads happen
+#
+#   python3 bench_kb_reload.py                 # 10k and 50k entries
+#   python3 bench_kb_reload.py 200000
+#
+# First checks that lookups on kb.json give the expected entries, and the same
+# ones after an incremental reload as after a full build (exit 1 otherwise).
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import format
+from bench_kb_index import synthetic_kb
+from bench_util import percentile
+from kb_store import KBSnapshot, KBStore
+
+RELOADS = 5
+# (query, sections, key that must rank first or None, key that must not)
+LOOKUP_CASES = [
+    ("where is iris lab", ("rooms", "labs"), "IRAS_Lab", None),
+    ("find the innovation lab", ("rooms", "labs"), None, "314"),
+    ("where is the cafeteria lab", ("rooms", "labs"), None, "314"),
+    ("where is room A-410", ("rooms", "labs"), None, "210"),
+]
+
+
+def check_lookups(path: str = "kb.json") -> int:
+    """LOOKUP_CASES on the KB before an edit, after a full build and after a reload; failures."""
+    with open(path) as f:
+        data = json.load(f)
+    base = KBSnapshot.build(data)
+    edited = copy.deepcopy(data)
+    edited["rooms"]["999"] = {"name": "Seminar Hall", "location": "Block D, ground floor"}
+    contact = next(iter(edited["contacts"]))
+    edited["contacts"][contact]["office"] = "Room Z-999"
+    snaps = {"before": base, "full": KBSnapshot.build(edited), "reload": KBSnapshot.build(edited, base)}
+
+    print(f"== lookups on {path} (reload rebuilt {', '.join(snaps['reload'].changed)}) ==")
+    failures = 0
+    for query, sections, top, not_top in LOOKUP_CASES:
+        got = {label: [key for _, _, key, _ in format.search_kb(query, sections, snap)]
+               for label, snap in snaps.items()}
+        first = got["reload"][0] if got["reload"] else None
+        ok = (got["before"] == got["full"] == got["reload"]
+              and (top is None or first == top) and (not_top is None or first != not_top))
+        failures += not ok
+        print(f"  {'ok  ' if ok else 'FAIL'} {query!r}: {got['reload']}"
+              + ("" if ok else f" (before {got['before']}, full build {got['full']})"))
+    return failures
+
+
+def write_kb(path, kb):
+    # write-then-rename, as an editor or deploy script should
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(kb, f)
+    os.replace(tmp, path)
+
+
+def bench(n: int):
+    kb = synthetic_kb(n)
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.json")
+        write_kb(path, kb)
+        size_mb = os.path.getsize(path) / 1e6
+        store = KBStore(path)
+        t0 = time.perf_counter()
+        store.load()
+        full_ms = (time.perf_counter() - t0) * 1000.0
+        print(f"\n== {n} entries, {size_mb:.1f} MB: full load {full_ms:.0f} ms "
+              f"(build {store.current.build_ms:.0f} ms) ==")
+
+        # one edited entry per reload; only its section is rebuilt
+        for section, edit in (("contacts", "office"), ("labs", "location"), ("hours", None)):
+            times = []
+            for i in range(RELOADS):
+                if section == "hours":
+                    kb["hours"][f"kiosk_{i}"] = "9 AM - 5 PM"
+                else:
+                    key = rng.choice(list(kb[section]))
+                    kb[section][key][edit] = f"Room X-{rng.randint(100, 999)}"
+                write_kb(path, kb)
+                t0 = time.perf_counter()
+                snap = store.reload()
+                times.append(((time.perf_counter() - t0) * 1000.0, snap.build_ms, snap.changed))
+            total = sorted(t for t, _, _ in times)[len(times) // 2]
+            build = sorted(b for _, b, _ in times)[len(times) // 2]
+            print(f"  edit in {section:<9} reload p50 {total:8.1f} ms (rebuild {build:7.1f} ms, "
+                  f"sections {times[0][2]})")
+
+        # readers keep looking names up while the KB is reloaded under them
+        names = [info["name"] for info in kb["contacts"].values()]
+        stop = threading.Event()
+        lookups = []
+        errors = []
+
+        def reader():
+            while not stop.is_set():
+                q = rng.choice(names)
+                t = time.perf_counter()
+                try:
+                    snap = store.current
+                    snap.index.search(q, ("contacts",), k=3)
+                    snap.matcher.match(q, ("contacts",), k=3)
+                except Exception as e:
+                    errors.append(e)
+                lookups.append((time.perf_counter() - t) * 1000.0)
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for t in threads:
+            t.start()
+
+        for _ in range(RELOADS):
+            key = rng.choice(list(kb["contacts"]))
+            kb["contacts"][key]["office"] = f"Room X-{rng.randint(100, 999)}"
+            write_kb(path, kb)
+            store.reload()
+
+        stop.set()
+        for t in threads:
+            t.join()
+        print(f"  {len(lookups)} lookups during reloads: p50 {percentile(lookups, 50):.3f} ms, "
+              f"p99 {percentile(lookups, 99):.3f} ms, errors {len(errors)}")
+
+
+def main():
+    if check_lookups():
+        sys.exit(1)
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 50000]
+    for n in sizes:
+        bench(n)
+
+
+if __name__ == "__main__":
+    main()
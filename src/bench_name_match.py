@@ -0,0 +1,105 @@
+# Benchmark: accuracy / latency of NameMatcher on STT-style misspelled names,
+# against a brute-force edit-distance scan over every name.
+#
+#   python3 bench_name_match.py          # kb.json + a synthetic 50k-entry KB
+#   python3 bench_name_match.py 200000
+import json
+import random
+import sys
+import time
+
+from bench_kb_index import synthetic_kb
+from bench_util import percentile
+from name_match import NameMatcher, levenshtein, name_words
+
+QUERIES = 300
+SOUND_SWAPS = [("a", "e"), ("ee", "i"), ("i", "ee"), ("u", "oo"), ("v", "w"), ("sh", "s"),
+               ("ph", "f"), ("th", "t"), ("y", "i"), ("c", "k"), ("k", "c"), ("o", "u")]
+
+
+def perturb(word: str, rng: random.Random) -> str:
+    """One STT-like error: a sound-alike swap, a dropped letter or a doubled letter."""
+    swaps = [(a, b) for a, b in SOUND_SWAPS if a in word[1:]]
+    kind = rng.random()
+    if swaps and kind < 0.6:
+        a, b = rng.choice(swaps)
+        i = word.index(a, 1)
+        return word[:i] + b + word[i + len(a):]
+    i = rng.randrange(1, len(word))
+    if kind < 0.8:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i] + word[i:]
+
+
+class BruteForce:
+    """Edit distance against every (entry, name word); best normalised distance wins."""
+    def __init__(self, kb, sections):
+        self.rows = [((s, key), w) for s in sections for key, info in kb.get(s, {}).items()
+                     for w in name_words(info["name"])]
+
+    def match(self, query, k=3):
+        scores = {}
+        for qw in name_words(query):
+            for ref, w in self.rows:
+                sim = 1 - levenshtein(qw, w) / max(len(qw), len(w))
+                scores[ref] = max(scores.get(ref, 0.0), sim)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def make_queries(kb, sections, rng, n):
+    refs = [(s, key) for s in sections for key in kb.get(s, {})]
+    queries = []
+    while len(queries) < n:
+        section, key = rng.choice(refs)
+        words = name_words(kb[section][key]["name"])
+        words = [w for w in words if len(w) >= 4 and w not in ("room",)]
+        if not words:
+            continue
+        target = rng.choice(words)
+        wrong = perturb(target, rng)
+        if wrong != target:
+            queries.append((f"where is {wrong}" if section != "contacts" else f"who is {wrong}",
+                            (section, key), words))
+    return queries
+
+
+def evaluate(label, matcher_fn, kb, queries):
+    top1 = top3 = 0
+    times = []
+    for q, ref, words in queries:
+        t0 = time.perf_counter()
+        got = matcher_fn(q)
+        times.append((time.perf_counter() - t0) * 1000.0)
+        # an entry sharing the same name word is equally right (two "Majumdar"s)
+        names = [set(name_words(kb[s][k]["name"])) for s, k in got]
+        ok = [bool(set(words) & n) for n in names]
+        top1 += bool(ok[:1] and ok[0])
+        top3 += any(ok)
+    n = len(queries)
+    print(f"{label:<34}top1={top1 / n:6.1%}  top3={top3 / n:6.1%}  "
+          f"p50={percentile(times, 50):7.3f} ms  p99={percentile(times, 99):7.3f} ms")
+
+
+def run(title, kb, n_queries, brute_queries):
+    sections = ("labs", "contacts")
+    rng = random.Random(0)
+    queries = make_queries(kb, sections, rng, n_queries)
+    t0 = time.perf_counter()
+    matcher = NameMatcher(kb, sections)
+    print(f"\n== {title}: {sum(len(kb[s]) for s in sections)} names, "
+          f"build {(time.perf_counter() - t0) * 1000:.0f} ms ==")
+    evaluate("NameMatcher (trigram + soundex)",
+             lambda q: [(s, k) for _, s, k, _ in matcher.match(q, sections)], kb, queries)
+    brute = BruteForce(kb, sections)
+    evaluate("brute-force edit distance", brute.match, kb, queries[:brute_queries])
+
+
+def main():
+    with open("kb.json") as f:
+        run("kb.json", json.load(f), QUERIES, QUERIES)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    run("synthetic KB", synthetic_kb(n), QUERIES, 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Benchmark: out-of-scope prompt context, whole-KB json.dumps per call (old)
+# vs retrieval-scoped context from the precomputed entry texts (kb_index.render),
+# for growing KB sizes. Prompt size is the LLM-latency driver we can measure offline.
+#
+#   python3 bench_prompt_context.py
+import json
+import random
+import time
+
+from bench_kb_index import synthetic_kb
+from bench_util import percentile
+from kb_index import KBIndex
+
+QUERIES = 200
+TOP_K = 8                  # format.PROMPT_TOP_K
+MAX_CHARS = 500 * 4        # format.PROMPT_TOKEN_BUDGET * CHARS_PER_TOKEN
+QUESTIONS = ["what research happens in the {x}", "can I visit the {x} on a weekend",
+             "is {n} taking students this semester", "where can I get coffee",
+             "how do I reach the metro from here"]
+
+
+def whole_kb(kb):
+    return json.dumps({
+        "rooms": list(kb["rooms"].values()),
+        "labs": list(kb["labs"].values()),
+        "contacts": list(kb["contacts"].values()),
+        "hours": kb["hours"],
+    })
+
+
+def measure(fn, queries):
+    times, sizes = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        text = fn(q)
+        times.append((time.perf_counter() - t0) * 1000.0)
+        sizes.append(len(text))
+    return percentile(times, 50), sum(sizes) / len(sizes)
+
+
+def run(title, kb):
+    rng = random.Random(0)
+    labs = [info["name"] for info in kb["labs"].values()]
+    names = [info["name"].split()[-1] for info in kb["contacts"].values()]
+    queries = [rng.choice(QUESTIONS).format(x=rng.choice(labs), n=rng.choice(names))
+               for _ in range(QUERIES)]
+
+    t0 = time.perf_counter()
+    index = KBIndex(kb)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    sections = tuple(index.sections)
+
+    def scoped(q):
+        return index.render(index.search(q, sections, k=TOP_K, min_ratio=0.0), MAX_CHARS)[0]
+
+    # the old path is slow on big KBs; a tenth of the queries is enough to time it
+    old_ms, old_chars = measure(lambda q: whole_kb(kb), queries[:QUERIES // 10])
+    new_ms, new_chars = measure(scoped, queries)
+    n = sum(len(v) for v in kb.values())
+    print(f"{title:<14}{n:>7} entries  build {build_ms:7.0f} ms | "
+          f"whole KB: {old_chars / 4:>9,.0f} tok {old_ms:8.2f} ms | "
+          f"scoped: {new_chars / 4:>5,.0f} tok {new_ms:6.3f} ms")
+
+
+def main():
+    with open("kb.json") as f:
+        run("kb.json", json.load(f))
+    for n in (1_000, 10_000, 50_000):
+        run(f"synthetic {n // 1000}k", synthetic_kb(n))
+
+
+if __name__ == "__main__":
+    main()
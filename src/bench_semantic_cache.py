@@ -0,0 +1,82 @@
+# Check: the semantic cache's hit rule on labelled query pairs. A paraphrase
+# should reuse the stored answer; a query that differs in what it asks about
+# (btech / mtech, today / tomorrow) must not.
+#
+#   python3 bench_semantic_cache.py                # cosine per pair + precision / recall per threshold
+#   python3 bench_semantic_cache.py --threshold 0.7
+import argparse
+import sys
+
+from cache import SemanticCache, embed, normalize_query, same_content
+
+# (stored query, new query, same answer?)
+PAIRS = [
+    ("what is the wifi password", "what's the wi-fi password here", True),
+    ("is there wifi", "wi-fi here?", True),
+    ("what is the weather like today", "whats the weather like today", True),
+    ("how do I get to the metro station", "how do i get to the metro station please", True),
+    ("what is the btech fee", "btech fees", True),
+    ("who won the match yesterday", "um who won the match yesterday", True),
+    ("what colour is the logo", "what color is the logo", True),
+    ("tell me a joke", "can you tell me a joke", True),
+    ("where can I get lunch", "where can i get some lunch", True),
+    ("what is the btech fee", "what is the mtech fee", False),
+    ("what is the weather today", "what is the weather tomorrow", False),
+    ("who won the match yesterday", "who won the match today", False),
+    ("is the cafe open on sunday", "is the cafe open on monday", False),
+    ("how do I get to the metro station", "how do I get to the bus station", False),
+    ("what is the phd stipend", "what is the mtech stipend", False),
+    ("tell me a joke", "tell me a fact", False),
+    ("what is the wifi password", "what is the admin password", False),
+    ("how far is the airport", "how far is the railway station", False),
+]
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+
+def cosine(a: str, b: str) -> float:
+    return float(embed(normalize_query(a)) @ embed(normalize_query(b)))
+
+
+def decide(a: str, b: str, threshold: float) -> bool:
+    """The hit decision SemanticCache.get makes for b after a was stored."""
+    cache = SemanticCache(threshold=threshold)
+    cache.put(a, "answer")
+    return cache.get(b) is not None
+
+
+def score(threshold: float):
+    """(right hits, wrong hits, wrong hits on cosine alone, without same_content)."""
+    tp = fp = fp_cosine = 0
+    for a, b, same in PAIRS:
+        hit = decide(a, b, threshold)
+        tp += hit and same
+        fp += hit and not same
+        fp_cosine += cosine(a, b) >= threshold and not same
+    return tp, fp, fp_cosine
+
+
+def main():
+    p = argparse.ArgumentParser(description="Semantic cache hit rule on labelled pairs.")
+    p.add_argument("--threshold", type=float, default=None, help="check only this threshold")
+    args = p.parse_args()
+
+    print(f"{'cosine':>7} {'content':>8} {'label':>6}  pair")
+    for a, b, same in PAIRS:
+        agree = same_content(normalize_query(a), normalize_query(b))
+        print(f"{cosine(a, b):7.3f} {'same' if agree else 'differs':>8} {'same' if same else 'diff':>6}  "
+              f"{a!r} / {b!r}")
+
+    positives = sum(same for _, _, same in PAIRS)
+    print(f"\n{'threshold':>9} {'hits':>5} {'wrong':>6} {'recall':>7} {'wrong, cosine only':>19}")
+    wrong_any = 0
+    for t in [args.threshold] if args.threshold else THRESHOLDS:
+        tp, fp, fp_cosine = score(t)
+        wrong_any += fp
+        print(f"{t:9.2f} {tp + fp:5d} {fp:6d} {tp / positives:7.1%} {fp_cosine:19d}")
+    # a wrong hit serves someone else's answer: never acceptable
+    if wrong_any:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Micro-benchmark: per-turn STT time, temp-WAV path vs in-memory path, then
+# adaptive decoding with a pinned language vs always-beam with detection
+#
+#   python3 bench_stt.py                      # synthetic 6 s chunk at 48 kHz
+#   python3 bench_stt.py some_utterance.wav   # real recording at its own rate
+import sys
+import tempfile
+import time
+import os
+import numpy as np
+import soundfile as sf
+
+from sidecar import (WhisperSTT, WHISPER_MODEL_NAME, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE,
+                     WHISPER_BEAM_SIZE, WHISPER_DECODE, WHISPER_LANGUAGE)
+
+RUNS = 5
+
+
+def transcribe_via_tempfile(stt: WhisperSTT, audio_np: np.ndarray, sample_rate: int) -> str:
+    """The previous implementation: write a WAV, let faster-whisper decode + resample it.
+    Decodes with stt's settings, so only the audio hand-off differs from stt.transcribe."""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+        sf.write(tmp.name, audio_np, sample_rate)
+        tmp_path = tmp.name
+    try:
+        segments, info = stt.model.transcribe(tmp_path, beam_size=WHISPER_BEAM_SIZE,
+                                              language=stt.language,
+                                              initial_prompt=stt.initial_prompt,
+                                              condition_on_previous_text=False)
+        return "".join(seg.text for seg in segments).strip()
+    finally:
+        os.remove(tmp_path)
+
+
+def load_audio():
+    if len(sys.argv) > 1:
+        audio, sr = sf.read(sys.argv[1], dtype="int16", always_2d=True)
+        return np.ascontiguousarray(audio[:, 0]), sr
+    sr = 48000
+    t = np.arange(6 * sr) / sr
+    rng = np.random.default_rng(0)
+    tone = 0.2 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    audio = tone + 0.01 * rng.standard_normal(t.size)
+    return (audio * 32767).astype(np.int16), sr
+
+
+def timed(fn, runs=RUNS):
+    fn()                                    # warm-up
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return np.median(times), np.mean(times)
+
+
+def main():
+    pcm, sr = load_audio()
+    # the previous decode settings: always beam search, language detected per chunk
+    stt = WhisperSTT(WHISPER_MODEL_NAME, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE,
+                     language=None, decode="beam")
+    print(f"Chunk: {len(pcm)/sr:.2f}s @ {sr} Hz, {RUNS} runs each\n")
+
+    float_audio = pcm.astype(np.float32) / 32768.0
+    before = timed(lambda: transcribe_via_tempfile(stt, float_audio, sr))
+    after = timed(lambda: stt.transcribe(pcm, sr))
+    stt.language, stt.decode = WHISPER_LANGUAGE, WHISPER_DECODE
+    adaptive = timed(lambda: stt.transcribe(pcm, sr))
+    label = f"in-memory, {WHISPER_DECODE}, {WHISPER_LANGUAGE or 'detect'}"
+
+    print(f"{'path':<34}{'median ms':>12}{'mean ms':>12}")
+    print(f"{'temp WAV, beam, detect (before)':<34}{before[0]:>12.1f}{before[1]:>12.1f}")
+    print(f"{'in-memory, beam, detect':<34}{after[0]:>12.1f}{after[1]:>12.1f}")
+    print(f"{label:<34}{adaptive[0]:>12.1f}{adaptive[1]:>12.1f}")
+    print(f"\nSaved per turn (median): {before[0] - after[0]:.1f} ms by in-memory audio, "
+          f"{after[0] - adaptive[0]:.1f} ms more by the decode settings")
+
+
+if __name__ == "__main__":
+    main()
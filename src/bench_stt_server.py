@@ -0,0 +1,125 @@
+# Benchmark: the shared STT server under N concurrent synthetic reception points,
+# with micro-batching on and off
+#
+#   python3 bench_stt_server.py                                # in-process server, 1/2/4/8 streams
+#   python3 bench_stt_server.py --streams 1,4,8 --requests 10 --wav-dir recordings/
+#   python3 bench_stt_server.py --server 127.0.0.1:5010        # a running stt_server.py as it is set up
+import argparse
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+from bench_util import percentile
+from stt_server import RemoteSTT, STTServer
+
+
+def synthetic_utterances(n: int = 8, sr: int = 48000, seed: int = 0):
+    """Speech-like bursts (voiced tone, syllable envelope, noise) of 1.5-6 s."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        t = np.arange(int(rng.uniform(1.5, 6.0) * sr)) / sr
+        pitch = rng.uniform(110, 220)
+        voiced = np.sin(2 * np.pi * pitch * t) + 0.5 * np.sin(2 * np.pi * 2 * pitch * t)
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(2, 4) * t), 0, None)
+        audio = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(t.size)
+        out.append((f"synthetic_{i}", (audio * 32767).astype(np.int16), sr))
+    return out
+
+
+def client(address, name, utterances, requests, gap_s, seed, results):
+    stt = RemoteSTT(address, client=name)
+    rng = random.Random(seed)
+    try:
+        for _ in range(requests):
+            _, pcm, sr = rng.choice(utterances)
+            t0 = time.perf_counter()
+            reply = stt.request(pcm, sr)
+            results.append((name, (time.perf_counter() - t0) * 1000.0, len(pcm) / sr, reply["batch"]))
+            if gap_s:
+                time.sleep(rng.uniform(0, gap_s))
+    finally:
+        stt.close()
+
+
+def run(address, streams, utterances, requests, gap_s):
+    results = []
+    threads = [threading.Thread(target=client, args=(address, f"kiosk-{i}", utterances, requests, gap_s, i, results))
+               for i in range(streams)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - t0
+    latencies = [ms for _, ms, _, _ in results]
+    per_client = {}
+    for name, ms, _, _ in results:
+        per_client.setdefault(name, []).append(ms)
+    return {
+        "streams": streams,
+        "requests": len(results),
+        "wall_s": round(wall_s, 2),
+        "throughput_rps": round(len(results) / wall_s, 3),
+        "audio_s_per_s": round(sum(a for _, _, a, _ in results) / wall_s, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "worst_client_p95_ms": round(max(percentile(v, 95) for v in per_client.values()), 1),
+        "mean_batch": round(sum(b for _, _, _, b in results) / len(results), 2),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Throughput and per-client latency of the shared STT server.")
+    p.add_argument("--streams", default="1,2,4,8", help="concurrent clients to try")
+    p.add_argument("--requests", type=int, default=8, help="utterances per client")
+    p.add_argument("--gap", type=float, default=0.0, help="max random pause between a client's requests (s)")
+    p.add_argument("--max-batch", default="1,8", help="in-process server batch limits to compare")
+    p.add_argument("--window-ms", type=float, default=30.0)
+    p.add_argument("--model", default=None, help="Whisper model for the in-process server")
+    p.add_argument("--server", default=None, help="use this running stt_server.py instead")
+    p.add_argument("--wav-dir", default=None, help="real utterances (*.wav) instead of synthetic ones")
+    p.add_argument("--json", default=None, help="also write the results here")
+    args = p.parse_args()
+
+    if args.wav_dir:
+        from replay import load_wavs
+        utterances = load_wavs(args.wav_dir)
+    else:
+        utterances = synthetic_utterances()
+    streams = [int(s) for s in args.streams.split(",")]
+
+    setups = []
+    if args.server:
+        setups.append((f"server {args.server}", args.server, None))
+    else:
+        import sidecar
+        stt = sidecar.make_stt(model_name=args.model, debug_dump_dir=None, local=True)
+        stt.warm_up()
+        for max_batch in [int(b) for b in args.max_batch.split(",")]:
+            server = STTServer(stt, port=0, max_batch=max_batch, window_ms=args.window_ms).start()
+            setups.append((f"max_batch={max_batch}", f"127.0.0.1:{server.port}", server))
+
+    report = {}
+    for label, address, server in setups:
+        print(f"\n{label}")
+        print(f"  {'streams':>7}{'req/s':>9}{'audio s/s':>11}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'worst p95':>11}{'batch':>7}")
+        report[label] = []
+        for n in streams:
+            r = run(address, n, utterances, args.requests, args.gap)
+            report[label].append(r)
+            print(f"  {n:>7}{r['throughput_rps']:>9.2f}{r['audio_s_per_s']:>11.2f}{r['p50_ms']:>10.0f}"
+                  f"{r['p95_ms']:>10.0f}{r['worst_client_p95_ms']:>11.0f}{r['mean_batch']:>7.2f}")
+        if server is not None:
+            server.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# Small helpers shared by the bench_*.py scripts and replay.py
+
+
+def percentile(values, p):
+    """Nearest-rank p-th percentile (0-100) of a non-empty sequence."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
@@ -1,7 +1,14 @@
 from flask import Flask, request, jsonify
 from naoqi import ALProxy, ALBroker
 from qi import Session
+import collections
+import itertools
 import threading
+import time
+try:
+    import Queue as queue   # Python 2 (NAOqi)
+except ImportError:
+    import queue
 
 #Flask app setup and nao connection variables
 app = Flask(__name__)
@@ -10,44 +17,195 @@ nao = True
 nao_IP = "192.168.34.110"
 nao_port = 9559
 sleep_time = 0.01
+max_poll_s = 30.0        # longest a /talk/<id> or /speaking long-poll is held open
+keep_jobs = 200          # finished speech jobs remembered for status queries
+keep_events = 500        # output start/end events kept for /output
 
 tts = ALProxy("ALTextToSpeech", nao_IP, nao_port)
 tts.setVolume(1.0) # define volume of the robot
 
+class output_events:
+    """
+    Start / end of everything the robot outputs (speech jobs, gestures and
+    posture changes), so the sidecar can ignore what its mic hears of NAO.
+    - publish(kind, event, ref): kind "speech" | "gesture", event "start" | "end"
+    - every event is numbered and carries `active`, the number of outputs
+      still running after it
+    - since(seq, wait) long-polls for the events after seq
+    """
+    def __init__(self):
+        self.events = collections.deque(maxlen=keep_events)
+        self.seq = 0
+        self.active = set()         # (kind, ref) running
+        self.changed = threading.Condition()
+
+    def publish(self, kind, event, ref):
+        with self.changed:
+            if event == "start":
+                self.active.add((kind, ref))
+            else:
+                self.active.discard((kind, ref))
+            self.seq += 1
+            self.events.append({"seq": self.seq, "t": time.time(), "kind": kind, "event": event,
+                                "ref": ref, "active": len(self.active)})
+            self.changed.notify_all()
+
+    def since(self, seq, wait=0.0):
+        with self.changed:
+            if seq > self.seq:
+                seq = 0             # the client saw an earlier run of this server
+            deadline = time.time() + min(max(wait, 0.0), max_poll_s)
+            while self.seq == seq:
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+                self.changed.wait(left)
+            return {"seq": self.seq, "active": len(self.active),
+                    "events": [e for e in self.events if e["seq"] > seq]}
+
+outputs = output_events()
+
 # Custom functionalities that wrap naoqi behaviour/speaker modules to define behaviour
+gestures = {
+    "wave_right": "animations/Stand/Gestures/Hey_1",
+    "wave_left": "animations/Stand/Gestures/Hey_3",
+    "bow": "animations/Stand/Gestures/BowShort_1",
+}
+behavior_poll_s = 0.05   # how often a started behavior is checked for completion
+
 class behavior:
+    """
+    Behavior scheduler: one actuator queue, one worker thread, so gestures
+    never overlap on the motors.
+    - A request for a behavior that is already running or queued is
+      coalesced into it instead of queued again
+    - The gesture behaviors are preloaded at startup
+    - The last posture we asked for is not requested again while the robot
+      is still in the posture family it reached ("Standing"); a behavior
+      that leaves it sitting or crouched makes it ask again
+    - stats(): per behavior, start latency (request -> behavior started)
+    """
     def __init__(self,session):
         self.name = ""
         self.behavior_mng_service = session.service("ALBehaviorManager")
         self.posture_service = session.service("ALRobotPosture")
-        self.running_flag = False
+        self.posture = None         # (posture asked for, posture family reached)
+        self.lock = threading.Lock()
+        self.pending = {}           # behavior name -> request (queued or running)
+        self.actions = queue.Queue()
+        self.latency = {}           # behavior name -> start-latency counters
+        self.preload(gestures.values())
+        th = threading.Thread(target=self._worker)
+        th.daemon = True
+        th.start()
 
-    def _run_behavior_blocking(self, behavior_name):
+    @property
+    def running_flag(self):
+        return bool(self.name)
+
+    def preload(self, behavior_names):
+        for name in behavior_names:
+            try:
+                self.behavior_mng_service.preloadBehavior(name)
+            except Exception as e:
+                print("Could not preload %s: %s" % (name, e))
+
+    def go_to_posture(self, posture, speed=0.5):
         """
-        Internal helper: run a behavior in a separate thread and track running_flag.
+        goToPosture, skipped if the robot was sent to this posture and has
+        not left its posture family since (a behavior may have moved it).
         """
+        if self.posture is not None and self.posture[0] == posture:
+            try:
+                if self.posture_service.getPostureFamily() == self.posture[1]:
+                    return
+            except Exception:
+                pass
         try:
-            self.running_flag = True
-            self.behavior_mng_service.runBehavior(behavior_name)
-        finally:
-            self.running_flag = False
+            self.posture_service.goToPosture(posture, speed)
+            self.posture = (posture, self.posture_service.getPostureFamily())
+        except Exception:
+            # If already standing, this may fail; ignore
+            self.posture = None
+
+    def _worker(self):
+        while True:
+            req = self.actions.get()
+            outputs.publish("gesture", "start", req["name"])
+            try:
+                if req["posture"]:
+                    self.go_to_posture(req["posture"])
+                self._run_behavior_blocking(req)
+            except Exception as e:
+                print("Error while running %s: %s" % (req["name"], e))
+                req["error"] = str(e)
+                self.posture = None
+            finally:
+                with self.lock:
+                    self.pending.pop(req["name"], None)
+                    self.name = ""
+                outputs.publish("gesture", "end", req["name"])
+                req["done"].set()
+
+    def _run_behavior_blocking(self, req):
+        """
+        Internal helper: start the behavior, record its start latency and
+        wait for it to finish.
+        """
+        name = req["name"]
+        self.name = name
+        self.behavior_mng_service.startBehavior(name)
+        self._record(name, (time.time() - req["requested"]) * 1000.0)
+        while self.behavior_mng_service.isBehaviorRunning(name):
+            time.sleep(behavior_poll_s)
+
+    def _stat(self, name):
+        # call with self.lock held
+        return self.latency.setdefault(name, {"runs": 0, "coalesced": 0, "total_ms": 0.0,
+                                              "max_ms": 0.0, "last_ms": 0.0})
+
+    def _record(self, name, start_ms):
+        with self.lock:
+            st = self._stat(name)
+            st["runs"] += 1
+            st["total_ms"] += start_ms
+            st["last_ms"] = start_ms
+            st["max_ms"] = max(st["max_ms"], start_ms)
+
+    def stats(self):
+        with self.lock:
+            out = {}
+            for name, st in self.latency.items():
+                st = dict(st)
+                st["avg_ms"] = st.pop("total_ms") / st["runs"] if st["runs"] else 0.0
+                out[name] = st
+            return {"running": self.name or None, "queued": self.actions.qsize(),
+                    "posture": self.posture[0] if self.posture else None, "behaviors": out}
 
     # generic launcher used by /run_behavior
-    def launch_behavior(self, behavior_name, async_run=True):
+    def launch_behavior(self, behavior_name, async_run=True, posture=None):
         """
-        Launch any NAO behavior by its full name/path.
+        Queue any NAO behavior by its full name/path.
         Example: 'animations/Stand/Gestures/Hey_1'
+        Returns "queued", or "coalesced" when the same behavior was already
+        queued or running.
         """
-        self.name = behavior_name
-        if async_run:
-            th = threading.Thread(
-                target=self._run_behavior_blocking,
-                args=(behavior_name,)
-            )
-            th.daemon = True
-            th.start()
-        else:
-            self._run_behavior_blocking(behavior_name)
+        with self.lock:
+            req = self.pending.get(behavior_name)
+            if req is not None:
+                self._stat(behavior_name)["coalesced"] += 1
+                status = "coalesced"
+            else:
+                req = {"name": behavior_name, "posture": posture, "requested": time.time(),
+                       "done": threading.Event(), "error": None}
+                self.pending[behavior_name] = req
+                self.actions.put(req)
+                status = "queued"
+        if not async_run:
+            req["done"].wait()
+            if req["error"]:
+                raise RuntimeError(req["error"])
+        return status
 
     # hand-waving gesture using built-in NAO animations
     def wave_hand(self, hand="right"):
@@ -55,20 +213,131 @@ class behavior:
         Trigger a hand-waving gesture. Uses built-in gesture behaviors.
         hand: 'right' or 'left'
         """
-        # Make sure robot is in a safe standing posture
-        try:
-            self.posture_service.goToPosture("StandInit", 0.5)
-        except Exception:
-            # If already standing, this may fail; ignore
-            pass
-
         if hand.lower() == "left":
-            behavior_name = "animations/Stand/Gestures/Hey_3"   # left-hand wave
+            behavior_name = gestures["wave_left"]    # left-hand wave
         else:
-            behavior_name = "animations/Stand/Gestures/Hey_1"   # right-hand wave (default)
+            behavior_name = gestures["wave_right"]   # right-hand wave (default)
+
+        # Make sure robot is in a safe standing posture
+        return self.launch_behavior(behavior_name, async_run=True, posture="StandInit")
+
+
+# Speech jobs: /talk queues the text and returns at once; one worker thread
+# speaks the jobs in order with the non-blocking tts.post.say.
+class speech_queue:
+    """
+    Job states: queued -> speaking -> done / cancelled / error.
+    - submit() returns the job id immediately
+    - status(id, wait) and speaking_state(wait, ...) can long-poll: they
+      return as soon as something changes, or after `wait` seconds
+    - stop() cancels the queued jobs and cuts the current one (barge-in)
+    """
+    def __init__(self, tts_proxy):
+        self.tts = tts_proxy
+        self.jobs = {}
+        self.order = []
+        self.pending = queue.Queue()
+        self.current = None
+        self.ids = itertools.count(1)
+        self.changed = threading.Condition()
+        th = threading.Thread(target=self._worker)
+        th.daemon = True
+        th.start()
+
+    def submit(self, message, language):
+        with self.changed:
+            job = {"id": next(self.ids), "message": message, "language": language,
+                   "state": "queued", "created": time.time(),
+                   "started": None, "finished": None, "error": None}
+            self.jobs[job["id"]] = job
+            self.order.append(job["id"])
+            while len(self.order) > keep_jobs:
+                old = self.jobs.get(self.order[0])
+                if old is not None and old["state"] in ("queued", "speaking"):
+                    break
+                self.jobs.pop(self.order.pop(0), None)
+            self.changed.notify_all()
+        self.pending.put(job["id"])
+        return dict(job)
+
+    def _set(self, job, state, **fields):
+        with self.changed:
+            job["state"] = state
+            job.update(fields)
+            self.changed.notify_all()
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get(self.pending.get())
+            if job is None or job["state"] != "queued":
+                continue
+            self.current = job
+            self._set(job, "speaking", started=time.time())
+            outputs.publish("speech", "start", job["id"])
+            try:
+                task = self.tts.post.say(str(job["message"]), str(job["language"]))
+                self.tts.wait(task, 0)
+                state = "cancelled" if job.get("stop") else "done"
+                self._set(job, state, finished=time.time())
+            except Exception as e:
+                print("Error while speaking:", e)
+                self._set(job, "error", finished=time.time(), error=str(e))
+            finally:
+                self.current = None
+                outputs.publish("speech", "end", job["id"])
 
-        self.launch_behavior(behavior_name, async_run=True)
-    
+    def _wait(self, done, wait):
+        # call with self.changed held
+        deadline = time.time() + min(max(wait, 0.0), max_poll_s)
+        while not done():
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            self.changed.wait(left)
+
+    def status(self, job_id, wait=0.0):
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self._wait(lambda: job["state"] not in ("queued", "speaking"), wait)
+            return dict(job)
+
+    def speaking_state(self, wait=0.0, speaking=None):
+        """Long-polls until the speaking flag differs from `speaking` (if given)."""
+        with self.changed:
+            is_speaking = lambda: self.current is not None or any(
+                self.jobs[i]["state"] == "queued" for i in self.order)
+            if speaking is not None:
+                self._wait(lambda: is_speaking() != speaking, wait)
+            current = self.current
+            return {"speaking": is_speaking(),
+                    "job_id": current["id"] if current else None,
+                    "queued": sum(self.jobs[i]["state"] == "queued" for i in self.order)}
+
+    def stop(self, job_id=None):
+        """Cancel one job (or all, job_id None) and stop the current utterance."""
+        cancelled = []
+        with self.changed:
+            for i in self.order:
+                job = self.jobs[i]
+                if job["state"] == "queued" and job_id in (None, i):
+                    job["state"] = "cancelled"
+                    job["finished"] = time.time()
+                    cancelled.append(i)
+            current = self.current
+            if current is not None and job_id in (None, current["id"]):
+                current["stop"] = True
+                cancelled.append(current["id"])
+            else:
+                current = None
+            self.changed.notify_all()
+        if current is not None:
+            self.tts.stopAll()
+        return cancelled
+
+
+speech = speech_queue(tts)
 
 # Establish connection with robot using broker/naoqi session aided by ALproxy for broker
 try:
@@ -84,21 +353,97 @@ except RuntimeError:
 
 # server endpoints that utilize custom functions defined above 
 
+def _job_json(job):
+    job = dict(job)
+    job.pop("stop", None)
+    return job
+
 @app.route("/talk", methods=["POST"])
 def talk():
+    """Queue speech and return the job id; {"wait": true} blocks until it is spoken."""
     print("Received a request to talk")
-    message = request.json.get("message")
-    language = request.json.get("language")
-    tts.say(str(message),str(language))
-    return jsonify(success=True)
+    data = request.get_json(silent=True) or {}
+    job = speech.submit(data.get("message"), data.get("language"))
+    if data.get("wait"):
+        job = speech.status(job["id"], wait=max_poll_s)
+    return jsonify(success=True, job_id=job["id"], state=job["state"])
+
+@app.route("/talk/<int:job_id>", methods=["GET"])
+def talk_status(job_id):
+    """Job status; ?wait=S holds the request until the job finishes (or S seconds)."""
+    job = speech.status(job_id, wait=request.args.get("wait", 0.0, type=float))
+    if job is None:
+        return jsonify(success=False, error="unknown job"), 404
+    return jsonify(success=True, **_job_json(job))
+
+@app.route("/talk/stop", methods=["POST"])
+def talk_stop():
+    """Barge-in: cancel the given job, or everything queued plus the current utterance."""
+    data = request.get_json(silent=True) or {}
+    cancelled = speech.stop(data.get("job_id"))
+    return jsonify(success=True, cancelled=cancelled)
+
+@app.route("/speaking", methods=["GET"])
+def speaking():
+    """
+    {"speaking", "job_id", "queued"}. With ?wait=S&speaking=0|1 the request
+    is held until the speaking flag differs from the given value.
+    """
+    flag = request.args.get("speaking")
+    state = speech.speaking_state(
+        wait=request.args.get("wait", 0.0, type=float),
+        speaking=None if flag is None else flag not in ("0", "false"),
+    )
+    return jsonify(success=True, **state)
+
+@app.route("/output", methods=["GET"])
+def output():
+    """
+    Speech and gesture start / end events: {"seq", "active", "events"}.
+    ?since=N returns the events after N; with &wait=S the request is held
+    until there is one (or S seconds pass).
+    """
+    return jsonify(success=True, **outputs.since(
+        request.args.get("since", 0, type=int),
+        wait=request.args.get("wait", 0.0, type=float),
+    ))
+
+@app.route("/perform", methods=["POST"])
+def perform():
+    """
+    Gesture and speech in one request, started together: the gesture goes
+    to the behavior queue and the text to the speech queue, so NAO waves
+    while it talks. {"message", "language", "gesture": wave_right |
+    wave_left | bow | null, "wait": bool}
+    """
+    data = request.get_json(silent=True) or {}
+    gesture = data.get("gesture")
+    if gesture and gesture not in gestures:
+        return jsonify(success=False, error="unknown gesture %s" % gesture), 400
+    try:
+        gesture_status = None
+        if gesture:
+            posture = "StandInit" if gesture.startswith("wave") else None
+            gesture_status = behave.launch_behavior(gestures[gesture], posture=posture)
+        job = None
+        if data.get("message"):
+            job = speech.submit(data.get("message"), data.get("language"))
+            if data.get("wait"):
+                job = speech.status(job["id"], wait=max_poll_s)
+        return jsonify(success=True, gesture=gesture, gesture_status=gesture_status,
+                       job_id=job["id"] if job else None,
+                       state=job["state"] if job else None)
+    except Exception as e:
+        print("Error while performing:", e)
+        return jsonify(success=False, error=str(e)), 500
 
 @app.route("/wave_hand", methods=["POST"])
 def wave_hand():
     data = request.get_json(silent=True) or {}
     hand = data.get("hand", "right")
     try:
-        behave.wave_hand(hand)
-        return jsonify(success=True, hand=hand)
+        status = behave.wave_hand(hand)
+        return jsonify(success=True, hand=hand, status=status)
 
     except Exception as e:
         print("Error while waving hand:", e)
@@ -107,11 +452,16 @@ def wave_hand():
 @app.route("/bow", methods=["POST"])
 def bow_down():
     try:
-        behave.launch_behavior("animations/Stand/Gestures/BowShort_1")
-        return jsonify(success=True)
+        status = behave.launch_behavior(gestures["bow"])
+        return jsonify(success=True, status=status)
     except Exception as e:
         return jsonify(success=False, error=str(e)), 500
 
+@app.route("/behaviors/stats", methods=["GET"])
+def behavior_stats():
+    """Start latency per behavior, coalesced requests, queue and cached posture."""
+    return jsonify(success=True, **behave.stats())
+
 
 # Here we host the flask server 
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+"""
+Reply caches used by format.py to avoid repeat Gemini calls.
+"""
+
+from __future__ import annotations
+import collections
+import difflib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+
+def _read_snapshot(path: str) -> list:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        print(f"[Cache] Ignoring unreadable snapshot {path}: {e}")
+        return []
+
+
+def _write_snapshot(path: str, rows: list):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[Cache] Failed to write snapshot {path}: {e}")
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of finished replies.
+
+    - Keys are tuples of strings, e.g. (intent, lookup_result)
+    - put() records what the LLM call cost, so stats() can report how much
+      latency (and how many calls) the hits saved
+    - path: optional JSON snapshot, loaded on start and rewritten at most
+      every snapshot_every_s seconds (and on save()) so the cache survives restarts
+    """
+    def __init__(self, max_entries: int = 256, ttl_s: float = 24 * 3600,
+                 path: str | None = None, snapshot_every_s: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = path
+        self.snapshot_every_s = snapshot_every_s
+        self._entries = collections.OrderedDict()   # key -> [value, stored_at, cost_ms]
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        if path:
+            self.load()
+
+    @staticmethod
+    def _key(key) -> str:
+        return json.dumps(list(key), ensure_ascii=False)
+
+    def get(self, key, count: bool = True):
+        """Cached value or None; count=False peeks without touching the stats."""
+        k = self._key(key)
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry is None or time.time() - entry[1] > self.ttl_s:
+                if entry is not None:
+                    del self._entries[k]
+                self.misses += count
+                return None
+            self._entries.move_to_end(k)
+            if count:
+                self.hits += 1
+                self.saved_ms += entry[2]
+            return entry[0]
+
+    def put(self, key, value: str, cost_ms: float = 0.0):
+        if not value:
+            return
+        k = self._key(key)
+        with self._lock:
+            self._entries[k] = [value, time.time(), cost_ms]
+            self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        if self.path and time.time() - self._last_save >= self.snapshot_every_s:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_calls_saved": self.hits,
+                "llm_ms_saved": round(self.saved_ms, 2),
+            }
+
+    def load(self):
+        rows = _read_snapshot(self.path)
+        now = time.time()
+        with self._lock:
+            for k, value, stored_at, cost_ms in rows:
+                if now - stored_at <= self.ttl_s:
+                    self._entries[k] = [value, stored_at, cost_ms]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[k, *entry] for k, entry in self._entries.items()]
+            self._dirty = False
+            self._last_save = time.time()
+        _write_snapshot(self.path, rows)
+
+
+_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "to", "of", "for", "in", "on",
+    "at", "me", "i", "you", "your", "my", "we", "it", "do", "does", "can",
+    "could", "would", "please", "tell", "know", "um", "uh", "hey", "hi",
+    "hello", "nao", "okay", "ok", "so", "just", "there", "here", "any",
+    "what", "whats", "some",
+}
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation / filler words, so STT variants line up."""
+    text = _NON_WORD.sub(" ", text.lower().replace("'s", " is"))
+    return " ".join(w for w in text.split() if w not in _STOP_WORDS)
+
+
+def same_content(a: str, b: str, min_ratio: float = 0.85) -> bool:
+    """
+    True if two normalised queries ask about the same things: every word of
+    one is also in the other, is part of the same letters split or joined
+    differently ("wifi" / "wi fi"), or is a near spelling (difflib ratio >=
+    min_ratio: "colour" / "color", "fee" / "fees"). "btech fee" and "mtech
+    fee" differ, however similar their vectors are.
+    """
+    wa, wb = set(a.split()), set(b.split())
+    for mine, theirs, joined in ((wa - wb, wb - wa, b.replace(" ", "")),
+                                 (wb - wa, wa - wb, a.replace(" ", ""))):
+        for w in mine:
+            if w in joined:
+                continue
+            if not any(difflib.SequenceMatcher(None, w, o).ratio() >= min_ratio for o in theirs):
+                return False
+    return True
+
+
+def embed(text: str, dim: int = 1024) -> np.ndarray:
+    """
+    CPU-only hashed bag of words + character trigrams, L2-normalised.
+    - Trigrams run over the text with spaces removed, so split words
+      ("wi fi" vs "wifi") still overlap
+    - crc32 keeps bucket ids stable across runs (hash() is salted per process)
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    words = text.split()
+    for w in words:
+        vec[zlib.crc32(w.encode()) % dim] += 1.0
+    padded = f"^{''.join(words)}$"
+    for i in range(len(padded) - 2):
+        vec[zlib.crc32(padded[i:i + 3].encode()) % dim] += 1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class SemanticCache:
+    """
+    Similarity cache for free-form (out-of-scope) answers.
+
+    - Queries are normalised and embedded with embed(); a lookup returns the
+      stored answer of the most similar earlier query whose cosine
+      similarity is >= threshold and that names the same things
+      (same_content); bench_semantic_cache.py checks the rule on labelled pairs
+    - Bounded to max_entries rows of a preallocated matrix, LRU eviction,
+      TTL, optional JSON snapshot (vectors are recomputed on load)
+    """
+    def __init__(self, max_entries: int = 512, threshold: float = 0.6,
+                 ttl_s: float = 7 * 24 * 3600, path: str | None = None,
+                 snapshot_every_s: float = 30.0, dim: int = 1024):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.path = path
+        self.snapshot_every_s = snapshot_every_s
+        self.dim = dim
+        self._vecs = np.zeros((max_entries, dim), dtype=np.float32)
+        self._slots = collections.OrderedDict()   # normalised query -> [slot, answer, stored_at, cost_ms]
+        self._keys = [None] * max_entries         # slot -> normalised query
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        if path:
+            self.load()
+
+    def get(self, query: str, count: bool = True):
+        norm = normalize_query(query)
+        if not norm:
+            return None
+        q = embed(norm, self.dim)
+        with self._lock:
+            if self._slots:
+                # free slots are all-zero rows, so they score 0
+                sims = self._vecs @ q
+                above = np.flatnonzero(sims >= self.threshold)
+                now = time.time()
+                for slot in above[np.argsort(-sims[above], kind="stable")]:
+                    key = self._keys[slot]
+                    if key is None or not same_content(norm, key):
+                        continue
+                    entry = self._slots[key]
+                    if now - entry[2] > self.ttl_s:
+                        self._evict(key)
+                        continue
+                    self._slots.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                        self.saved_ms += entry[3]
+                    return entry[1]
+            self.misses += count
+            return None
+
+    def put(self, query: str, answer: str, cost_ms: float = 0.0):
+        norm = normalize_query(query)
+        if not norm or not answer:
+            return
+        self._insert(norm, answer, time.time(), cost_ms)
+        if self.path and time.time() - self._last_save >= self.snapshot_every_s:
+            self.save()
+
+    def _insert(self, norm: str, answer: str, stored_at: float, cost_ms: float):
+        vec = embed(norm, self.dim)
+        with self._lock:
+            if norm in self._slots:
+                self._evict(norm)
+            if not self._free:
+                self._evict(next(iter(self._slots)))
+            slot = self._free.pop()
+            self._vecs[slot] = vec
+            self._keys[slot] = norm
+            self._slots[norm] = [slot, answer, stored_at, cost_ms]
+            self._dirty = True
+
+    def _evict(self, key: str):
+        slot = self._slots.pop(key)[0]
+        self._vecs[slot] = 0.0
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def clear(self):
+        """Forget every answer (e.g. the KB they were written from changed)."""
+        with self._lock:
+            for key in list(self._slots):
+                self._evict(key)
+            self._dirty = True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_calls_saved": self.hits,
+                "llm_ms_saved": round(self.saved_ms, 2),
+            }
+
+    def load(self):
+        now = time.time()
+        for norm, answer, stored_at, cost_ms in _read_snapshot(self.path)[-self.max_entries:]:
+            if now - stored_at <= self.ttl_s:
+                self._insert(norm, answer, stored_at, cost_ms)
+        self._dirty = False
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[k, e[1], e[2], e[3]] for k, e in self._slots.items()]
+            self._dirty = False
+            self._last_save = time.time()
+        _write_snapshot(self.path, rows)
@@ -0,0 +1,154 @@
+# Pick the Whisper model for this host: decode a labelled sample set with each
+# candidate model, measure its real-time factor (decode time / audio time) and
+# word error rate, and write the fastest model that meets the accuracy floor to
+# stt_profile.json, which sidecar.py reads at startup.
+#
+#   python3 calibrate_stt.py samples/                      # samples/*.wav + same-name .txt transcripts
+#   python3 calibrate_stt.py samples/ --models tiny,base,small --max-wer 0.15
+#   python3 calibrate_stt.py samples/ --decode beam --dry-run   # report only, keep the current profile
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+DEFAULT_MODELS = "tiny,base,small"
+MAX_WER = 0.15             # accuracy floor: word error rate over the whole set
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def words(text: str) -> list:
+    return _WORD.findall(text.lower())
+
+
+def edit_distance(ref: list, hyp: list) -> int:
+    """Word-level Levenshtein distance (substitutions + insertions + deletions)."""
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i]
+        for j, h in enumerate(hyp, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = cur
+    return prev[-1]
+
+
+def load_samples(sample_dir):
+    """[(name, pcm, sr, reference transcript)] for every .wav with a .txt next to it."""
+    from replay import load_wavs
+
+    samples = []
+    for name, pcm, sr in load_wavs(sample_dir):
+        txt = os.path.join(sample_dir, os.path.splitext(name)[0] + ".txt")
+        if not os.path.exists(txt):
+            print(f"[Calibrate] {name}: no {os.path.basename(txt)}, skipped")
+            continue
+        with open(txt) as f:
+            samples.append((name, pcm, sr, f.read().strip()))
+    return samples
+
+
+def kb_names() -> list:
+    import format
+
+    data = format.load_kb().data
+    return [words(info["name"]) for section in ("labs", "contacts", "rooms")
+            for info in data.get(section, {}).values() if isinstance(info, dict) and info.get("name")]
+
+
+def evaluate(stt, samples, names) -> dict:
+    """Decode every sample once; RTF, WER and how many KB names mentioned were heard."""
+    decode_s = audio_s = 0.0
+    errors = ref_words = 0
+    names_said = names_heard = 0
+    for name, pcm, sr, ref in samples:
+        t0 = time.perf_counter()
+        hyp = stt.transcribe(pcm, sr)
+        decode_s += time.perf_counter() - t0
+        audio_s += len(pcm) / sr
+        r, h = words(ref), words(hyp)
+        errors += edit_distance(r, h)
+        ref_words += len(r)
+        ref_text, hyp_text = " ".join(r), " ".join(h)
+        for n in names:
+            if " ".join(n) in ref_text:
+                names_said += 1
+                names_heard += " ".join(n) in hyp_text
+        print(f"  {name:<24} ref: {ref!r}\n  {'':<24} hyp: {hyp!r}")
+    return {
+        "rtf": round(decode_s / audio_s, 4) if audio_s else None,
+        "wer": round(errors / ref_words, 4) if ref_words else None,
+        "name_recall": round(names_heard / names_said, 4) if names_said else None,
+        "fallback_rate": round(stt.fallbacks / stt.chunks, 4) if stt.chunks else 0.0,
+        "audio_s": round(audio_s, 2),
+        "decode_s": round(decode_s, 2),
+    }
+
+
+def pick(results: dict, max_wer: float):
+    """Fastest model meeting the floor, else the most accurate one (second value False)."""
+    ok = [m for m, r in results.items() if r["wer"] is not None and r["wer"] <= max_wer]
+    if ok:
+        return min(ok, key=lambda m: results[m]["rtf"]), True
+    return min(results, key=lambda m: (results[m]["wer"] if results[m]["wer"] is not None else 1e9)), False
+
+
+def main():
+    import sidecar
+
+    p = argparse.ArgumentParser(description="Pick the fastest Whisper model that meets an accuracy floor.")
+    p.add_argument("sample_dir", help="directory of *.wav utterances with same-name .txt transcripts")
+    p.add_argument("--models", default=DEFAULT_MODELS, help="comma-separated candidates, fastest first")
+    p.add_argument("--max-wer", type=float, default=MAX_WER, help="accuracy floor (word error rate)")
+    p.add_argument("--device", default=sidecar.WHISPER_DEVICE)
+    p.add_argument("--compute-type", default=sidecar.WHISPER_COMPUTE_TYPE)
+    p.add_argument("--language", default=sidecar.WHISPER_LANGUAGE)
+    p.add_argument("--decode", choices=["adaptive", "beam"], default=sidecar.WHISPER_DECODE)
+    p.add_argument("--no-kb-prompt", action="store_true", help="decode without the KB names prompt")
+    p.add_argument("--profile", default=sidecar.STT_PROFILE, help="where to write the chosen settings")
+    p.add_argument("--dry-run", action="store_true", help="report only, do not write the profile")
+    args = p.parse_args()
+
+    samples = load_samples(args.sample_dir)
+    if not samples:
+        print(f"[Calibrate] No labelled .wav files in {args.sample_dir}")
+        sys.exit(1)
+    prompt = None if args.no_kb_prompt else sidecar.format.stt_prompt()
+    names = kb_names()
+
+    results = {}
+    for model in [m.strip() for m in args.models.split(",") if m.strip()]:
+        stt = sidecar.WhisperSTT(model, args.device, args.compute_type, language=args.language,
+                                 decode=args.decode, initial_prompt=prompt)
+        stt.warm_up()
+        stt.chunks = stt.fallbacks = 0
+        print(f"[Calibrate] {model}: {len(samples)} samples")
+        results[model] = evaluate(stt, samples, names)
+        del stt
+
+    print(f"\n{'model':<10}{'RTF':>8}{'WER':>8}{'names':>8}{'beam':>8}")
+    fmt = lambda v: f"{v:>8.3f}" if v is not None else f"{'-':>8}"
+    for model, r in results.items():
+        print(f"{model:<10}{fmt(r['rtf'])}{fmt(r['wer'])}{fmt(r['name_recall'])}{fmt(r['fallback_rate'])}")
+
+    model, met = pick(results, args.max_wer)
+    if met:
+        print(f"\n[Calibrate] {model} is the fastest model with WER <= {args.max_wer:.2f}")
+    else:
+        print(f"\n[Calibrate] No model reached WER <= {args.max_wer:.2f}; using the most accurate, {model}")
+    profile = {
+        "model": model, "device": args.device, "compute_type": args.compute_type,
+        "language": args.language, "decode": args.decode,
+        "max_wer": args.max_wer, "met_floor": met,
+        "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"), "samples": len(samples),
+        "results": results,
+    }
+    if args.dry_run:
+        return
+    with open(args.profile, "w") as f:
+        json.dump(profile, f, indent=2)
+    print(f"[Calibrate] Wrote {args.profile}")
+
+
+if __name__ == "__main__":
+    main()
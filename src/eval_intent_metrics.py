@@ -1,11 +1,24 @@
+# Intent classifier evaluation.
+#
+#   python3 eval_intent_metrics.py                          # built-in TEST_DATA below
+#   python3 eval_intent_metrics.py transcripts.jsonl --workers 8 --json report.json
+#
+# A dataset is JSONL, one {"text": ..., "intent": ...} per line. It is streamed
+# in batches to a process pool, so any size works in constant memory; metrics
+# come from a running confusion matrix. Only intent.py is imported (no KB,
+# no Gemini client, no network). Without a display the confusion matrix is
+# saved to a PNG instead of shown.
+import argparse
+import itertools
 import json
-from format import classify_intent
-from sklearn.metrics import (
-    accuracy_score, f1_score, precision_recall_fscore_support,
-    confusion_matrix, cohen_kappa_score, matthews_corrcoef
-)
-import seaborn as sns
-import matplotlib.pyplot as plt
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from intent import classify_intents
 
 # ----------------------------------------------------
 # 1. Expanded Test Dataset
@@ -42,58 +55,206 @@ TEST_DATA = [
 
 LABELS = ["greeting", "directory", "hours", "contact", "close", "out_of_scope"]
 
-# ----------------------------------------------------
-# 2. Run evaluation
-# ----------------------------------------------------
-gold_labels = []
-pred_labels = []
+def read_dataset(path):
+    """
+    (text, gold) pairs streamed from a JSONL file ("label" is accepted for
+    "intent"); rows without a text or gold label are skipped with a warning.
+    """
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                text, gold = row["text"], row.get("intent", row.get("label"))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[WARN] {path}:{n}: skipped ({e!r})", file=sys.stderr)
+                continue
+            if not isinstance(text, str) or not isinstance(gold, str) or not gold:
+                print(f"[WARN] {path}:{n}: skipped (needs a \"text\" and an \"intent\" or \"label\" string)",
+                      file=sys.stderr)
+                continue
+            yield text, gold
 
-print("==== Intent classification evaluation ====\n")
 
-for text, gold in TEST_DATA:
-    pred = classify_intent(text)
-    gold_labels.append(gold)
-    pred_labels.append(pred)
+def batches(pairs, size):
+    it = iter(pairs)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
 
-    print(f"Q: '{text:<40}' gold={gold:<12} pred={pred}")
 
-# ----------------------------------------------------
-# 3. Core Metrics
-# ----------------------------------------------------
-accuracy = accuracy_score(gold_labels, pred_labels)
-macro_f1 = f1_score(gold_labels, pred_labels, average="macro")
-weighted_f1 = f1_score(gold_labels, pred_labels, average="weighted")
-kappa = cohen_kappa_score(gold_labels, pred_labels)
-mcc = matthews_corrcoef(gold_labels, pred_labels)
-
-print("\nOverall Metrics:")
-print(f"  Accuracy     : {accuracy:.3f}")
-print(f"  Macro-F1     : {macro_f1:.3f}")
-print(f"  Weighted-F1  : {weighted_f1:.3f}")
-print(f"  Cohen Kappa  : {kappa:.3f}")
-print(f"  MCC          : {mcc:.3f}")
+def classify_batch(texts):
+    """
+    Runs in a worker: intent.classify_intents predictions and the per-query
+    latency (us), i.e. the batch time over its size, once per query.
+    """
+    t0 = time.perf_counter()
+    preds = classify_intents(texts)
+    us = (time.perf_counter() - t0) * 1e6 / len(texts) if texts else 0.0
+    return preds, [us] * len(texts)
 
-# ----------------------------------------------------
-# 4. Per-class metrics
-# ----------------------------------------------------
-prec, rec, f1, _ = precision_recall_fscore_support(
-    gold_labels, pred_labels, labels=LABELS, zero_division=0
-)
 
-print("\nPer-label metrics:")
-for i, label in enumerate(LABELS):
-    print(f"  {label:<12} P={prec[i]:.3f}  R={rec[i]:.3f}  F1={f1[i]:.3f}")
+def run_batches(stream, workers, batch_size):
+    """Yields (batch, preds, latencies_us) in dataset order, at most 2 x workers batches in flight."""
+    if workers <= 1:
+        for batch in batches(stream, batch_size):
+            yield (batch, *classify_batch([t for t, _ in batch]))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        inflight = []
+        for batch in batches(stream, batch_size):
+            inflight.append((batch, pool.submit(classify_batch, [t for t, _ in batch])))
+            if len(inflight) >= 2 * workers:
+                b, f = inflight.pop(0)
+                yield (b, *f.result())
+        for b, f in inflight:
+            yield (b, *f.result())
 
-# ----------------------------------------------------
-# 5. Confusion Matrix Plot
-# ----------------------------------------------------
-cm = confusion_matrix(gold_labels, pred_labels, labels=LABELS)
-
-plt.figure(figsize=(8, 6))
-sns.heatmap(cm, annot=True, fmt="d", cmap="Blues",
-            xticklabels=LABELS, yticklabels=LABELS)
-plt.xlabel("Predicted Label")
-plt.ylabel("True Label")
-plt.title("Intent Classification Confusion Matrix")
-plt.tight_layout()
-plt.show()
+
+def scores(cm: np.ndarray) -> dict:
+    """Accuracy, macro / weighted F1, Cohen's kappa, MCC and per-label P/R/F1 from a confusion matrix."""
+    n = cm.sum()
+    tp = np.diag(cm).astype(float)
+    pred_tot = cm.sum(axis=0).astype(float)
+    gold_tot = cm.sum(axis=1).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prec = np.nan_to_num(tp / pred_tot)
+        rec = np.nan_to_num(tp / gold_tot)
+        f1 = np.nan_to_num(2 * prec * rec / (prec + rec))
+    acc = tp.sum() / n if n else 0.0
+    expected = (pred_tot * gold_tot).sum() / n ** 2 if n else 0.0
+    kappa = (acc - expected) / (1 - expected) if expected < 1 else 0.0
+    cov_pg = tp.sum() * n - (pred_tot * gold_tot).sum()
+    denom = np.sqrt((n ** 2 - (pred_tot ** 2).sum()) * (n ** 2 - (gold_tot ** 2).sum()))
+    present = gold_tot > 0
+    return {
+        "accuracy": acc,
+        "macro_f1": f1[present].mean() if present.any() else 0.0,
+        "weighted_f1": (f1 * gold_tot).sum() / n if n else 0.0,
+        "kappa": kappa,
+        "mcc": cov_pg / denom if denom else 0.0,
+        "per_label": {"precision": prec, "recall": rec, "f1": f1, "support": gold_tot},
+    }
+
+
+def plot_confusion(cm, labels, path=None):
+    """Saves to `path` if given (or when there is no display), otherwise shows the plot."""
+    import matplotlib
+    if path or not os.environ.get("DISPLAY"):
+        matplotlib.use("Agg")
+        path = path or "intent_confusion.png"
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(8, 6))
+    try:
+        import seaborn as sns
+        sns.heatmap(cm, annot=True, fmt="d", cmap="Blues", xticklabels=labels, yticklabels=labels)
+    except ImportError:
+        plt.imshow(cm, cmap="Blues")
+        plt.xticks(range(len(labels)), labels, rotation=45)
+        plt.yticks(range(len(labels)), labels)
+        for (i, j), v in np.ndenumerate(cm):
+            plt.text(j, i, str(v), ha="center", va="center")
+    plt.xlabel("Predicted Label")
+    plt.ylabel("True Label")
+    plt.title("Intent Classification Confusion Matrix")
+    plt.tight_layout()
+    if path:
+        plt.savefig(path, dpi=120)
+        print(f"\nConfusion matrix saved to {path}")
+    else:
+        plt.show()
+
+
+def main():
+    from avg_latency import QuantileSketch
+
+    p = argparse.ArgumentParser(description="Evaluate the keyword intent classifier.")
+    p.add_argument("dataset", nargs="?", help="JSONL of {text, intent} (default: built-in TEST_DATA)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--batch-size", type=int, default=2000)
+    p.add_argument("--confusion", default=None, help="save the confusion matrix plot here")
+    p.add_argument("--no-plot", action="store_true")
+    p.add_argument("--json", default=None, help="write the metrics here")
+    p.add_argument("--verbose", action="store_true", help="print every query")
+    args = p.parse_args()
+
+    stream = read_dataset(args.dataset) if args.dataset else iter(TEST_DATA)
+    verbose = args.verbose or not args.dataset
+    workers = args.workers if args.dataset else 1
+
+    # ----------------------------------------------------
+    # 2. Run evaluation
+    # ----------------------------------------------------
+    print("==== Intent classification evaluation ====\n")
+    labels = list(LABELS)
+    index = {label: i for i, label in enumerate(labels)}
+    cm = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    latency = QuantileSketch()
+    total = 0
+
+    t0 = time.perf_counter()
+    for batch, preds, us in run_batches(stream, workers, args.batch_size):
+        for (text, gold), pred in zip(batch, preds):
+            for label in (gold, pred):
+                if label not in index:
+                    index[label] = len(labels)
+                    labels.append(label)
+                    cm = np.pad(cm, ((0, 1), (0, 1)))
+            cm[index[gold], index[pred]] += 1
+            if verbose:
+                print(f"Q: '{text:<40}' gold={gold:<12} pred={pred}")
+        for v in us:
+            latency.add(v)
+        total += len(batch)
+    wall_s = time.perf_counter() - t0
+
+    if not total:
+        print("No queries to evaluate.")
+        return
+
+    # ----------------------------------------------------
+    # 3. Core Metrics
+    # ----------------------------------------------------
+    m = scores(cm)
+    print(f"\nQueries: {total}  workers={workers}  wall={wall_s:.2f}s  "
+          f"throughput={total / wall_s:,.0f} queries/s")
+    print(f"Per-query latency (batch average): p50={latency.quantile(0.5):.2f} us  "
+          f"p99={latency.quantile(0.99):.2f} us  max={latency.max:.2f} us")
+    print("\nOverall Metrics:")
+    print(f"  Accuracy     : {m['accuracy']:.3f}")
+    print(f"  Macro-F1     : {m['macro_f1']:.3f}")
+    print(f"  Weighted-F1  : {m['weighted_f1']:.3f}")
+    print(f"  Cohen Kappa  : {m['kappa']:.3f}")
+    print(f"  MCC          : {m['mcc']:.3f}")
+
+    # ----------------------------------------------------
+    # 4. Per-class metrics
+    # ----------------------------------------------------
+    per = m["per_label"]
+    print("\nPer-label metrics:")
+    for i, label in enumerate(labels):
+        print(f"  {label:<12} P={per['precision'][i]:.3f}  R={per['recall'][i]:.3f}  "
+              f"F1={per['f1'][i]:.3f}  n={int(per['support'][i])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "queries": total, "workers": workers, "wall_s": wall_s,
+                "throughput_qps": total / wall_s,
+                "latency_us": {"p50": latency.quantile(0.5), "p95": latency.quantile(0.95),
+                               "p99": latency.quantile(0.99), "max": latency.max},
+                **{k: float(m[k]) for k in ("accuracy", "macro_f1", "weighted_f1", "kappa", "mcc")},
+                "per_label": {label: {k: float(v[i]) for k, v in per.items()}
+                              for i, label in enumerate(labels)},
+                "labels": labels, "confusion": cm.tolist(),
+            }, f, indent=2)
+
+    # ----------------------------------------------------
+    # 5. Confusion Matrix Plot
+    # ----------------------------------------------------
+    if not args.no_plot:
+        plot_confusion(cm, labels, args.confusion)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Python 3 stand-in for body.py (no NAO, no naoqi, stdlib only).
+
+Serves the same endpoints the sidecar uses (/perform, /talk, /talk/<id>,
+/talk/stop, /speaking, /output, /wave_hand, /bow, /behaviors/stats). Speech
+is simulated: a job "speaks" for len(text) / chars_per_s seconds, one job at
+a time, and can be cut short by /talk/stop; a gesture "runs" for GESTURE_S.
+
+    python3 fake_body.py                 # on port 5006, like body.py
+    python3 fake_body.py 5006 14.0       # port, characters spoken per second
+"""
+
+from __future__ import annotations
+import collections
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHARS_PER_S = 14.0        # about NAO's default speaking rate
+GESTURE_S = 2.0           # simulated duration of a wave / bow
+MAX_POLL_S = 30.0
+GESTURES = ("wave_right", "wave_left", "bow")
+
+
+class FakeOutputs:
+    """Numbered speech / gesture start and end events, as body.output_events."""
+    def __init__(self, keep: int = 500):
+        self.events = collections.deque(maxlen=keep)
+        self.seq = 0
+        self.active = set()
+        self.changed = threading.Condition()
+
+    def publish(self, kind: str, event: str, ref):
+        with self.changed:
+            if event == "start":
+                self.active.add((kind, ref))
+            else:
+                self.active.discard((kind, ref))
+            self.seq += 1
+            self.events.append({"seq": self.seq, "t": time.time(), "kind": kind, "event": event,
+                                "ref": ref, "active": len(self.active)})
+            self.changed.notify_all()
+
+    def since(self, seq: int, wait: float = 0.0) -> dict:
+        with self.changed:
+            if seq > self.seq:
+                seq = 0
+            deadline = time.time() + min(max(wait, 0.0), MAX_POLL_S)
+            while self.seq == seq and time.time() < deadline:
+                self.changed.wait(deadline - time.time())
+            return {"seq": self.seq, "active": len(self.active),
+                    "events": [e for e in self.events if e["seq"] > seq]}
+
+
+class FakeSpeech:
+    """Serial speech queue with the job states of body.speech_queue."""
+    def __init__(self, chars_per_s: float = CHARS_PER_S, outputs: FakeOutputs | None = None):
+        self.chars_per_s = chars_per_s
+        self.outputs = outputs or FakeOutputs()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.current = None
+        self.changed = threading.Condition()
+        self._stop = threading.Event()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, message: str, language: str) -> dict:
+        with self.changed:
+            job = {"id": next(self.ids), "message": message, "language": language,
+                   "state": "queued", "created": time.time(), "started": None,
+                   "finished": None, "error": None}
+            self.jobs[job["id"]] = job
+            self.changed.notify_all()
+            return dict(job)
+
+    def _next_job(self):
+        with self.changed:
+            while True:
+                queued = [j for j in self.jobs.values() if j["state"] == "queued"]
+                if queued:
+                    job = min(queued, key=lambda j: j["id"])
+                    job["state"], job["started"] = "speaking", time.time()
+                    self.current = job
+                    self._stop.clear()
+                    self.changed.notify_all()
+                    return job
+                self.changed.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            self.outputs.publish("speech", "start", job["id"])
+            stopped = self._stop.wait(len(str(job["message"] or "")) / self.chars_per_s)
+            with self.changed:
+                job["state"] = "cancelled" if stopped else "done"
+                job["finished"] = time.time()
+                self.current = None
+                self.changed.notify_all()
+            self.outputs.publish("speech", "end", job["id"])
+
+    def _wait(self, done, wait: float):
+        deadline = time.time() + min(max(wait, 0.0), MAX_POLL_S)
+        while not done() and time.time() < deadline:
+            self.changed.wait(deadline - time.time())
+
+    def status(self, job_id: int, wait: float = 0.0):
+        with self.changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self._wait(lambda: job["state"] not in ("queued", "speaking"), wait)
+            return dict(job)
+
+    def speaking_state(self, wait: float = 0.0, speaking=None) -> dict:
+        with self.changed:
+            queued = lambda: sum(j["state"] == "queued" for j in self.jobs.values())
+            is_speaking = lambda: self.current is not None or queued() > 0
+            if speaking is not None:
+                self._wait(lambda: is_speaking() != speaking, wait)
+            return {"speaking": is_speaking(),
+                    "job_id": self.current["id"] if self.current else None,
+                    "queued": queued()}
+
+    def stop(self, job_id=None) -> list:
+        cancelled = []
+        with self.changed:
+            for job in self.jobs.values():
+                if job["state"] == "queued" and job_id in (None, job["id"]):
+                    job["state"], job["finished"] = "cancelled", time.time()
+                    cancelled.append(job["id"])
+            if self.current is not None and job_id in (None, self.current["id"]):
+                cancelled.append(self.current["id"])
+                self._stop.set()
+            self.changed.notify_all()
+        return cancelled
+
+
+class FakeBody:
+    """ThreadingHTTPServer around FakeSpeech; port 0 picks a free port."""
+    def __init__(self, port: int = 0, chars_per_s: float = CHARS_PER_S):
+        self.outputs = FakeOutputs()
+        self.speech = FakeSpeech(chars_per_s, self.outputs)
+        self.gestures = {}                    # gesture -> count
+        self._gesture_ids = itertools.count(1)
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.base = f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "FakeBody":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+
+    def gesture(self, name):
+        if name:
+            self.gestures[name] = self.gestures.get(name, 0) + 1
+            ref = f"{name}#{next(self._gesture_ids)}"
+            self.outputs.publish("gesture", "start", ref)
+            threading.Timer(GESTURE_S, self.outputs.publish, ("gesture", "end", ref)).start()
+        return "queued" if name else None
+
+    def _handler(self):
+        body = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"      # keep-alive, like the pooled client expects
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload: dict, code: int = 200):
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _json(self) -> dict:
+                n = int(self.headers.get("Content-Length") or 0)
+                try:
+                    return json.loads(self.rfile.read(n) or b"{}") or {}
+                except ValueError:
+                    return {}
+
+            def do_GET(self):
+                body.requests += 1
+                url = urlparse(self.path)
+                args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                wait = float(args.get("wait", 0.0))
+                if url.path.startswith("/talk/"):
+                    job = body.speech.status(int(url.path.rsplit("/", 1)[1]), wait)
+                    if job is None:
+                        return self._reply({"success": False, "error": "unknown job"}, 404)
+                    return self._reply({"success": True, **job})
+                if url.path == "/speaking":
+                    flag = args.get("speaking")
+                    speaking = None if flag is None else flag not in ("0", "false")
+                    return self._reply({"success": True, **body.speech.speaking_state(wait, speaking)})
+                if url.path == "/output":
+                    since = int(args.get("since", 0))
+                    return self._reply({"success": True, **body.outputs.since(since, wait)})
+                if url.path == "/behaviors/stats":
+                    return self._reply({"success": True, "gestures": body.gestures})
+                self._reply({"success": False, "error": "not found"}, 404)
+
+            def do_POST(self):
+                body.requests += 1
+                path = urlparse(self.path).path
+                data = self._json()
+                if path in ("/talk", "/perform"):
+                    gesture = data.get("gesture") if path == "/perform" else None
+                    if gesture and gesture not in GESTURES:
+                        return self._reply({"success": False, "error": f"unknown gesture {gesture}"}, 400)
+                    status = body.gesture(gesture)
+                    job = None
+                    if data.get("message"):
+                        job = body.speech.submit(data["message"], data.get("language"))
+                        if data.get("wait"):
+                            job = body.speech.status(job["id"], MAX_POLL_S)
+                    return self._reply({"success": True, "gesture": gesture, "gesture_status": status,
+                                        "job_id": job["id"] if job else None,
+                                        "state": job["state"] if job else None})
+                if path == "/talk/stop":
+                    return self._reply({"success": True, "cancelled": body.speech.stop(data.get("job_id"))})
+                if path == "/wave_hand":
+                    hand = data.get("hand", "right")
+                    return self._reply({"success": True, "hand": hand,
+                                        "status": body.gesture(f"wave_{hand}")})
+                if path == "/bow":
+                    return self._reply({"success": True, "status": body.gesture("bow")})
+                self._reply({"success": False, "error": "not found"}, 404)
+
+        return Handler
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5006
+    chars_per_s = float(sys.argv[2]) if len(sys.argv) > 2 else CHARS_PER_S
+    body = FakeBody(port, chars_per_s)
+    print(f"[FakeBody] Listening on {body.base} ({chars_per_s:.0f} chars/s speech)")
+    try:
+        body.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
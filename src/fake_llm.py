@@ -0,0 +1,127 @@
+"""
+Offline stand-in for google.genai.Client, for testing planner deadlines,
+hedging and the pipeline without network access or an API key.
+
+    client = FakeClient(delay_s=2.0)
+    client.models.generate_content(model=..., contents=prompt).text
+    client.models.generate_content_stream(model=..., contents=prompt)
+
+format.py uses it when NAO_LLM_BACKEND=fake. Replies are deterministic: the
+"Info: ..." part of a KB-backed prompt is echoed back, anything else gets a
+fixed sentence.
+
+    NAO_LLM_BACKEND=fake python3 fake_llm.py     # plan_reply vs delay demo
+"""
+
+from __future__ import annotations
+import itertools
+import re
+import threading
+import time
+
+_INFO = re.compile(r"Info: (.*?)\.* Reply politely", re.S)
+DEFAULT_REPLY = "I am a test reply from the offline language model. Please ask at the front desk."
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Stream:
+    """
+    Streamed reply, one chunk per word. close() ends it at once, also from
+    another thread while a chunk is being waited for, as closing an HTTP
+    response does.
+    """
+    def __init__(self, words, delay_s: float, chunk_delay_s: float,
+                 stall_after: int | None = None, stall_s: float = 0.0):
+        self.words = words
+        self.delays = [delay_s] + [chunk_delay_s] * (len(words) - 1)
+        if stall_after is not None and stall_after < len(words):
+            self.delays[stall_after] += stall_s
+        self.closed = threading.Event()
+        self._i = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self._i
+        if i >= len(self.words) or self.closed.wait(self.delays[i]):
+            raise StopIteration
+        self._i += 1
+        return _Response(self.words[i] if i == len(self.words) - 1 else self.words[i] + " ")
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeClient:
+    """
+    - delay_s: time before the reply (blocking) or the first chunk (stream)
+    - slow_every / slow_delay_s: every Nth call takes slow_delay_s instead,
+      to reproduce the occasional slow Gemini response
+    - chunk_delay_s: gap between streamed chunks (one chunk per word)
+    - stall_after / stall_s: streams go silent for stall_s before that word,
+      to reproduce a backend that stalls mid-reply
+    """
+    def __init__(self, delay_s: float = 1.0, slow_every: int = 0, slow_delay_s: float = 12.0,
+                 chunk_delay_s: float = 0.02, reply: str | None = None,
+                 stall_after: int | None = None, stall_s: float = 60.0):
+        self.delay_s = delay_s
+        self.slow_every = slow_every
+        self.slow_delay_s = slow_delay_s
+        self.chunk_delay_s = chunk_delay_s
+        self.reply = reply
+        self.stall_after = stall_after
+        self.stall_s = stall_s
+        self.streams = []           # every stream handed out, to check they were closed
+        self.calls = itertools.count(1)
+        self._lock = threading.Lock()
+        self.models = self          # client.models.generate_content(...)
+
+    def _delay(self) -> float:
+        with self._lock:
+            n = next(self.calls)
+        if self.slow_every and n % self.slow_every == 0:
+            return self.slow_delay_s
+        return self.delay_s
+
+    def _text(self, contents: str) -> str:
+        if self.reply is not None:
+            return self.reply
+        m = _INFO.search(contents)
+        return f"{m.group(1)}." if m else DEFAULT_REPLY
+
+    def generate_content(self, model: str, contents: str):
+        time.sleep(self._delay())
+        return _Response(self._text(contents))
+
+    def generate_content_stream(self, model: str, contents: str):
+        stream = _Stream(self._text(contents).split(" "), self._delay(), self.chunk_delay_s,
+                         self.stall_after, self.stall_s)
+        self.streams.append(stream)
+        return stream
+
+
+def main():
+    import format
+    from cache import ResponseCache, SemanticCache
+
+    queries = ["where is the midas lab", "who is professor sharma", "what is the capital of france"]
+    for delay in (0.2, 1.0, 6.0):
+        format.client = FakeClient(delay_s=delay)
+        # fresh in-memory caches so every query reaches the (fake) LLM
+        format.response_cache = ResponseCache(path=None)
+        format.semantic_cache = SemanticCache(path=None)
+        for q in queries:
+            info = {}
+            t0 = time.time()
+            reply, intent = format.plan_reply(q, info=info)
+            print(f"delay {delay:3.1f}s  {intent:<12} {info['source']:<8} "
+                  f"{(time.time() - t0) * 1000:6.0f} ms  {reply}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,137 @@
 # Ai generated
 
-import json
-from google import genai
+import atexit
+import functools
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from cache import ResponseCache, SemanticCache, normalize_query
+from kb_store import KBStore
+from intent import classify_intent       # 1) intent classification lives in intent.py
+from tracing import bind, span
 # from huggingface_hub import InferenceClient
 
 # ===== CONFIG =====
-SR = 16000                                 # sample rate from body.py
-MODEL_SIZE = "base"                        # tiny / base / small / medium / large-v3
-DEVICE = "cpu"                             # or "cuda" if GPU is available
-COMPUTE_TYPE = "int8"                      # "float16"/"int8_float16"/"int8" etc.
+# (Whisper model / device / compute type live in sidecar.py and stt_profile.json)
+
+RESPONSE_CACHE_SIZE = 256                  # replies kept, keyed on (intent, lookup result)
+RESPONSE_CACHE_TTL_S = 24 * 3600           # KB answers older than this are regenerated
+RESPONSE_CACHE_PATH = "response_cache.json"  # None = in-memory only
+SEMANTIC_CACHE_SIZE = 512                  # out-of-scope answers kept, keyed on the transcript
+SEMANTIC_CACHE_THRESHOLD = 0.6             # cosine similarity needed to reuse an answer (content words
+                                           # must agree too; see bench_semantic_cache.py)
+SEMANTIC_CACHE_TTL_S = 7 * 24 * 3600
+SEMANTIC_CACHE_PATH = "semantic_cache.json"  # None = in-memory only
+LOOKUP_TOP_K = 3                           # KB candidates handed to the LLM per lookup
+TEMPLATE_INTENTS = {"greeting", "close"}   # answered without the LLM; add "directory",
+                                           # "contact", "hours" to speak KB results verbatim
+PROMPT_TOP_K = 8                           # KB entries retrieved for out-of-scope prompts
+PROMPT_TOKEN_BUDGET = 500                  # cap on KB context tokens in those prompts
+CHARS_PER_TOKEN = 4                        # rough estimate for English / JSON text
+STT_PROMPT_CHARS = 600                     # KB names handed to Whisper as initial_prompt
+PLAN_BUDGET_S = 4.0                        # LLM answer (first chunk when streaming) deadline;
+                                           # past it the lookup result is spoken as-is
+STREAM_STALL_S = 3.0                       # a streamed reply silent for this long after its first
+                                           # chunk ends with the text received so far
+HEDGE_AFTER_S = 2.0                        # send a second identical request if the first is
+                                           # still silent after this long (None = never)
+LLM_WORKERS = 4                            # concurrent LLM requests (hedges included)
+SPEC_SETTLE = 2                            # same route on this many partial transcripts in a row
+                                           # (or one taken in a pause) starts the LLM early
+SPEC_MAX_STARTS = 2                        # speculative LLM requests per utterance at most
+LLM_BACKEND = os.environ.get("NAO_LLM_BACKEND", "gemini")   # "fake" = fake_llm.FakeClient
+FAKE_LLM_DELAY_S = float(os.environ.get("NAO_FAKE_LLM_DELAY_S", "1.0"))
 
 # ==== Kb and LLM ==== 
 
 # ---------------------------------------------------------
 # 0) Load Knowledge Base 
 # ---------------------------------------------------------
-with open("kb.json") as f:
-    faq_data = json.load(f)
-
-client = genai.Client()
-
-# ---------------------------------------------------------
-# 1) Slightly improved intent classification
-# ---------------------------------------------------------
-def classify_intent(query):
-    q = query.lower()
-
-    # who queries → faculty/contact lookup
-    if any(w in q for w in ["who is", "faculty", "professor", "prof", "contact", "email"]):
-        return "contact"
-
-    # where / location navigation queries
-    if any(w in q for w in ["where is", "locate", "find", "location", "room", "lab"]):
-        return "directory"
-
-    # greeting
-    if any(word in q for word in ["hello", "hi", "hey"]):
-        return "greeting"
-
-    # closing
-    if "thank" in q or "bye" in q:
-        return "close"
-
-    # hours / timing
-    if any(w in q for w in ["open", "close", "when", "hours"]):
-        return "hours"
-
-    return "out_of_scope"
+# Loaded on first use (or by load_kb() / get_client() during sidecar startup),
+# so importing this module stays cheap. Each load is a kb_store.KBSnapshot:
+# the KB plus its token index (kb.index), misspelling-tolerant name matcher
+# (kb.matcher) and prompt texts. kb.json is watched and reloaded in the
+# background; a request uses the one snapshot it started with.
+KB_PATH = "kb.json"
+KB_WATCH_S = 2.0         # poll kb.json for changes this often; None = load once
+kb_store = None
+client = None
+_load_lock = threading.Lock()
+
+def load_kb():
+    """The current KB snapshot (loaded, and the watcher started, on first use)."""
+    global kb_store
+    with _load_lock:
+        if kb_store is None:
+            kb_store = KBStore(KB_PATH)
+            kb_store.on_reload.append(_on_kb_reload)
+    kb = kb_store.current or kb_store.load()
+    if KB_WATCH_S:
+        kb_store.watch(KB_WATCH_S)
+    return kb
+
+def _on_kb_reload(kb):
+    # out-of-scope answers quote KB context; KB answers are keyed on the
+    # lookup text, so changed entries miss the response cache by themselves
+    semantic_cache.clear()
+
+def get_client():
+    """The LLM client, created on first use (google.genai is only imported then)."""
+    global client
+    with _load_lock:
+        if client is None:
+            if LLM_BACKEND == "fake":
+                from fake_llm import FakeClient
+                client = FakeClient(delay_s=FAKE_LLM_DELAY_S)
+            else:
+                from google import genai
+                client = genai.Client()
+    return client
+
+llm_pool = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl_s=RESPONSE_CACHE_TTL_S,
+    path=RESPONSE_CACHE_PATH,
+)
+semantic_cache = SemanticCache(
+    max_entries=SEMANTIC_CACHE_SIZE,
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_s=SEMANTIC_CACHE_TTL_S,
+    path=SEMANTIC_CACHE_PATH,
+)
+atexit.register(response_cache.save)
+atexit.register(semantic_cache.save)
 
 # ---------------------------------------------------------
-# 2) Utility: fuzzy match helper (broader matching)
+# 2) Ranked KB search shared by the lookups
 # ---------------------------------------------------------
-def fuzzy_match(q, text):
-    """Loose fuzzy matching for names, rooms, labs."""
-    q = q.lower()
-    text = text.lower()
-    return q in text or text in q or any(w in text for w in q.split())
+def search_kb(query, sections, kb=None):
+    """
+    Exact token matches first; if the distinctive words of the query matched
+    nothing (often an STT misspelling), try approximate name matching; only
+    then settle for generic words like "lab", and only for a query that has
+    no other words ("where is the lab").
+    """
+    kb = kb or load_kb()
+    return (
+        kb.index.search(query, sections, k=LOOKUP_TOP_K, common_fallback=False)
+        or kb.matcher.match(kb.index.specific_words(query, sections), sections, k=LOOKUP_TOP_K)
+        or kb.index.search(query, sections, k=LOOKUP_TOP_K)
+    )
 
 # ---------------------------------------------------------
-# 3) Improved directory lookup (rooms + labs together)
+# 3) Directory lookup (rooms + labs together)
 # ---------------------------------------------------------
-def lookup_directory(query):
-    q = query.lower()
-    candidates = []
-
-    # rooms
-    for room_id, info in faq_data.get("rooms", {}).items():
-        entry_text = f"{room_id} {info['name']} {info['location']}"
-        if fuzzy_match(q, entry_text):
-            candidates.append(f"{info['name']} is located at {info['location']}.")
-
-    # labs
-    for lab_id, info in faq_data.get("labs", {}).items():
-        entry_text = f"{lab_id} {info['name']} {info['location']}"
-        if fuzzy_match(q, entry_text):
-            candidates.append(f"{info['name']} is located at {info['location']}.")
+def lookup_directory(query, kb=None):
+    candidates = [
+        f"{info['name']} is located at {info['location']}."
+        for _, _, _, info in search_kb(query, ("rooms", "labs"), kb)
+    ]
 
     # If multiple → LLM chooses the best one
     if candidates:
@@ -83,116 +140,605 @@ def lookup_directory(query):
     return None
 
 # ---------------------------------------------------------
-# 4) Improved contact lookup (fuzzy on name + office + email)
+# 4) Contact lookup (name + office + email)
 # ---------------------------------------------------------
-def lookup_contact(query):
-    q = query.lower()
-    candidates = []
-
-    for cid, info in faq_data.get("contacts", {}).items():
-        entry_text = f"{info['name']} {info['email']} {info['office']}"
-        if fuzzy_match(q, entry_text):
-            candidates.append(
-                f"{info['name']} sits in {info['office']}. Email: {info['email']}."
-            )
+def lookup_contact(query, kb=None):
+    candidates = [
+        f"{info['name']} sits in {info['office']}. Email: {info['email']}."
+        for _, _, _, info in search_kb(query, ("contacts",), kb)
+    ]
 
     if candidates:
         return " ".join(candidates)
 
     return None
 
-
 # ---------------------------------------------------------
-# 5) Hours unchanged but slightly more flexible
+# 5) Hours lookup
 # ---------------------------------------------------------
-def lookup_hours(query):
-    q = query.lower()
-    for place, hours in faq_data.get("hours", {}).items():
-        if place in q:
-            return f"The {place} is open {hours}."
+def lookup_hours(query, kb=None):
+    kb = kb or load_kb()
+    for _, _, place, hours in kb.index.search(query, ("hours",), k=1):
+        return f"The {place} is open {hours}."
     return None
 
 
 # ---------------------------------------------------------
-# 6) Updated LLM formatter (now supports out-of-scope free replies)
+# 5b) KB context for out-of-scope prompts
 # ---------------------------------------------------------
-def format_reply(intent, lookup_result=None, user_query=None):
+def prompt_context(query):
+    """
+    The KB entries most relevant to the query, serialised (once, at KB load)
+    and cut to PROMPT_TOKEN_BUDGET. Returns (text, entries used).
+    """
+    kb = load_kb()
+    sections = tuple(kb.index.sections)
+    hits = (
+        kb.index.search(query, sections, k=PROMPT_TOP_K, min_ratio=0.0)
+        or kb.matcher.match(query, sections, k=PROMPT_TOP_K, min_ratio=0.0)
+    )
+    return kb.index.render(hits, PROMPT_TOKEN_BUDGET * CHARS_PER_TOKEN)
+
+
+def stt_prompt(max_chars=STT_PROMPT_CHARS):
+    """
+    Lab, faculty and room names from the KB as a Whisper initial_prompt, so
+    decoding leans towards the spellings visitors ask about. Labs and people
+    first, cut at max_chars (Whisper only keeps ~224 prompt tokens).
+    """
+    data = load_kb().data
+    names = []
+    for section in ("labs", "contacts", "rooms"):
+        for info in data.get(section, {}).values():
+            name = info.get("name") if isinstance(info, dict) else None
+            if name and name not in names:
+                names.append(name)
+    text = "Names:"
+    for name in names:
+        if len(text) + len(name) + 2 > max_chars:
+            break
+        text += (" " if text == "Names:" else ", ") + name
+    return text + "."
+
 
+# ---------------------------------------------------------
+# 6) Updated LLM formatter (now supports out-of-scope free replies)
+# ---------------------------------------------------------
+LLM_MODEL = "gemini-2.5-flash"
+NO_ANSWER = "Sorry, I don’t know that. Please ask about rooms, labs, faculty, contacts, or hours."
+BUSY_REPLY = "Sorry, I can’t answer that right now. Please ask at the front desk."
+
+def build_prompt(intent, lookup_result=None, user_query=None):
+    """
+    Prompt for the LLM, or None when there is nothing to ask it
+    (in-scope intent without a KB lookup result).
+    """
     # Normal KB-backed replies
     if intent != "out_of_scope" and lookup_result:
         prompt = (
             f"User asked about {intent}. Info: {lookup_result}. "
             f"Reply politely in one natural sentence using ONLY the info given."
         )
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=f"You are NAO, the receptionist robot. {prompt}"
-        )
-        return response.text
+        return f"You are NAO, the receptionist robot. {prompt}"
 
     # OUT OF SCOPE — NEW LOGIC
     if intent == "out_of_scope":
-        # Provide the KB context to restrict hallucinations
-        kb_context = json.dumps({
-            "rooms": list(faq_data["rooms"].values()),
-            "labs": list(faq_data["labs"].values()),
-            "contacts": list(faq_data["contacts"].values()),
-            "hours": faq_data["hours"],
-        })
+        # Only the relevant part of the KB, to restrict hallucinations
+        kb_context, _ = prompt_context(user_query)
 
-        prompt = (
+        return (
             "You are NAO, the receptionist robot at IIIT-Delhi. "
             "The user asked something outside the strict FAQ categories. "
             "Respond politely and helpfully using general knowledge of a receptionist, "
             "but DO NOT invent specific factual details that are not present in the building KB.\n\n"
-            f"Building Knowledge Base:\n{kb_context}\n\n"
+            f"Building Knowledge Base (entries related to the query):\n{kb_context or '(none)'}\n\n"
             f"User Query: {user_query}\n"
             "Provide a friendly, short receptionist-style response."
         )
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        return response.text
+    return None
+
+def format_reply(intent, lookup_result=None, user_query=None):
+    with span("prompt"):
+        prompt = build_prompt(intent, lookup_result, user_query)
 
     # If no lookup result for in-scope queries
-    return "Sorry, I don’t know that. Please ask about rooms, labs, faculty, contacts, or hours."
+    if prompt is None:
+        return NO_ANSWER
+
+    t0 = time.time()
+    with span("llm", prompt_chars=len(prompt)):
+        response = get_client().models.generate_content(model=LLM_MODEL, contents=prompt)
+    _log_llm(intent, prompt, t0)
+    return response.text
+
+def format_reply_stream(intent, lookup_result=None, user_query=None, opened=None):
+    """
+    Same as format_reply, but yields the text in chunks as Gemini streams it.
+    opened(response), if given, is called with the response stream before the
+    first chunk is read, so the caller can close() it (see _LLMStream.cancel).
+    """
+    with span("prompt"):
+        prompt = build_prompt(intent, lookup_result, user_query)
+    if prompt is None:
+        yield NO_ANSWER
+        return
+
+    t0 = time.time()
+    first = None
+    with span("llm", prompt_chars=len(prompt), stream=True) as attrs:
+        response = get_client().models.generate_content_stream(model=LLM_MODEL, contents=prompt)
+        if opened is not None:
+            opened(response)
+        for chunk in response:
+            if chunk.text:
+                if first is None:
+                    first = time.time()
+                    attrs["first_chunk_ms"] = round((first - t0) * 1000.0, 1)
+                yield chunk.text
+    _log_llm(intent, prompt, t0, first)
+
+def fallback_reply(intent, lookup_result=None, user_query=None):
+    """
+    Deterministic reply for when the LLM misses its deadline: the KB lookup
+    sentences themselves ("MIDAS Lab is located at R&D Block, 4th floor A409.").
+    """
+    if intent == "out_of_scope":
+        return BUSY_REPLY
+    return lookup_result or NO_ANSWER
+
+def _log_llm(intent, prompt, t0, first=None):
+    """One line per LLM call: prompt size and latency."""
+    total_ms = (time.time() - t0) * 1000.0
+    first_ms = f", first chunk {(first - t0) * 1000.0:.0f} ms" if first else ""
+    print(f"[LLM] {intent}: prompt {len(prompt)} chars (~{len(prompt) // CHARS_PER_TOKEN} tokens)"
+          f"{first_ms}, total {total_ms:.0f} ms")
 
 # ---------------------------------------------------------
-# 7) Final combined pipeline
+# 7) Sentence splitting for incremental speech
 # ---------------------------------------------------------
-def plan_reply(q: str):
-
-    if q.lower() in ["quit", "exit"]:
-        return q
-
-    intent = classify_intent(q)
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+_ABBREVIATIONS = {"prof", "dr", "mr", "mrs", "ms", "md", "st", "no", "vs", "etc", "e.g", "i.e"}
+
+class SentenceSplitter:
+    """
+    Cuts streamed text into complete sentences.
+    - feed() returns the sentences completed by the new text
+    - A sentence ends at . ! or ? followed by whitespace, except after
+      abbreviations ("Prof.", "Dr.") and initials ("V. Raghava")
+    - flush() returns whatever is left once the stream ends
+    """
+    def __init__(self):
+        self.buf = ""
+
+    def feed(self, text):
+        self.buf += text
+        sentences = []
+        start = 0
+        for m in _SENTENCE_END.finditer(self.buf):
+            if m.start() < start:
+                continue
+            if m.group().startswith("."):
+                words = self.buf[start:m.start()].split()
+                word = words[-1].lower().lstrip("(\"'") if words else ""
+                if word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                    continue
+            sentence = self.buf[start:m.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = m.end()
+        self.buf = self.buf[start:]
+        return sentences
+
+    def flush(self):
+        rest = self.buf.strip()
+        self.buf = ""
+        return rest or None
+
+def stream_sentences(chunks):
+    """Turn an iterable of text chunks into an iterator of complete sentences."""
+    splitter = SentenceSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    rest = splitter.flush()
+    if rest:
+        yield rest
 
+# ---------------------------------------------------------
+# 8) Final combined pipeline
+# ---------------------------------------------------------
+def route(q: str):
+    """
+    Classify the query and run the matching KB lookup.
+    Returns (intent, format_reply args) so blocking and streaming replies share it.
+    """
+    kb = load_kb()          # one snapshot for the whole lookup, even if kb.json reloads meanwhile
+    with span("intent"):
+        intent = classify_intent(q)
+    with span("lookup", intent=intent, kb_version=kb.version):
+        return intent, _lookup(intent, q, kb)
+
+def _lookup(intent, q, kb):
     if intent == "greeting":
-        reply = format_reply("greeting", "Hello! Welcome to IIIT Delhi.")
-        return reply, intent
-
+        return ("greeting", "Hello! Welcome to IIIT Delhi.")
     elif intent == "close":
-        reply = format_reply("End Conversation", "Goodbye! Ask again if you need anything.")
-        return reply, intent
-
+        return ("End Conversation", "Goodbye! Ask again if you need anything.")
     elif intent == "directory":
-        result = lookup_directory(q)
-        reply = format_reply("directory", result)
-        return reply, intent
-
+        return ("directory", lookup_directory(q, kb))
     elif intent == "hours":
-        result = lookup_hours(q)
-        reply = format_reply("hours", result)
-        return reply, intent
-
+        return ("hours", lookup_hours(q, kb))
     elif intent == "contact":
-        result = lookup_contact(q)
-        reply = format_reply("contact", result)
-        return reply, intent
+        return ("contact", lookup_contact(q, kb))
 
     # NEW: Out-of-scope → LLM general receptionist reply
-    else:
-        reply = format_reply("out_of_scope", user_query=q)
-        return reply, intent
+    return ("out_of_scope", None, q)
+
+def cache_stats():
+    """Hit/miss counters and the LLM time saved by the reply caches."""
+    return {
+        "response": response_cache.stats(),
+        "semantic": semantic_cache.stats(),
+    }
+
+def _fast_reply(intent, args, count=True):
+    """
+    Reply that needs no LLM call: a template for TEMPLATE_INTENTS, the fixed
+    apology when the lookup found nothing, or a cached earlier reply.
+    Returns (reply or None, store, source) where store(reply, cost_ms) caches
+    a freshly generated reply (None when it should not be cached) and source
+    is "template" or "cache". count=False leaves the cache stats alone.
+    """
+    if intent == "out_of_scope":
+        user_query = args[2]
+        return (semantic_cache.get(user_query, count), functools.partial(semantic_cache.put, user_query),
+                "cache")
+
+    lookup_result = args[1]
+    if not lookup_result:
+        return NO_ANSWER, None, "template"
+    if intent in TEMPLATE_INTENTS:
+        return lookup_result, None, "template"
+
+    key = (intent, lookup_result)
+    return response_cache.get(key, count), functools.partial(response_cache.put, key), "cache"
+
+def _cache_stream(store, stream):
+    """Pass an _LLMStream's chunks through and cache the reply if it was complete."""
+    t0 = time.time()
+    parts = []
+    for chunk in stream:
+        parts.append(chunk)
+        yield chunk
+    if stream.complete:
+        store("".join(parts), (time.time() - t0) * 1000.0)
+
+def _race(start, budget, hedge_after=None, first=None):
+    """
+    Run start() -> Future and wait for it at most `budget` seconds. If it
+    has not finished after hedge_after seconds (or failed), start() a second
+    copy and take whichever succeeds first.
+    first: an already running request (speculation) to use instead of the
+    first start(); hedge_after counts from when it was started.
+    Returns (winning future or None, futures started).
+    """
+    deadline = time.time() + budget
+    started = [first if first is not None else start()]
+    hedge_at = None if hedge_after is None else started[0].started_at + hedge_after
+    pending = set(started)
+    while True:
+        now = time.time()
+        if hedge_at is not None and (now >= hedge_at or not pending) and now < deadline:
+            print(f"[LLM] No answer after {now - started[0].started_at:.1f}s, sending a hedged request.")
+            started.append(start())
+            pending.add(started[-1])
+            hedge_at = None
+        if not pending or now >= deadline:
+            return None, started
+        until = deadline if hedge_at is None else min(deadline, hedge_at)
+        done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                return f, started
+            print(f"[LLM] Request failed: {f.exception()}")
+
+def _submit(fn, *args):
+    f = llm_pool.submit(bind(fn), *args)
+    f.started_at = time.time()
+    return f
+
+class _LLMStream:
+    """
+    One streamed LLM request pumped on the LLM pool into a queue.
+    - `first` resolves once the first chunk is in (or the stream ended);
+      first.stream is this object
+    - iterating yields the chunks; after STREAM_STALL_S without one the
+      reply ends with what came so far (complete stays False, so it is not
+      cached) and the request is cancelled
+    - cancel() closes the response stream, which ends the pump's read and
+      frees its pool worker; a consumer that stops iterating cancels too
+    """
+    def __init__(self, args):
+        self.chunks = queue.Queue()
+        self.first = Future()
+        self.first.started_at = time.time()
+        self.first.stream = self
+        self.cancelled = False
+        self.complete = False
+        self._response = None
+        self._lock = threading.Lock()
+        llm_pool.submit(bind(self._pump), args)
+
+    def _opened(self, response):
+        with self._lock:
+            self._response = response
+            cancelled = self.cancelled
+        if cancelled:
+            _close(response)
+
+    def _pump(self, args):
+        try:
+            if not self.cancelled:
+                for text in format_reply_stream(*args, opened=self._opened):
+                    if self.cancelled:
+                        break
+                    self.chunks.put(text)
+                    if not self.first.done():
+                        self.first.set_result(self)
+                else:
+                    self.complete = True
+        except Exception as e:
+            if not self.first.done():
+                self.first.set_exception(e)
+            elif not self.cancelled:
+                print(f"[LLM] Stream broke off: {e}")
+        finally:
+            if self._response is not None:
+                _close(self._response)
+            if not self.first.done():
+                self.first.set_result(self)
+            self.chunks.put(None)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            response = self._response
+        if response is not None:
+            _close(response)
+
+    def __iter__(self):
+        ended = False
+        try:
+            while True:
+                try:
+                    chunk = self.chunks.get(timeout=STREAM_STALL_S)
+                except queue.Empty:
+                    print(f"[LLM] Stream stalled for {STREAM_STALL_S:.1f}s, ending the reply there.")
+                    return
+                if chunk is None:
+                    ended = True
+                    return
+                yield chunk
+        finally:
+            if not ended:
+                self.cancel()
+
+def _close(response):
+    """Close a streamed response; an SDK generator that is mid-read cannot be
+    closed from another thread, and is closed by the pump once the read returns."""
+    close = getattr(response, "close", None)
+    if close is not None:
+        try:
+            close()
+        except ValueError:
+            pass
+
+def plan_reply(q: str, budget: float = PLAN_BUDGET_S, info: dict | None = None, speculation=None):
+    """
+    (reply, intent). The LLM gets `budget` seconds (hedged after
+    HEDGE_AFTER_S); past that the fallback_reply is returned, and a late LLM
+    answer still goes into the cache for next time.
+    info, if given, gets "source": template / cache / llm / fallback, and
+    "spec" / "spec_saved_ms" when a Speculation is passed.
+    """
+    if q.lower() in ["quit", "exit"]:
+        return q
+
+    t0 = time.time()
+    intent, args = route(q)
+    with span("cache"):
+        reply, store, source = _fast_reply(intent, args)
+    early = _take_speculation(speculation, args, reply is None)
+    winner = None
+    if reply is None:
+        left = budget - (time.time() - t0)
+        winner, started = _race(lambda: _submit(format_reply, *args), left, HEDGE_AFTER_S, early)
+        if winner is not None:
+            reply, source = winner.result(), "llm"
+            if store is not None:
+                store(reply, (time.time() - t0) * 1000.0)
+        else:
+            print(f"[LLM] No answer within {budget:.1f}s, using the fallback reply.")
+            reply, source = fallback_reply(*args), "fallback"
+            if store is not None:
+                for f in started:
+                    f.add_done_callback(functools.partial(_store_late, store, t0))
+    _report_speculation(speculation, early, winner, t0, info)
+    if info is not None:
+        info["source"] = source
+    return reply, intent
+
+def _store_late(store, t0, f):
+    if not f.cancelled() and f.exception() is None:
+        store(f.result(), (time.time() - t0) * 1000.0)
+
+def plan_reply_stream(q: str, budget: float = PLAN_BUDGET_S, info: dict | None = None,
+                      speculation=None):
+    """
+    Streaming plan_reply: returns (sentences, intent) where sentences is an
+    iterator yielding each complete sentence of the reply as soon as the LLM
+    has produced it.
+    - budget applies to the first chunk; a hedged stream is started after
+      HEDGE_AFTER_S and the first one to speak wins, the other is closed
+    - after the first chunk, a gap of STREAM_STALL_S ends the reply with the
+      sentences received so far
+    - on a missed deadline the fallback_reply is spoken instead
+    - speculation: a streamed Speculation whose request is reused if the
+      final transcript routes the same way
+    """
+    t0 = time.time()
+    intent, args = route(q)
+    with span("cache"):
+        reply, store, source = _fast_reply(intent, args)
+    early = _take_speculation(speculation, args, reply is None)
+    winner = None
+    if reply is None:
+        left = budget - (time.time() - t0)
+        winner, started = _race(lambda: _LLMStream(args).first, left, HEDGE_AFTER_S, early)
+        for f in started:
+            if f is not winner:
+                f.stream.cancel()
+        if winner is not None:
+            source = "llm"
+            stream = winner.result()
+            chunks = iter(stream) if store is None else _cache_stream(store, stream)
+        else:
+            print(f"[LLM] No first chunk within {budget:.1f}s, using the fallback reply.")
+            reply, source = fallback_reply(*args), "fallback"
+    _report_speculation(speculation, early, winner, t0, info)
+    if info is not None:
+        info["source"] = source
+    if reply is not None:
+        return stream_sentences([reply]), intent
+    return stream_sentences(chunks), intent
+
+# ---------------------------------------------------------
+# 9) Speculative planning on partial transcripts
+# ---------------------------------------------------------
+_spec_stats = {"utterances": 0, "started": 0, "hits": 0, "misses": 0, "saved_ms": 0.0}
+_spec_lock = threading.Lock()
+
+def _same_request(a, b):
+    """Would these two route() results send the LLM the same prompt?"""
+    if a is None or b is None or a[0] != b[0]:
+        return False
+    if a[0] == "out_of_scope":
+        return normalize_query(a[2]) == normalize_query(b[2])
+    return a == b
+
+def _mark_done(f):
+    f.done_at = time.time()
+
+class Speculation:
+    """
+    LLM request started from partial transcripts of an utterance that is
+    still being spoken (fed by sidecar.Speculator).
+    - update(text, paused): route() the partial text; once the same request
+      comes out SPEC_SETTLE times in a row, or from a partial taken in a
+      pause, start it (streamed or blocking, like the planner will)
+    - take(args): the started request if the final transcript routes to the
+      same request, else None; the speculation is closed either way
+    - requests that lose are cancelled (streams) or left to fill the cache
+    """
+    def __init__(self, stream=True):
+        self.stream = stream
+        self.args = None            # request routed from the latest partial
+        self.seen = 0               # ... and on how many partials in a row
+        self.started_args = None
+        self.future = None
+        self.store = None
+        self.starts = 0
+        self.closed = False
+        self.result = ""            # "hit" / "miss" once taken ("" = nothing started)
+        self._lock = threading.Lock()
+
+    def update(self, text, paused=False):
+        if not text.strip():
+            return
+        intent, args = route(text)
+        with self._lock:
+            if self.closed:
+                return
+            if _same_request(args, self.args):
+                self.seen += 1
+            else:
+                self.args, self.seen = args, 1
+            if not (paused or self.seen >= SPEC_SETTLE) or _same_request(args, self.started_args):
+                return
+            if self.starts >= SPEC_MAX_STARTS:
+                return
+            reply, store, _ = _fast_reply(intent, args, count=False)
+            if reply is not None:
+                return              # the final turn is answered without the LLM anyway
+            self._discard()
+            self.started_args, self.store = args, store
+            self.future = _LLMStream(args).first if self.stream else _submit(format_reply, *args)
+            self.future.add_done_callback(_mark_done)
+            self.starts += 1
+        _count_spec("started")
+        print(f"[Spec] LLM started on the partial transcript {text!r} ({intent})")
+
+    def take(self, args):
+        with self._lock:
+            self.closed = True
+            if self.future is None:
+                return None
+            if _same_request(args, self.started_args):
+                self.result = "hit"
+                return self.future
+            self.result = "miss"
+            self._discard()
+            return None
+
+    def drop(self):
+        """Close without using it (utterance dropped, or answered from cache)."""
+        with self._lock:
+            self.closed = True
+            self._discard()
+
+    def _discard(self):
+        f, self.future = self.future, None
+        if f is None:
+            return
+        if self.stream:
+            f.stream.cancel()
+        elif self.store is not None:
+            f.add_done_callback(functools.partial(_store_late, self.store, f.started_at))
+
+def _take_speculation(speculation, args, need_llm):
+    if speculation is None:
+        return None
+    _count_spec("utterances")
+    early = speculation.take(args)
+    if early is not None and not need_llm:
+        speculation.drop()          # a cache / template reply is quicker still
+        speculation.result = "miss"
+        return None
+    return early
+
+def _report_speculation(speculation, early, winner, t0, info):
+    """Hit / miss counters and the LLM time the speculative start hid."""
+    if speculation is None or not speculation.result:
+        return
+    saved_ms = 0.0
+    if early is not None and winner is early:
+        saved_ms = (min(t0, getattr(early, "done_at", t0)) - early.started_at) * 1000.0
+    _count_spec("hits" if speculation.result == "hit" else "misses", saved_ms)
+    print(f"[Spec] {speculation.result}, {saved_ms:.0f} ms of LLM time hidden behind the speech")
+    if info is not None:
+        info["spec"] = speculation.result
+        info["spec_saved_ms"] = saved_ms
+
+def _count_spec(key, saved_ms=0.0):
+    with _spec_lock:
+        _spec_stats[key] += 1
+        _spec_stats["saved_ms"] += saved_ms
+
+def speculation_stats():
+    """Speculative starts, hit rate and LLM time saved so far."""
+    with _spec_lock:
+        out = dict(_spec_stats)
+    taken = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / taken, 3) if taken else 0.0
+    out["avg_saved_ms"] = round(out["saved_ms"] / out["hits"], 1) if out["hits"] else 0.0
+    out["saved_ms"] = round(out["saved_ms"], 1)
+    return out
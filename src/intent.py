@@ -0,0 +1,102 @@
+"""
+Keyword intent classifier.
+
+All keywords are compiled into one word-boundary regex (factored into a
+character trie, "h(?:e(?:llo|y)|i|ours)"), so a query is scanned once.
+When keywords of several intents appear, the intent listed first in
+INTENT_KEYWORDS wins. A single query costs about what the old substring
+loops in format.py did; classify_intents() is the faster path for batches
+(bench_intent.py).
+
+Intended differences from the old classifier (tests/test_intent.py):
+- whole words only: "hi" no longer fires inside "this", "which" or "Delhi"
+- hours ranks before directory: "is the lab open on sunday" asks for hours
+- close ranks before hours, and greeting ranks last: "hello, thank you" is
+  a close, "hi, when does the library open" an hours query
+- new keywords: "timing(s)", "opening", "closing", "who's", "where's", ...
+"""
+
+from __future__ import annotations
+import re
+
+# priority order: first intent with a matching keyword wins
+INTENT_KEYWORDS = {
+    # who queries → faculty/contact lookup
+    "contact": ["who is", "who's", "faculty", "professor", "prof", "contact", "email", "e-mail"],
+    # closing
+    "close": ["thank", "thanks", "thankyou", "bye", "goodbye"],
+    # hours / timing (before directory: "when does the lab open" asks for hours)
+    "hours": ["open", "opens", "opening", "close", "closes", "closing", "when",
+              "hours", "timing", "timings"],
+    # where / location navigation queries
+    "directory": ["where is", "where's", "where", "locate", "find", "location", "room", "lab"],
+    # greeting
+    "greeting": ["hello", "hi", "hey"],
+}
+FALLBACK_INTENT = "out_of_scope"
+
+_KEYWORD_INTENT = {}
+_PRIORITY = {}
+for _rank, (_intent, _words) in enumerate(INTENT_KEYWORDS.items()):
+    _PRIORITY[_intent] = _rank
+    for _w in _words:
+        _KEYWORD_INTENT.setdefault(_w, _intent)
+
+
+def _trie_regex(words) -> str:
+    """Alternation of `words` factored into a prefix trie."""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+# greedy trie match prefers the longest keyword ("who is" over "who")
+_KEYWORDS = r"(?<![\w'])(?:" + _trie_regex(_KEYWORD_INTENT) + r")\b"
+_PATTERN = re.compile(_KEYWORDS)
+# batch form: one scan over newline-joined queries, "\n" marks query ends
+_BATCH_PATTERN = re.compile(r"\n|" + _KEYWORDS)
+
+
+def classify_intent_detail(query: str) -> tuple[str, list[str]]:
+    """(intent, matched keywords in query order)."""
+    keywords = _PATTERN.findall(query.lower())
+    if not keywords:
+        return FALLBACK_INTENT, []
+    intent = min((_KEYWORD_INTENT[k] for k in keywords), key=_PRIORITY.__getitem__)
+    return intent, keywords
+
+
+def classify_intent(query: str) -> str:
+    return classify_intent_detail(query)[0]
+
+
+def classify_intents(queries: list[str]) -> list[str]:
+    """Bulk classify_intent for evaluation datasets: one regex pass over the whole batch."""
+    if not queries:
+        return []
+    text = "\n".join(q.replace("\n", " ") for q in queries).lower() + "\n"
+    kw_intent = _KEYWORD_INTENT
+    rank = _PRIORITY
+    out = []
+    best, best_rank = FALLBACK_INTENT, len(rank)
+    for m in _BATCH_PATTERN.findall(text):
+        if m == "\n":
+            out.append(best)
+            best, best_rank = FALLBACK_INTENT, len(rank)
+            continue
+        intent = kw_intent[m]
+        if rank[intent] < best_rank:
+            best, best_rank = intent, rank[intent]
+    return out
@@ -0,0 +1,205 @@
+"""
+Inverted index over kb.json, built once per KB load.
+
+Each KB section (rooms, labs, contacts, hours) gets its own SectionIndex so
+lookups only touch the sections they need, and a section can be rebuilt on
+its own. Scoring is BM25 over normalised tokens with stop-words removed.
+"""
+
+from __future__ import annotations
+import copy
+import heapq
+import json
+import math
+import re
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_ROOM_ID = re.compile(r"\b([a-z])\s*-?\s*(\d{2,4})\b")
+
+# words that say *what kind* of question it is, not *which* entry
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "of", "to", "in", "on", "at", "for",
+    "and", "or", "me", "i", "you", "my", "it", "its", "this", "that", "please",
+    "can", "could", "would", "tell", "show", "give", "where", "who", "what",
+    "which", "when", "how", "locate", "find", "location", "located", "go",
+    "get", "there", "here", "do", "does", "with", "about", "contact", "email",
+    "mail", "sits", "sit", "professor", "prof", "dr", "faculty",
+    "sir", "madam", "maam", "open", "opens", "close", "closes", "hours",
+    "timing", "timings", "hi", "hello", "hey", "nao", "want", "need", "looking",
+}
+
+# section -> [(field, weight)]; id / name tokens count double
+SECTION_FIELDS = {
+    "rooms": [("_id", 2), ("name", 2), ("location", 1)],
+    "labs": [("_id", 2), ("name", 2), ("location", 1)],
+    "contacts": [("name", 2), ("_email", 1), ("office", 1)],
+    "hours": [("_id", 2)],
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase alphanumeric tokens, stop-words removed.
+    Room ids are also emitted joined ("A-410" -> "a", "410", "a410") so
+    "B515" and "b 515" meet.
+    """
+    text = text.lower()
+    tokens = [t for t in _TOKEN.findall(text) if t not in STOP_WORDS]
+    tokens += [a + b for a, b in _ROOM_ID.findall(text)]
+    return tokens
+
+
+def entry_text(section: str, key: str, info) -> str:
+    """Compact JSON of one entry as it appears in LLM prompts."""
+    if section == "hours":
+        info = {"place": key, "hours": info}
+    return json.dumps(info, ensure_ascii=False, separators=(",", ":"))
+
+
+def _field_text(key: str, info, field: str) -> str:
+    if field == "_id":
+        return key.replace("_", " ")
+    if field == "_email":
+        return str(info.get("email", "")).split("@")[0].replace(".", " ")
+    return str(info.get(field, ""))
+
+
+class SectionIndex:
+    """
+    Postings for one KB section: token -> [(doc, BM25 tf weight)].
+    IDF is left to query time (see KBIndex.search) so sections searched
+    together share one IDF and can still be rebuilt independently.
+    Also keeps each entry serialised for prompts (texts: key -> JSON).
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, name: str, entries: dict):
+        self.name = name
+        self.keys = list(entries)
+        self.infos = [entries[k] for k in self.keys]
+        self.texts = {k: entry_text(name, k, entries[k]) for k in self.keys}
+        fields = SECTION_FIELDS.get(name, [("_id", 1)])
+
+        tfs: dict[str, dict[int, float]] = {}
+        doc_len = []
+        for doc, (key, info) in enumerate(zip(self.keys, self.infos)):
+            length = 0
+            for field, weight in fields:
+                for tok in tokenize(_field_text(key, info, field)):
+                    tf = tfs.setdefault(tok, {})
+                    tf[doc] = tf.get(doc, 0.0) + weight
+                    length += weight
+            doc_len.append(length)
+
+        avgdl = (sum(doc_len) / len(doc_len)) if doc_len else 1.0
+        k1, b = self.k1, self.b
+        self.postings = {
+            tok: [(doc, w * (k1 + 1) / (w + k1 * (1 - b + b * doc_len[doc] / avgdl)))
+                  for doc, w in tf.items()]
+            for tok, tf in tfs.items()
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def df(self, token: str) -> int:
+        return len(self.postings.get(token, ()))
+
+    def search(self, idf: dict, k: int = 3):
+        """Top-k [(score, key, info)] for query tokens weighted by idf."""
+        scores: dict[int, float] = {}
+        for tok, weight in idf.items():
+            for doc, w in self.postings.get(tok, ()):
+                scores[doc] = scores.get(doc, 0.0) + weight * w
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(score, self.keys[doc], self.infos[doc]) for doc, score in best]
+
+
+class KBIndex:
+    """
+    Per-section indexes over the whole KB.
+    - Tokens found in more than common_df of the searched entries ("lab",
+      "block", "floor") are only scored when nothing rarer matched, which
+      keeps generic words from flooding results and keeps queries
+      sub-millisecond on large KBs
+    - A query with a specific token that matched nothing ("room A-410",
+      "innovation lab") gets no hits from its generic tokens alone
+    """
+    def __init__(self, kb: dict, sections=None, common_df: float = 0.1):
+        self.common_df = common_df
+        self.sections = {
+            name: SectionIndex(name, kb.get(name, {}))
+            for name in (sections or SECTION_FIELDS)
+        }
+
+    def updated(self, kb: dict, changed) -> "KBIndex":
+        """A copy sharing the unchanged SectionIndexes, with `changed` rebuilt from kb."""
+        new = copy.copy(self)
+        new.sections = dict(self.sections)
+        for name in changed:
+            if name in new.sections:
+                new.sections[name] = SectionIndex(name, kb.get(name, {}))
+        return new
+
+    def search(self, query: str, sections, k: int = 3, min_ratio: float = 0.6,
+               common_fallback: bool = True):
+        """
+        Ranked top-k over the given sections: [(score, section, key, info)].
+        Candidates scoring below min_ratio x the best score are dropped.
+        common_fallback=False returns [] when only generic tokens matched;
+        otherwise they are used only if the query has nothing more specific.
+        """
+        parts = [self.sections[name] for name in sections]
+        n = sum(len(p) for p in parts)
+        df = {}
+        missed = False
+        for tok in set(tokenize(query)):
+            d = sum(p.df(tok) for p in parts)
+            if d:
+                df[tok] = d
+            else:
+                missed = True
+        if not df:
+            return []
+
+        common = self._common_limit(parts)
+        use = [t for t, d in df.items() if d <= common]
+        if not use:
+            if not common_fallback or missed:
+                return []
+            use = list(df)
+        idf = {t: math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) for t in use}
+
+        hits = []
+        for part in parts:
+            hits += [(score, part.name, key, info) for score, key, info in part.search(idf, k)]
+        hits.sort(key=lambda h: h[0], reverse=True)
+        if not hits:
+            return []
+        floor = hits[0][0] * min_ratio
+        return [h for h in hits[:k] if h[0] >= floor]
+
+    def _common_limit(self, parts) -> int:
+        return max(1, int(self.common_df * sum(len(p) for p in parts)))
+
+    def specific_words(self, query: str, sections) -> str:
+        """The query's tokens minus the generic ones of these sections, for fuzzy matching."""
+        parts = [self.sections[name] for name in sections]
+        common = self._common_limit(parts)
+        return " ".join(t for t in tokenize(query) if sum(p.df(t) for p in parts) <= common)
+
+    def render(self, hits, max_chars: int) -> tuple[str, int]:
+        """
+        Prompt context for search hits, best first, one "section: json" line
+        per entry, stopping before max_chars. Returns (text, entries used).
+        """
+        lines = []
+        used = 0
+        for _, section, key, _ in hits:
+            line = f"{section}: {self.sections[section].texts[key]}"
+            if used + len(line) + 1 > max_chars:
+                break
+            lines.append(line)
+            used += len(line) + 1
+        return "\n".join(lines), len(lines)
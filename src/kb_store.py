@@ -0,0 +1,184 @@
+"""
+The knowledge base as an immutable snapshot that is swapped atomically when
+kb.json changes, so the sidecar picks up a new lab or office without a
+restart (and without reloading Whisper).
+
+KBSnapshot bundles the parsed kb.json with everything derived from it: the
+BM25 index (with the serialised prompt text of every entry) and the name
+matcher. A reload builds the next snapshot from the current one, rebuilding
+only the sections whose JSON text changed and sharing the others; unchanged
+sections cost one string comparison, not a re-serialisation. Readers take
+`store.current` once per request and use that snapshot throughout, so an
+in-flight plan_reply never sees a half-built KB.
+"""
+
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+
+from kb_index import KBIndex
+from name_match import NameMatcher
+
+
+_DECODER = json.JSONDecoder()
+_SPACE = re.compile(r"[ \t\n\r]*")
+
+
+def parse_sections(text: str) -> tuple[dict, dict]:
+    """
+    Parse a kb.json object -> (data, raw): raw maps each top-level section to
+    its JSON text as it appears in the file, found in the same single pass
+    """
+    data, raw = {}, {}
+    end = _SPACE.match(text, 0).end()
+    if text[end:end + 1] != "{":
+        raise ValueError("kb.json must hold a JSON object")
+    end = _SPACE.match(text, end + 1).end()
+    if text[end:end + 1] == "}":
+        end += 1
+    else:
+        while True:
+            name, end = _DECODER.raw_decode(text, end)
+            end = _SPACE.match(text, end).end()
+            if text[end:end + 1] != ":" or not isinstance(name, str):
+                raise ValueError(f"expected a section name and ':' at char {end}")
+            start = _SPACE.match(text, end + 1).end()
+            data[name], end = _DECODER.raw_decode(text, start)
+            raw[name] = text[start:end]
+            end = _SPACE.match(text, end).end()
+            if text[end:end + 1] == "}":
+                end += 1
+                break
+            if text[end:end + 1] != ",":
+                raise ValueError(f"expected ',' or '}}' at char {end}")
+            end = _SPACE.match(text, end + 1).end()
+    if _SPACE.match(text, end).end() != len(text):
+        raise ValueError(f"extra data after the KB object at char {end}")
+    return data, raw
+
+
+class KBSnapshot:
+    """
+    One consistent version of the KB; never modified after build().
+    - data, index (KBIndex), matcher (NameMatcher)
+    - raw: section -> its JSON text in kb.json (empty when built from a dict)
+    - changed: sections rebuilt for this version; build_ms: time to build it
+    """
+    def __init__(self, data: dict, index: KBIndex, matcher: NameMatcher, raw: dict,
+                 version: int, changed: list, build_ms: float):
+        self.data = data
+        self.index = index
+        self.matcher = matcher
+        self.raw = raw
+        self.version = version
+        self.changed = changed
+        self.build_ms = build_ms
+        self.loaded_at = time.time()
+
+    @classmethod
+    def build(cls, data: dict, previous: "KBSnapshot | None" = None,
+              raw: dict | None = None) -> "KBSnapshot":
+        """
+        Build from parsed data, sharing previous's indexes for unchanged
+        sections. A section is unchanged if its raw text (parse_sections) is
+        identical, or, without raw text on both sides, its data compares equal.
+        """
+        t0 = time.perf_counter()
+        raw = raw or {}
+        if previous is None:
+            changed = sorted(data)
+            index, matcher = KBIndex(data), NameMatcher(data)
+        else:
+            def same(name):
+                if name in raw and name in previous.raw:
+                    return raw[name] == previous.raw[name]
+                return name in data and name in previous.data and data[name] == previous.data[name]
+            changed = sorted(name for name in set(data) | set(previous.data) if not same(name))
+            index = previous.index.updated(data, changed)
+            matcher = previous.matcher.updated(data, changed)
+        version = previous.version + 1 if previous else 1
+        return cls(data, index, matcher, raw, version, changed,
+                   (time.perf_counter() - t0) * 1000.0)
+
+
+class KBStore:
+    """
+    Loads kb.json into KBSnapshots and keeps `current` up to date.
+    - load(): first snapshot (idempotent)
+    - reload(): re-read the file and swap in a new snapshot if any section
+      changed; a file that does not parse keeps the old snapshot
+    - watch(interval_s): poll the file's mtime/size on a daemon thread and
+      reload once it has stopped changing (an editor may write it in parts)
+    - on_reload: callbacks run with each new snapshot
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.current = None
+        self.on_reload = []
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._watching = False
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self) -> KBSnapshot:
+        with self._lock:
+            if self.current is None:
+                self._stamp = self._file_stamp()
+                with open(self.path) as f:
+                    data, raw = parse_sections(f.read())
+                self.current = KBSnapshot.build(data, raw=raw)
+        return self.current
+
+    def reload(self) -> KBSnapshot | None:
+        """The new snapshot, or None if nothing changed (or the file is broken)."""
+        t0 = time.perf_counter()
+        with self._lock:
+            self._stamp = self._file_stamp()
+            try:
+                with open(self.path) as f:
+                    data, raw = parse_sections(f.read())
+            except (OSError, ValueError) as e:
+                print(f"[KB] Reload of {self.path} failed, keeping version "
+                      f"{self.current.version if self.current else None}: {e}")
+                return None
+            snapshot = KBSnapshot.build(data, self.current, raw)
+            if not snapshot.changed:
+                return None
+            self.current = snapshot          # the swap: one reference assignment
+        print(f"[KB] Reloaded {self.path} as version {snapshot.version}: rebuilt "
+              f"{', '.join(snapshot.changed)} in {snapshot.build_ms:.1f} ms "
+              f"({(time.perf_counter() - t0) * 1000.0:.1f} ms with parsing)")
+        for callback in self.on_reload:
+            callback(snapshot)
+        return snapshot
+
+    def watch(self, interval_s: float = 1.0):
+        if self._watching:
+            return
+        self._watching = True
+        threading.Thread(target=self._watch, args=(interval_s,), daemon=True, name="kb-watch").start()
+
+    def _watch(self, interval_s: float):
+        seen = self._stamp
+        while True:
+            time.sleep(interval_s)
+            stamp = self._file_stamp()
+            if stamp is None or stamp == self._stamp:
+                seen = stamp
+                continue
+            if stamp != seen:
+                seen = stamp                 # still being written; check again next tick
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"[KB] Reload failed: {e}")
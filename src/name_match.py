@@ -0,0 +1,211 @@
+"""
+Approximate name matcher for lab / faculty / room names that Whisper
+misspells ("Sherma" for "Sharma", "Iris" for "IRAS").
+
+Built per KB section: every distinct name word goes into a character
+trigram index and a Soundex bucket. A query word only looks at the name
+words that share a trigram or a Soundex key with it, and edit distance is
+computed for the best few of those only, so the cost is bounded by
+max_candidates, not by the size of the directory.
+"""
+
+from __future__ import annotations
+import copy
+import heapq
+import re
+
+from kb_index import STOP_WORDS
+
+_WORD = re.compile(r"[a-z]+")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"), "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+# section -> fields holding names (ids of labs are often the spoken name)
+NAME_FIELDS = {
+    "rooms": ["name"],
+    "labs": ["_id", "name"],
+    "contacts": ["name"],
+}
+
+
+def soundex(word: str) -> str:
+    """Classic 4-character Soundex ("sharma" and "sherma" -> "S650")."""
+    word = word.lower()
+    if not word:
+        return ""
+    out = word[0].upper()
+    last = _SOUNDEX_CODES.get(word[0], "")
+    for ch in word[1:]:
+        code = _SOUNDEX_CODES.get(ch, "")
+        if code and code != last:
+            out += code
+            if len(out) == 4:
+                break
+        if ch not in "hw":
+            last = code
+    return out.ljust(4, "0")
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"__{word}_"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str) -> int:
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def name_words(text: str) -> list[str]:
+    return [w for w in _WORD.findall(text.lower().replace("_", " "))
+            if len(w) >= 3 and w not in STOP_WORDS]
+
+
+def entry_words(key: str, info: dict, fields) -> list[str]:
+    """Distinct name words of one entry, in order."""
+    out = []
+    for field in fields:
+        text = key if field == "_id" else str(info.get(field, ""))
+        for w in name_words(text):
+            if w not in out:
+                out.append(w)
+    return out
+
+
+class SectionNames:
+    """
+    Name words of one KB section with their trigram and Soundex postings.
+    Each section is built from its own entries only, so a KB reload only
+    rebuilds the sections that changed (NameMatcher.updated).
+    - common: words in more than common_df of this section's entries
+      ("lab" in labs); NameMatcher ignores their union over all sections
+      at query time, so "lab" never ties a room to every lab
+    """
+    def __init__(self, name: str, items: dict, fields, common_df: float = 0.1):
+        self.name = name
+        self.entries = dict(items)  # key -> info
+        self.ids = {}              # word -> word id
+        self.words = []            # word id -> word
+        self.word_grams = []       # word id -> trigram set
+        self.word_keys = []        # word id -> soundex
+        self.word_entries = []     # word id -> [key]
+        self.by_gram = {}          # trigram -> [word id]
+        self.by_sound = {}         # soundex -> [word id]
+
+        ids = self.ids
+        for key, info in items.items():
+            for w in entry_words(key, info, fields):
+                if w not in ids:
+                    ids[w] = len(self.words)
+                    self.words.append(w)
+                    self.word_grams.append(trigrams(w))
+                    self.word_keys.append(soundex(w))
+                    self.word_entries.append([])
+                self.word_entries[ids[w]].append(key)
+
+        for wid in range(len(self.words)):
+            for g in self.word_grams[wid]:
+                self.by_gram.setdefault(g, []).append(wid)
+            self.by_sound.setdefault(self.word_keys[wid], []).append(wid)
+        # entry_words are distinct per entry, so a word's entry list is its df
+        limit = max(2, common_df * len(items))
+        self.common = frozenset(w for w, keys in zip(self.words, self.word_entries) if len(keys) > limit)
+
+    def similar_words(self, word: str, min_word_sim: float, max_candidates: int, skip=(),
+                      generic=frozenset()):
+        """
+        [(word id, similarity)] for name words close to `word`; `skip`:
+        trigrams to ignore, `generic`: words never to return
+        """
+        shared = {}
+        for g in trigrams(word):
+            if g in skip:
+                continue
+            for wid in self.by_gram.get(g, ()):
+                shared[wid] = shared.get(wid, 0) + 1
+        banned = {self.ids[w] for w in generic if w in self.ids}
+        for wid in banned:
+            shared.pop(wid, None)
+        candidates = set(heapq.nlargest(max_candidates, shared, key=shared.get))
+        key = soundex(word)
+        candidates.update([wid for wid in self.by_sound.get(key, ()) if wid not in banned][:max_candidates])
+
+        out = []
+        for wid in candidates:
+            other = self.words[wid]
+            sim = 1.0 - levenshtein(word, other) / max(len(word), len(other))
+            if self.word_keys[wid] == key:
+                sim = min(1.0, sim + 0.1)
+            if sim >= min_word_sim:
+                out.append((wid, sim))
+        return out
+
+
+class NameMatcher:
+    """
+    match(query, sections, k) -> [(score, section, key, info)] best first.
+
+    - Candidate words: those sharing the most trigrams with the query word
+      (at most max_candidates per section) plus its Soundex bucket
+    - Word similarity = 1 - edit distance / longer length, +0.1 if the
+      Soundex keys agree; words below min_word_sim are ignored
+    - Entry score = sum over query words of the best similarity against the
+      entry's name words
+    - Words shared by more than common_df of any section ("lab") are
+      ignored in every section; each section keeps its own set, so a reload
+      only rebuilds the sections that changed. Trigrams shared by more than
+      max_posting words are skipped to bound the work
+    """
+    def __init__(self, kb: dict, sections=None, min_word_sim: float = 0.7,
+                 common_df: float = 0.1, max_posting: int = 2000,
+                 max_candidates: int = 30):
+        self.min_word_sim = min_word_sim
+        self.common_df = common_df
+        self.max_posting = max_posting
+        self.max_candidates = max_candidates
+        self.sections = {name: self._build(name, kb) for name in (sections or NAME_FIELDS)}
+        self.generic = frozenset().union(*(p.common for p in self.sections.values()))
+
+    def _build(self, name: str, kb: dict) -> SectionNames:
+        return SectionNames(name, kb.get(name, {}), NAME_FIELDS.get(name, ["name"]), self.common_df)
+
+    def updated(self, kb: dict, changed) -> "NameMatcher":
+        """A copy sharing the unchanged sections, with `changed` rebuilt from kb."""
+        new = copy.copy(self)
+        new.sections = dict(self.sections)
+        for name in changed:
+            if name in new.sections:
+                new.sections[name] = new._build(name, kb)
+        new.generic = frozenset().union(*(p.common for p in new.sections.values()))
+        return new
+
+    def match(self, query: str, sections, k: int = 3, min_ratio: float = 0.6):
+        parts = [self.sections[s] for s in sections if s in self.sections]
+        scores = {}
+        for w in set(name_words(query)):
+            # trigrams too common across the whole KB carry no signal
+            skip = {g for g in trigrams(w)
+                    if sum(len(p.by_gram.get(g, ())) for p in self.sections.values()) > self.max_posting}
+            best = {}
+            for part in parts:
+                for wid, sim in part.similar_words(w, self.min_word_sim, self.max_candidates, skip,
+                                                     self.generic):
+                    for key in part.word_entries[wid]:
+                        ref = (part.name, key)
+                        if sim > best.get(ref, 0.0):
+                            best[ref] = sim
+            for ref, sim in best.items():
+                scores[ref] = scores.get(ref, 0.0) + sim
+        if not scores:
+            return []
+        top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        floor = top[0][1] * min_ratio
+        return [(score, ref[0], ref[1], self.sections[ref[0]].entries[ref[1]])
+                for ref, score in top if score >= floor]
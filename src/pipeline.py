@@ -0,0 +1,172 @@
+"""
+Threaded turn pipeline used by sidecar.main:
+
+    capture -> [stt] -> [plan] -> [speak]
+
+Each bracketed stage is one worker thread draining its own bounded queue, so
+turns stay in order and a slow stage pushes back on the one before it
+instead of letting work pile up.
+"""
+
+from __future__ import annotations
+import collections
+import contextlib
+import queue
+import threading
+import time
+
+from tracing import span
+
+
+class Turn:
+    """One visitor utterance travelling through the pipeline."""
+    def __init__(self, idx: int, pcm, sample_rate: int, endpoint_ms: float = 0.0):
+        self.idx = idx
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.audio_ms = len(pcm) / sample_rate * 1000.0
+        self.endpoint_ms = endpoint_ms
+        self.captured_at = time.time()      # hand-off from capture
+
+        self.text = ""
+        self.reply = ""
+        self.intent = ""
+        self.source = ""                    # where the reply came from (llm / fallback / cache / template)
+        self.sentences = None               # queue of reply sentences when streaming
+        self.first_audio_at = None          # first sentence sent to NAO
+        self.stage_ms = {}                  # stage name -> time in fn until the turn was handed on
+        self.wait_ms = {}                   # stage name -> time spent queued
+        self.depth = {}                     # stage name -> queue depth on arrival
+        self._enqueued = {}
+        self._started = {}
+        self.emitted = set()                # stages that handed the turn on
+        self.trace = None                   # tracing.Trace, if the turn is traced
+        self.speculation = None             # format.Speculation started during capture
+        self.spec = ""                      # "hit" / "miss" / "" (nothing started early)
+        self.spec_saved_ms = 0.0            # LLM time hidden behind the visitor's speech
+
+
+class Stage:
+    """
+    One pipeline stage.
+    - fn(turn) returns the turn to forward, or None to drop it (e.g. no speech)
+    - put() blocks while this stage's queue is full, which is the backpressure
+      seen by the previous stage
+    - Records queue depth on arrival, queue wait and processing time per turn
+      (and, for traced turns, a "<name>.wait" and a "<name>" span); the
+      processing time ends when the turn is handed on, so it is set before
+      the next stage (or on_done) sees the turn
+    - on_done(turn) is called for turns leaving the last stage, on_drop(turn)
+      for turns a stage dropped (or failed on)
+    - fn may hand a turn on early with emit() and return None, e.g. to let
+      the next stage start on a reply that is still streaming in
+    """
+    def __init__(self, name: str, fn, maxsize: int = 2, next_stage: "Stage | None" = None,
+                 on_done=None, on_drop=None):
+        self.name = name
+        self.fn = fn
+        self.next_stage = next_stage
+        self.on_done = on_done
+        self.on_drop = on_drop
+        self.q = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+
+    def start(self) -> "Stage":
+        self._thread.start()
+        return self
+
+    def put(self, turn: Turn):
+        turn.depth[self.name] = self.q.qsize()
+        turn._enqueued[self.name] = time.time()
+        self.q.put(turn)
+
+    def _run(self):
+        while True:
+            turn = self.q.get()
+            turn.wait_ms[self.name] = (time.time() - turn._enqueued[self.name]) * 1000.0
+
+            t0 = turn._started[self.name] = time.time()
+            tr = turn.trace
+            if tr is not None:
+                tr.add(f"{self.name}.wait", turn._enqueued[self.name], t0)
+            try:
+                with (tr.activate() if tr is not None else contextlib.nullcontext()), span(self.name):
+                    out = self.fn(turn)
+            except Exception as e:
+                print(f"[{self.name}] Turn {turn.idx} failed: {e}")
+                out = None
+
+            if out is not None:
+                self.emit(out)
+            elif self.name not in turn.emitted:
+                turn.stage_ms[self.name] = (time.time() - t0) * 1000.0
+                if self.on_drop is not None:
+                    self.on_drop(turn)
+
+    def emit(self, turn: Turn):
+        if self.name not in turn.emitted:
+            turn.stage_ms[self.name] = (time.time() - turn._started[self.name]) * 1000.0
+        turn.emitted.add(self.name)
+        if self.next_stage is not None:
+            self.next_stage.put(turn)
+        elif self.on_done is not None:
+            self.on_done(turn)
+
+
+def chain(*stages: Stage, on_drop=None) -> Stage:
+    """Link stages in order, start them and return the first one."""
+    for stage, nxt in zip(stages, stages[1:]):
+        stage.next_stage = nxt
+    for stage in stages:
+        stage.on_drop = stage.on_drop or on_drop
+    for stage in stages:
+        stage.start()
+    return stages[0]
+
+
+class BusyWindow:
+    """
+    Wall-clock intervals during which the robot was talking (or moving), so
+    capture can tell audio that is just NAO heard back through the mic from
+    a visitor speaking.
+    - begin()/end() nest: overlapping outputs make one interval
+    - times default to now; OutputMonitor passes body.py's event times
+    - external: set when body.py publishes the intervals itself
+    """
+    def __init__(self, tail_s: float = 1.0, keep: int = 8):
+        self.tail_s = tail_s
+        self.external = False
+        self._spans = collections.deque(maxlen=keep)
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    def begin(self, t: float | None = None):
+        with self._lock:
+            self._depth += 1
+            if self._depth == 1:
+                self._spans.append([time.time() if t is None else t, None])
+
+    def end(self, t: float | None = None):
+        with self._lock:
+            if self._depth == 0:
+                return
+            self._depth -= 1
+            if self._depth == 0 and self._spans and self._spans[-1][1] is None:
+                self._spans[-1][1] = time.time() if t is None else t
+
+    def active(self, t: float | None = None) -> bool:
+        """True if the robot was talking at wall-clock t (default now), or stopped < tail_s before."""
+        t = time.time() if t is None else t
+        with self._lock:
+            for s, e in self._spans:
+                if s <= t and (e is None or t <= e + self.tail_s):
+                    return True
+        return False
+
+    def covers(self, start: float, end: float) -> bool:
+        """True if [start, end] lies entirely inside one talking interval (+ tail)."""
+        with self._lock:
+            for s, e in self._spans:
+                if s <= start and (e is None or end <= e + self.tail_s):
+                    return True
+        return False
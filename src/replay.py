@@ -0,0 +1,169 @@
+# Offline replay benchmark: recorded utterances through the real sidecar
+# pipeline (WhisperSTT -> format.plan_reply_stream -> speak), with fake_body.py
+# standing in for the robot and fake_llm.py for Gemini. Needs no mic, NAO or
+# network, so it runs headless on any Linux box.
+#
+#   python3 replay.py recordings/                          # every *.wav once
+#   python3 replay.py recordings/ --llm-delay 2.5 --repeat 3 --json replay.json
+#   python3 replay.py recordings/ --interval 4             # a visitor every 4 s
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS = ["stt_ms", "plan_ms", "speak_ms", "total_ms", "ttfa_ms",
+           "stt_wait_ms", "plan_wait_ms", "speak_wait_ms"]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Replay recorded utterances through the sidecar pipeline.")
+    p.add_argument("wav_dir", help="directory of recorded utterances (*.wav, one per turn)")
+    p.add_argument("--repeat", type=int, default=1, help="play the set this many times")
+    p.add_argument("--interval", type=float, default=0.0,
+                   help="seconds between utterances (0 = back to back, measures throughput)")
+    p.add_argument("--llm-delay", type=float, default=1.0, help="fake LLM latency (s)")
+    p.add_argument("--chars-per-s", type=float, default=14.0, help="simulated NAO speaking rate")
+    p.add_argument("--model", default=None, help="Whisper model (default: stt_profile.json / sidecar's)")
+    p.add_argument("--no-stream", action="store_true", help="use plan_reply instead of streaming")
+    p.add_argument("--csv", default="replay_latency_log.csv", help="latency log written by the run")
+    p.add_argument("--json", default=None, help="also write the summary here")
+    p.add_argument("--trace", default=None, help="write per-turn spans (JSONL) here")
+    return p.parse_args()
+
+
+def load_wavs(wav_dir):
+    import numpy as np
+    import soundfile as sf
+
+    out = []
+    for path in sorted(glob.glob(os.path.join(wav_dir, "*.wav"))):
+        pcm, sr = sf.read(path, dtype="int16")
+        if pcm.ndim > 1:
+            pcm = pcm.mean(axis=1).astype(np.int16)
+        out.append((os.path.basename(path), pcm, sr))
+    return out
+
+
+def summarize(turns, dropped, wall_s, audio_s):
+    from bench_util import percentile
+
+    summary = {
+        "turns": len(turns) + dropped,
+        "completed": len(turns),
+        "dropped": dropped,
+        "wall_s": round(wall_s, 3),
+        "throughput_turns_per_s": round(len(turns) / wall_s, 4) if wall_s else 0.0,
+        "audio_s": round(audio_s, 3),
+        "realtime_factor": round(audio_s / wall_s, 3) if wall_s else 0.0,
+        "sources": {},
+        "metrics": {},
+    }
+    for turn in turns:
+        summary["sources"][turn.source] = summary["sources"].get(turn.source, 0) + 1
+    for name, values in collect(turns).items():
+        if values:
+            summary["metrics"][name] = {f"p{p}": round(percentile(values, p), 2) for p in (50, 95, 99)}
+    return summary
+
+
+def collect(turns):
+    values = {m: [] for m in METRICS}
+    for t in turns:
+        for stage, ms in t.stage_ms.items():
+            values[f"{stage}_ms"].append(ms)
+        for stage, ms in t.wait_ms.items():
+            values[f"{stage}_wait_ms"].append(ms)
+        values["total_ms"].append((t.done_at - t.captured_at) * 1000.0)
+        if t.first_audio_at:
+            values["ttfa_ms"].append((t.first_audio_at - t.captured_at) * 1000.0)
+    return values
+
+
+def main():
+    args = parse_args()
+    # the fake LLM has to be chosen before format.py is imported
+    os.environ["NAO_LLM_BACKEND"] = "fake"
+    os.environ["NAO_FAKE_LLM_DELAY_S"] = str(args.llm_delay)
+
+    import sidecar
+    import tracing
+    from cache import ResponseCache, SemanticCache
+    from fake_body import FakeBody
+    from pipeline import Turn
+
+    # fresh in-memory caches: replies persisted by earlier runs (or the live
+    # sidecar) must not skip the LLM, and replayed ones must not be saved
+    sidecar.format.response_cache = ResponseCache(path=None)
+    sidecar.format.semantic_cache = SemanticCache(path=None)
+
+    utterances = load_wavs(args.wav_dir)
+    if not utterances:
+        print(f"[Replay] No .wav files in {args.wav_dir}")
+        sys.exit(1)
+
+    body = FakeBody(chars_per_s=args.chars_per_s).start()
+    sidecar.BASE = body.base
+    sidecar.STREAM_REPLIES = not args.no_stream
+    sidecar.LATENCY_CSV = args.csv
+    sidecar.init_latency_csv()
+    sidecar.TRACE_PATH = args.trace
+    sidecar.init_tracing()
+
+    stt = sidecar.make_stt(model_name=args.model, debug_dump_dir=None)
+    stt.warm_up()
+
+    done = []
+    dropped = []
+    finished = threading.Condition()
+
+    def on_done(turn):
+        turn.done_at = time.time()
+        sidecar.log_turn(turn)
+        with finished:
+            done.append(turn)
+            finished.notify_all()
+
+    def on_drop(turn):
+        with finished:
+            dropped.append(turn)
+            finished.notify_all()
+
+    head, _, _ = sidecar.build_pipeline(stt, on_done=on_done, on_drop=on_drop)
+
+    plan = utterances * args.repeat
+    print(f"[Replay] {len(plan)} utterances from {args.wav_dir}, fake LLM {args.llm_delay:.1f}s, "
+          f"robot {args.chars_per_s:.0f} chars/s")
+    t0 = time.time()
+    for i, (name, pcm, sr) in enumerate(plan, 1):
+        if args.interval:
+            time.sleep(max(0.0, t0 + (i - 1) * args.interval - time.time()))
+        turn = Turn(i, pcm, sr)
+        if sidecar.trace_writer is not None:
+            turn.trace = tracing.Trace(i, wav=name)
+        head.put(turn)
+    with finished:
+        while len(done) + len(dropped) < len(plan):
+            finished.wait()
+    wall_s = max([t.done_at for t in done], default=time.time()) - t0
+    body.close()
+    if sidecar.trace_writer is not None:
+        sidecar.trace_writer.close()
+
+    audio_s = sum(len(pcm) / sr for _, pcm, sr in plan)
+    summary = summarize(done, len(dropped), wall_s, audio_s)
+    print(f"\n[Replay] {summary['completed']}/{summary['turns']} turns in {wall_s:.1f}s "
+          f"({summary['throughput_turns_per_s']:.2f} turns/s, {summary['realtime_factor']:.2f}x realtime), "
+          f"sources {summary['sources']}")
+    print(f"{'metric':<15}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, ps in summary["metrics"].items():
+        print(f"{name:<15}{ps['p50']:>10.1f}{ps['p95']:>10.1f}{ps['p99']:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
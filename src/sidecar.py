@@ -2,211 +2,908 @@
 
 from __future__ import annotations
 import requests, time, numpy as np
+from requests.adapters import HTTPAdapter
 import time
 import numpy as np
-import pyaudio
-import soundfile as sf
-from faster_whisper import WhisperModel
 import csv
+import importlib
+import json
+import math
 import os
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+# faster_whisper, soundfile and pyaudio are imported where they are first
+# needed, so the startup phases can load them in parallel
 
 # Import your KB + LLM + NAO helpers from the format file
 import format as format  
+from audio import Endpointer, MicStream, WHISPER_SR, noise_level, resample
+from pipeline import BusyWindow, Stage, Turn, chain
+import tracing
+from tracing import span
 
-BASE = "http://127.0.0.1:5006"    
+BASE = os.environ.get("NAO_BODY_URL", "http://127.0.0.1:5006")   # one body.py per reception point
 LANG = "English"               # NAO TTS language label
+HTTP_TIMEOUT_S = (1.0, 5.0)    # (connect, read) for calls to body.py
+INTENT_GESTURES = {"greeting": "wave_right", "close": "bow"}   # gesture sent with the reply
+SPEECH_TIMEOUT_S = 100         # longest we wait for NAO to finish one reply
+SPEECH_POLL_S = 10             # long-poll length of each /talk/<id> status request
+BARGE_IN = False               # an utterance during NAO's speech stops it instead of being dropped
+                               # (needs a mic that does not pick up NAO's own voice)
 
 # ====== AUDIO / STT CONFIG ======
-DEVICE_INDEX = 6               # USB PnP Audio Device index 
-RECORD_SECONDS = 6             # length of each chunk
+DEVICE_INDEX = int(os.environ.get("NAO_MIC_INDEX", 6))   # USB PnP Audio Device index
+RECORD_SECONDS = 6             # length of each chunk (CAPTURE_MODE = "fixed")
 FRAMES_PER_BUFFER = 1024
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-
-WHISPER_MODEL_NAME = "small"        # or "base"/"medium"/etc.
+RING_SECONDS = 30              # audio kept by the persistent mic stream (> VAD_MAX_UTTERANCE_S)
+
+# ====== VAD ENDPOINTING ======
+CAPTURE_MODE = "vad"           # "vad" (hand off on trailing silence) or "fixed" (RECORD_SECONDS chunks)
+VAD_HANGOVER_MS = 700          # trailing silence that closes an utterance
+VAD_MAX_UTTERANCE_S = 15.0     # hard cap on a single utterance
+VAD_PRE_ROLL_MS = 300          # audio kept from before speech onset
+VAD_MIN_SPEECH_MS = 250        # shorter bursts (clicks, coughs) are dropped
+VAD_THRESHOLD = 0.015          # minimum block RMS (full scale = 1.0) counted as speech
+VAD_NOISE_RATIO = 3.0          # speech must also be this many times above the noise floor
+NOISE_CALIBRATION_S = 1.0      # ambient audio measured at startup to seed the noise floor; 0 = off
+                               # (chunks with less than VAD_MIN_SPEECH_MS above it skip STT)
+
+# ====== ROBOT OUTPUT GATING ======
+GATE_ROBOT_OUTPUT = True       # audio recorded while NAO speaks or gestures (+ ECHO_TAIL_S) is not
+                               # endpointed or transcribed; ignored with BARGE_IN, which must hear it
+OUTPUT_POLL_S = 10             # long-poll length of each /output request (body.py's start/end events)
+OUTPUT_RETRY_S = 2.0           # pause before asking again when body.py is not reachable
+
+WHISPER_MODEL_NAME = "small"        # or "base"/"medium"/etc.; stt_profile.json overrides
 WHISPER_DEVICE = "cpu"              # "cuda" if GPU is available
 WHISPER_COMPUTE_TYPE = "int8"       # "float16"/"int8_float16" for GPU
-LATENCY_CSV = "latency_log.csv"
+WHISPER_LANGUAGE = "en"             # pinned, skips language detection (None = detect per chunk)
+WHISPER_DECODE = "adaptive"         # "adaptive": greedy, beam search only if unsure; "beam": always beam
+WHISPER_BEAM_SIZE = 5
+WHISPER_MIN_LOGPROB = -0.7          # greedy result below this avg log-probability is re-decoded
+WHISPER_MAX_COMPRESSION = 2.4       # ... and so is one this repetitive (gzip ratio)
+WHISPER_KB_PROMPT = True            # bias decoding towards KB lab / faculty names (initial_prompt)
+STT_PROFILE = "stt_profile.json"    # written by calibrate_stt.py for this host; None = ignore
+WHISPER_WORKERS = 2                 # parallel decodes, so a partial transcript never delays the final one
+STT_SERVER = os.environ.get("NAO_STT_SERVER")   # e.g. "127.0.0.1:5010": share stt_server.py's model
+                                                # with other sidecars instead of loading one here
+
+# ====== SPECULATIVE PLANNING ======
+SPECULATE = True                    # transcribe the utterance while it is spoken, start the LLM early
+SPEC_INTERVAL_S = 0.6               # new audio between partial transcripts (one is also taken per pause)
+SPEC_MIN_SPEECH_S = 0.8             # no partial transcripts of shorter utterances
+STT_DEBUG_DUMP_DIR = None           # e.g. "stt_dump" to keep every chunk as a 16 kHz WAV
+
+# ====== PIPELINE ======
+STT_QUEUE_SIZE = 2                  # utterances waiting for Whisper
+PLAN_QUEUE_SIZE = 2                 # transcripts waiting for plan_reply
+SPEAK_QUEUE_SIZE = 2                # replies waiting for NAO
+STREAM_REPLIES = True               # speak each sentence as soon as the LLM has produced it
+ECHO_TAIL_S = 1.0                   # utterances wholly inside NAO's speech (+ this tail) are dropped
+STAGES = ["stt", "plan", "speak"]
+
+KIOSK = os.environ.get("NAO_KIOSK", "")   # reception point name when several share a host
+LATENCY_CSV = f"latency_log_{KIOSK}.csv" if KIOSK else "latency_log.csv"
+LATENCY_MAX_BYTES = 5_000_000       # rotate to latency_log.<date>.csv past this size
+# one JSON line of spans per turn; None = no tracing
+TRACE_PATH = f"traces/trace_{KIOSK}.jsonl" if KIOSK else "traces/trace.jsonl"
+TRACE_MAX_BYTES = 10_000_000        # rotate trace.jsonl at this size ...
+TRACE_BACKUPS = 5                   # ... keeping trace.jsonl.1 .. .5
+TRACE_STATS_PORT = None             # e.g. 5007: live span percentiles at GET /stats
+STARTUP_LOG = "startup_log.jsonl"   # one line of startup phase timings per start; None = off
+LATENCY_FIELDS = (
+    ["chunk_idx", "ts", "audio_ms", "endpoint_ms"]
+    + [f"{s}_ms" for s in STAGES]
+    + ["total_ms", "ttfa_ms"]
+    + [f"{s}_wait_ms" for s in STAGES]
+    + [f"{s}_depth" for s in STAGES]
+    + ["intent", "source", "spec", "spec_saved_ms", "stt_avoided_ms"]
+)
 
 # ===== Helpers =====
-def speak(text,intent):
-    if intent=="greeting" :
-        wave()
-        requests.post(f"{BASE}/talk", json={"message": text, "language": LANG}, timeout=100)
+# One keep-alive connection pool to body.py, shared by all stages
+nao_http = requests.Session()
+nao_http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
 
-    elif intent=="close":
-        bow()
-        requests.post(f"{BASE}/talk", json={"message": text, "language": LANG}, timeout=100)
+def speak(text,intent):
+    """
+    Queue text on NAO together with the intent's gesture (wave for greeting,
+    bow for close) in one /perform round trip; returns the speech job id.
+    Raises RuntimeError with body.py's error if it refused the request.
+    """
+    gesture = INTENT_GESTURES.get(intent)
+    with span("http.perform", gesture=gesture, chars=len(text)):
+        r = nao_http.post(f"{BASE}/perform",
+                          json={"message": text, "language": LANG, "gesture": gesture},
+                          timeout=HTTP_TIMEOUT_S)
+    try:
+        data = r.json()
+    except ValueError:
+        data = {}
+    if not r.ok or not data.get("success"):
+        raise RuntimeError(f"body.py /perform failed ({r.status_code}): {data.get('error') or r.text[:200]}")
+    return data["job_id"]
+
+def wait_speech(job_id, timeout=SPEECH_TIMEOUT_S):
+    """Long-poll until the speech job is done / cancelled; returns its final state."""
+    deadline = time.time() + timeout
+    job = {"state": "queued"}
+    with span("http.wait_speech", job=job_id):
+        while job.get("state") in ("queued", "speaking") and time.time() < deadline:
+            wait = min(SPEECH_POLL_S, max(0.0, deadline - time.time()))
+            r = nao_http.get(f"{BASE}/talk/{job_id}", params={"wait": wait},
+                             timeout=(HTTP_TIMEOUT_S[0], wait + HTTP_TIMEOUT_S[1]))
+            job = r.json()
+        # on-robot timing as reported by body.py (same host clock)
+        if job.get("started"):
+            tracing.record("robot.queue", job["created"], job["started"], job=job_id)
+            if job.get("finished"):
+                tracing.record("robot.speech", job["started"], job["finished"], job=job_id,
+                               state=job.get("state"))
+    return job.get("state", "error")
+
+def stop_speaking():
+    """Barge-in: drop NAO's queued sentences and cut the current one."""
+    nao_http.post(f"{BASE}/talk/stop", json={}, timeout=HTTP_TIMEOUT_S)
+
+class OutputMonitor:
+    """
+    Follows body.py's /output events (speech and gesture start / end) on a
+    daemon thread and mirrors them into a BusyWindow with body.py's own
+    timestamps (same host clock), so capture knows when NAO makes noise.
+    - window.external is set once body.py answers; the speak stage then
+      stops marking the window itself
+    - a body.py without /output (404) leaves the speak stage in charge
+    """
+    def __init__(self, window: BusyWindow):
+        self.window = window
+        self.busy = False
+        self.seq = 0
 
-    else:
-        requests.post(f"{BASE}/talk", json={"message": text, "language": LANG}, timeout=100) 
+    def start(self) -> "OutputMonitor":
+        threading.Thread(target=self._run, daemon=True, name="output-monitor").start()
+        return self
 
-def wave():
-    # Right-hand wave
-    requests.post(f"{BASE}/wave_hand", json={"hand": "right"})
+    def _set(self, busy: bool, t: float):
+        if busy != self.busy:
+            self.busy = busy
+            (self.window.begin if busy else self.window.end)(t)
 
-def bow():
-    requests.post(f"{BASE}/bow", timeout=100)
+    def _run(self):
+        while True:
+            try:
+                r = nao_http.get(f"{BASE}/output", params={"since": self.seq, "wait": OUTPUT_POLL_S},
+                                 timeout=(HTTP_TIMEOUT_S[0], OUTPUT_POLL_S + HTTP_TIMEOUT_S[1]))
+                if r.status_code == 404:
+                    print("[Gate] body.py publishes no /output events; using the speak stage's timing")
+                    return
+                state = r.json()
+            except (requests.RequestException, ValueError):
+                self._set(False, time.time())     # nothing is said while body.py is down
+                time.sleep(OUTPUT_RETRY_S)
+                continue
+            self.window.external = True
+            for event in state["events"]:
+                self._set(event["active"] > 0, event["t"])
+            self._set(state["active"] > 0, time.time())
+            self.seq = state["seq"]
 
 
-def init_latency_csv():
+def init_latency_csv(rotate: bool = False):
     """
     Create latency_log.csv to record latency if it does not exist.
+    A log written with a different set of columns (or any log, with
+    rotate=True) is moved aside to latency_log.<mtime>.csv first;
+    avg_latency.py reads those rotated files too.
     """
-    if not os.path.exists(LATENCY_CSV):
-        with open(LATENCY_CSV, mode="w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "chunk_idx",
-                "stt_ms",
-                "plan_ms",
-                "speak_ms",
-                "total_ms",
-            ])
-
-def record_once(device_index: int) -> tuple[np.ndarray, int]:
-    """
-    - Function to record audio
-    - Uses device's defaultSampleRate (so no invalid-rate errors)
-    - Records RECORD_SECONDS
-    """
-    p = pyaudio.PyAudio()
-    dev_info = p.get_device_info_by_index(device_index)
-
-    sample_rate = int(dev_info["defaultSampleRate"])
-    max_in = dev_info.get("maxInputChannels", 0)
-
-    print(f"\n[Record] Using device {device_index}: {dev_info.get('name')}")
-    print(f"[Record] defaultSampleRate={sample_rate}, maxInputChannels={max_in}")
-
-    if max_in <= 0:
-        raise RuntimeError("Selected device has no input channels (not a mic).")
-
-    stream = p.open(
-        format=FORMAT,
-        channels=CHANNELS,
-        rate=sample_rate,
-        input=True,
-        input_device_index=device_index,
-        frames_per_buffer=FRAMES_PER_BUFFER,
-    )
-
-    print(f"[Record] Recording for {RECORD_SECONDS} seconds...")
-    frames: list[bytes] = []
-    num_frames = int(sample_rate / FRAMES_PER_BUFFER * RECORD_SECONDS)
-
-    for _ in range(num_frames):
-        data = stream.read(FRAMES_PER_BUFFER, exception_on_overflow=False)
-        frames.append(data)
-
-    print("[Record] Done recording.")
+    if os.path.exists(LATENCY_CSV):
+        with open(LATENCY_CSV, newline="") as f:
+            header = next(csv.reader(f), None)
+        if header == LATENCY_FIELDS and not rotate:
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(os.path.getmtime(LATENCY_CSV)))
+        root, ext = os.path.splitext(LATENCY_CSV)
+        os.replace(LATENCY_CSV, f"{root}.{stamp}{ext}")
+
+    with open(LATENCY_CSV, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LATENCY_FIELDS)
+
+class Capture:
+    """
+    Cuts utterances out of the persistent MicStream ring buffer.
+    - CAPTURE_MODE "vad": endpointed on trailing silence
+    - CAPTURE_MODE "fixed": consecutive RECORD_SECONDS windows
+    - next() returns (int16 view, sample_rate, endpoint_ms); the view aliases
+      the ring, so consume it before RING_SECONDS of new audio arrive
+    - on_partial(view, sr, start, paused): called with the open utterance
+      every SPEC_INTERVAL_S of audio and when the visitor pauses ("vad" only)
+    - gate(t): True while NAO was outputting at wall-clock t; that audio is
+      not endpointed, and an utterance open when NAO starts is cut there
+    - on_skip(reason, audio_s): utterances heard inside the gate (which
+      would have gone to Whisper), found by a second endpointer
+    """
+    def __init__(self, mic: MicStream, mode: str = CAPTURE_MODE, on_partial=None,
+                 gate=None, on_skip=None):
+        self.mic = mic
+        self.mode = mode
+        self.on_partial = on_partial
+        self.gate = gate
+        self.on_skip = on_skip
+        self._offered = (None, 0)       # (utterance start, samples) last handed to on_partial
+        self.endpointer = self._endpointer()
+        self.echo = self._endpointer()  # cuts NAO's own output into would-be utterances
+        self.endpointer.reset(mic.ring.write_pos)
+
+    def _endpointer(self) -> Endpointer:
+        return Endpointer(
+            self.mic.sample_rate, FRAMES_PER_BUFFER,
+            hangover_ms=VAD_HANGOVER_MS,
+            max_utterance_s=VAD_MAX_UTTERANCE_S,
+            pre_roll_ms=VAD_PRE_ROLL_MS,
+            min_speech_ms=VAD_MIN_SPEECH_MS,
+            threshold=VAD_THRESHOLD,
+            noise_ratio=VAD_NOISE_RATIO,
+        )
 
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+    def skip_to_now(self):
+        """Discard everything captured so far (e.g. the robot's own speech)."""
+        self.endpointer.reset(self.mic.ring.write_pos)
+
+    def next(self) -> tuple[np.ndarray, int, float]:
+        ring = self.mic.ring
+        sr = self.mic.sample_rate
+        ep = self.endpointer
+
+        if self.mode == "fixed":
+            start = max(ep.pos, ring.oldest())
+            end = start + RECORD_SECONDS * sr
+            print(f"[Record] Recording for {RECORD_SECONDS} seconds...")
+            while not ring.wait_until(end, timeout=1.0):
+                pass
+            ep.reset(end)
+            if self.gate is not None:
+                return self._suppress(ring.view(start, end), start, sr), sr, 0.0
+            return ring.view(start, end), sr, 0.0
 
-    pcm_bytes = b"".join(frames)
-    audio_np = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
-    return audio_np, sample_rate
+        while True:
+            if ep.pos < ring.oldest():
+                print("[Record] Fell behind the ring buffer, skipping ahead.")
+                ep.reset(ring.oldest())
+            if not ring.wait_until(ep.pos + FRAMES_PER_BUFFER, timeout=1.0):
+                continue
+            block = ring.view(ep.pos, ep.pos + FRAMES_PER_BUFFER)
+            if self.gate is not None and self.gate(time.time() - (ring.write_pos - ep.pos) / sr):
+                span = ep.cut()
+                self._gated(block, sr)
+                if span is not None:
+                    print(f"[Record] Utterance of {(span[1] - span[0])/sr:.2f}s (cut off by NAO's output).")
+                    return ring.view(*span), sr, 0.0
+                continue
+            if self.echo.in_speech:
+                self._skipped(self.echo.cut(), sr)
+            span = ep.push(block)
+            if self.on_partial is not None and ep.in_speech:
+                self._partial(ep, sr)
+            if span is not None:
+                print(f"[Record] Utterance of {(span[1] - span[0])/sr:.2f}s "
+                      f"(endpointed after {ep.trailing_ms:.0f} ms silence).")
+                return ring.view(*span), sr, ep.trailing_ms
+
+    def _suppress(self, view: np.ndarray, start: int, sr: int) -> np.ndarray:
+        """The window with the blocks recorded during NAO's output zeroed (a copy, if any)."""
+        now, head = time.time(), self.mic.ring.write_pos
+        n = FRAMES_PER_BUFFER
+        gated = [i for i in range(0, len(view), n) if self.gate(now - (head - start - i) / sr)]
+        if not gated:
+            return view
+        view = view.copy()
+        for i in gated:
+            view[i:i + n] = 0
+        return view
+
+    def _gated(self, block: np.ndarray, sr: int):
+        ep, echo = self.endpointer, self.echo
+        if not echo.in_speech:
+            echo.reset(ep.pos)
+            echo.noise_floor = ep.noise_floor
+        self._skipped(echo.push(block), sr)
+        ep.reset(ep.pos + len(block))
+
+    def _skipped(self, span, sr: int):
+        if span is None:
+            return
+        audio_s = (span[1] - span[0]) / sr
+        print(f"[Record] Ignored {audio_s:.2f}s heard while NAO was speaking / moving.")
+        if self.on_skip is not None:
+            self.on_skip("echo", audio_s)
+
+    def _partial(self, ep: Endpointer, sr: int):
+        length = ep.pos - ep.start
+        start, offered = self._offered
+        if start != ep.start:
+            offered = 0
+        paused = ep.silent_run == 1
+        if length < SPEC_MIN_SPEECH_S * sr:
+            return
+        if paused or length - offered >= SPEC_INTERVAL_S * sr:
+            self._offered = (ep.start, length)
+            self.on_partial(self.mic.ring.view(ep.start, ep.pos), sr, ep.start, paused)
+
+
+def compression_ratio(text: str) -> float:
+    """Bytes over zlib-compressed bytes, faster-whisper's repetition measure."""
+    data = text.encode("utf-8")
+    return len(data) / len(zlib.compress(data)) if data else 0.0
 
 
 class WhisperSTT:
     """
     Load Whisper once and reuse it for all chunks.
+    - Audio stays in memory: it is resampled to 16 kHz here and handed to
+      faster-whisper as a float32 array (no temp WAV, no decode)
+    - decode="adaptive": greedy first; beam search only when the greedy text
+      is low-confidence (avg log-probability / repetition), so most turns
+      pay for one cheap pass
+    - language: pinned language (None = detect); initial_prompt: vocabulary
+      to bias decoding towards (see format.stt_prompt)
+    - debug_dump_dir: optionally also write each chunk there as a WAV
     """
-    def __init__(self, model_name: str, device: str, compute_type: str):
+    def __init__(self, model_name: str, device: str, compute_type: str,
+                 debug_dump_dir: str | None = None, language: str | None = WHISPER_LANGUAGE,
+                 decode: str = WHISPER_DECODE, initial_prompt: str | None = None,
+                 num_workers: int = 1):
         print(f"[STT] Loading Whisper model: {model_name}")
+        from faster_whisper import WhisperModel
         self.model = WhisperModel(
             model_name,
             device=device,
             compute_type=compute_type,
+            num_workers=num_workers,
         )
+        self.model_name = model_name
+        self.language = language
+        self.decode = decode
+        self.initial_prompt = initial_prompt
+        self.debug_dump_dir = debug_dump_dir
+        self._dumped = 0
+        self.chunks = 0
+        self.fallbacks = 0      # chunks re-decoded with beam search
 
     def transcribe(self, audio_np: np.ndarray, sample_rate: int):
         if audio_np.size == 0:
             return ""
 
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            sf.write(tmp.name, audio_np, sample_rate)
-            tmp_path = tmp.name
-
-        print(f"[STT] Transcribing chunk ({len(audio_np)/sample_rate:.2f}s)...")
-        segments, info = self.model.transcribe(tmp_path, beam_size=5)
-        text = "".join(seg.text for seg in segments).strip()
+        with span("resample", sr=sample_rate):
+            audio_16k = resample(audio_np, sample_rate, WHISPER_SR)
+        if self.debug_dump_dir:
+            self.dump(audio_16k)
+
+        print(f"[STT] Transcribing chunk ({len(audio_16k)/WHISPER_SR:.2f}s)...")
+        self.chunks += 1
+        with span("whisper", audio_s=round(len(audio_16k) / WHISPER_SR, 3), mode=self.decode) as attrs:
+            if self.decode != "adaptive":
+                return self._decode(audio_16k, WHISPER_BEAM_SIZE)[0]
+            text, logprob = self._decode(audio_16k, 1, temperature=0.0)
+            attrs["logprob"] = round(logprob, 3)
+            if text and logprob < WHISPER_MIN_LOGPROB:
+                self.fallbacks += 1
+                attrs["fallback"] = True
+                print(f"[STT] Low confidence (avg logprob {logprob:.2f}), re-decoding with beam search")
+                text = self._decode(audio_16k, WHISPER_BEAM_SIZE)[0]
         return text
 
-
-def main():
-    # Instantiate STT once
+    def _decode(self, audio_16k: np.ndarray, beam_size: int, **options):
+        """(text, duration-weighted avg log-probability; -inf if it repeats itself)."""
+        segments, _ = self.model.transcribe(
+            audio_16k,
+            beam_size=beam_size,
+            language=self.language,
+            initial_prompt=self.initial_prompt,
+            condition_on_previous_text=False,
+            **options,
+        )
+        # segments is lazy: decoding happens while it is iterated
+        parts, logprob, seconds = [], 0.0, 0.0
+        for seg in segments:
+            parts.append(seg.text)
+            d = max(seg.end - seg.start, 0.01)
+            logprob += seg.avg_logprob * d
+            seconds += d
+            if seg.compression_ratio > WHISPER_MAX_COMPRESSION:
+                logprob = -math.inf
+        return "".join(parts).strip(), (logprob / seconds if seconds else 0.0)
+
+    def transcribe_partial(self, audio_np: np.ndarray, sample_rate: int) -> str:
+        """One quiet greedy pass over an utterance still being spoken."""
+        audio_16k = resample(audio_np, sample_rate, WHISPER_SR)
+        return self._decode(audio_16k, 1, temperature=0.0)[0]
+
+    def transcribe_batch(self, items: list, partial: list | None = None) -> list:
+        """
+        Transcripts of several (pcm, sample_rate) utterances, decoded as one
+        batch through the CTranslate2 model (used by stt_server.py).
+        - Needs a pinned language and clips within Whisper's 30 s window;
+          other clips go through transcribe() one by one
+        - "adaptive": the batch is greedy and low-confidence results are
+          re-decoded with beam search, except those flagged in `partial`
+        - A result that repeats itself (WHISPER_MAX_COMPRESSION) is re-decoded
+          like low confidence; with beam search it goes through transcribe()
+        """
+        audio = [resample(pcm, sr, WHISPER_SR) for pcm, sr in items]
+        partial = partial or [False] * len(items)
+        texts = [None] * len(items)
+        fits = [i for i, a in enumerate(audio) if 0 < a.size <= WHISPER_SR * 30]
+        if len(fits) > 1 and self.language:
+            beam = WHISPER_BEAM_SIZE if self.decode != "adaptive" else 1
+            for i, (text, score) in zip(fits, self._generate([audio[i] for i in fits], beam)):
+                if beam > 1 and score == -math.inf:
+                    continue  # repeats itself: transcribe() below, with its temperature fallback
+                self.chunks += 1
+                if beam > 1 or partial[i] or not text or score >= WHISPER_MIN_LOGPROB:
+                    texts[i] = text
+                else:
+                    self.fallbacks += 1
+                    texts[i] = self._decode(audio[i], WHISPER_BEAM_SIZE)[0]
+        for i, a in enumerate(audio):
+            if texts[i] is None:
+                texts[i] = self.transcribe_partial(a, WHISPER_SR) if partial[i] else self.transcribe(a, WHISPER_SR)
+        return texts
+
+    def _generate(self, clips: list, beam_size: int) -> list:
+        """
+        [(text, avg token log-probability)] for 16 kHz clips of up to 30 s,
+        as one batch; -inf for a text more repetitive than
+        WHISPER_MAX_COMPRESSION, as _decode does per segment
+        """
+        import ctranslate2
+        from faster_whisper.tokenizer import Tokenizer
+
+        fe = self.model.feature_extractor
+        window = WHISPER_SR * 30
+        feats = [fe(np.pad(a, (0, window - a.size)))[:, :fe.nb_max_frames] for a in clips]
+        features = ctranslate2.StorageView.from_array(np.ascontiguousarray(np.stack(feats), dtype=np.float32))
+        tokenizer = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                              task="transcribe", language=self.language)
+        previous = tokenizer.encode(" " + self.initial_prompt.strip()) if self.initial_prompt else []
+        prompt = self.model.get_prompt(tokenizer, previous, without_timestamps=True)
+        results = self.model.model.generate(features, [prompt] * len(clips), beam_size=beam_size,
+                                            return_scores=True, suppress_blank=True)
+        out = []
+        for r in results:
+            text = tokenizer.decode(r.sequences_ids[0]).strip()
+            out.append((text, -math.inf if compression_ratio(text) > WHISPER_MAX_COMPRESSION else r.scores[0]))
+        return out
+
+    def warm_up(self, seconds: float = 1.0):
+        """
+        Decode a near-silent buffer once, so CTranslate2's lazy initialisation
+        is paid at startup and not by the first visitor.
+        """
+        noise = np.random.default_rng(0).normal(0.0, 1e-4, int(seconds * WHISPER_SR))
+        self._decode(noise.astype(np.float32), WHISPER_BEAM_SIZE)
+
+    def dump(self, audio_16k: np.ndarray):
+        import soundfile as sf
+        self._dumped += 1
+        os.makedirs(self.debug_dump_dir, exist_ok=True)
+        name = f"chunk_{time.strftime('%Y%m%d-%H%M%S')}_{self._dumped:04d}.wav"
+        sf.write(os.path.join(self.debug_dump_dir, name), audio_16k, WHISPER_SR)
+
+
+def load_stt_profile(path: str | None = STT_PROFILE) -> dict:
+    """Whisper settings picked by calibrate_stt.py on this host, else the defaults above."""
+    profile = {"model": WHISPER_MODEL_NAME, "device": WHISPER_DEVICE,
+               "compute_type": WHISPER_COMPUTE_TYPE, "language": WHISPER_LANGUAGE,
+               "decode": WHISPER_DECODE}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            profile.update(json.load(f))
+        print(f"[STT] Profile {path}: {profile['model']} on {profile['device']}/{profile['compute_type']}, "
+              f"{profile['decode']} decoding")
+    return profile
+
+
+def make_stt(model_name: str | None = None, profile_path: str | None = STT_PROFILE,
+             debug_dump_dir: str | None = STT_DEBUG_DUMP_DIR, local: bool = False) -> WhisperSTT:
+    """WhisperSTT as configured, or a RemoteSTT client when STT_SERVER is set (and not local)."""
+    if STT_SERVER and not local:
+        from stt_server import RemoteSTT
+        print(f"[STT] Using the shared STT server at {STT_SERVER}")
+        return RemoteSTT(STT_SERVER, client=KIOSK or f"{os.getpid()}@{BASE}")
+    profile = load_stt_profile(profile_path)
     stt = WhisperSTT(
-        model_name=WHISPER_MODEL_NAME,
-        device=WHISPER_DEVICE,
-        compute_type=WHISPER_COMPUTE_TYPE,
+        model_name=model_name or profile["model"],
+        device=profile["device"],
+        compute_type=profile["compute_type"],
+        debug_dump_dir=debug_dump_dir,
+        language=profile["language"],
+        decode=profile["decode"],
+        initial_prompt=format.stt_prompt() if WHISPER_KB_PROMPT else None,
+        num_workers=WHISPER_WORKERS if SPECULATE else 1,
     )
-    init_latency_csv()
+    if WHISPER_KB_PROMPT:
+        # new lab / faculty names in a reloaded kb.json bias Whisper too
+        format.kb_store.on_reload.append(lambda kb: setattr(stt, "initial_prompt", format.stt_prompt()))
+    return stt
 
-    print("\n=== Continuous voice → STT → KB/LLM → NAO TTS ===")
-    print(f"Recording {RECORD_SECONDS}-second chunks from device index {DEVICE_INDEX}")
-    print("For each chunk, the system will:")
-    print("  1) Transcribe speech")
-    print("  2) Run plan_reply (intent + kb + LLM)")
-    print("  3) Send final reply to NAO via format.speak(...)")
-    print("Press Ctrl+C to stop.\n")
 
-    chunk_idx = 0
+class Speculator:
+    """
+    Partial transcripts of the utterance being captured, on their own thread,
+    fed to a format.Speculation that starts the LLM before the visitor stops.
+    - offer(): latest audio of the open utterance (copied); one that arrives
+      while Whisper is busy replaces the one waiting
+    - finish(): the Speculation for the utterance just captured (a fresh one
+      is started for the next)
+    """
+    def __init__(self, stt: WhisperSTT, stream: bool = True):
+        self.stt = stt
+        self.stream = stream
+        self.spec = format.Speculation(stream)
+        self.start = None
+        self._pending = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="speculate").start()
+
+    def offer(self, view: np.ndarray, sr: int, start: int, paused: bool):
+        with self._cond:
+            if start != self.start:
+                # a new utterance; whatever the last one started is stale
+                self.spec.drop()
+                self.spec, self.start = format.Speculation(self.stream), start
+            self._pending = (self.spec, view.copy(), sr, paused)
+            self._cond.notify()
+
+    def finish(self):
+        with self._cond:
+            spec, self.spec = self.spec, format.Speculation(self.stream)
+            self.start = None
+            self._pending = None
+        return spec
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                spec, pcm, sr, paused = self._pending
+                self._pending = None
+            if spec.closed:
+                continue
+            try:
+                spec.update(self.stt.transcribe_partial(pcm, sr), paused)
+            except Exception as e:
+                print(f"[Spec] Partial transcript failed: {e}")
+
+
+_latency_file = None     # kept open for the whole run
+stt_rtf = None           # STT ms per ms of audio, recent turns (seeded by the warm-up)
+skip_stats = {}          # reason -> [chunks, audio s, STT ms avoided]
+trace_writer = None      # tracing.TraceWriter, see init_tracing()
+span_stats = None        # tracing.SpanStats
+
+def init_tracing():
+    global trace_writer, span_stats
+    if not TRACE_PATH:
+        return
+    trace_writer = tracing.TraceWriter(TRACE_PATH, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS)
+    span_stats = tracing.SpanStats()
+    if TRACE_STATS_PORT:
+        tracing.serve_stats(span_stats, TRACE_STATS_PORT)
+        print(f"[Trace] Live span stats on http://127.0.0.1:{TRACE_STATS_PORT}/stats")
 
+
+def write_latency_row(row: list):
+    global _latency_file
     try:
-        while True:
-            chunk_idx += 1
+        if _latency_file is None:
+            _latency_file = open(LATENCY_CSV, mode="a", newline="")
+        csv.writer(_latency_file).writerow(row)
+        _latency_file.flush()
+        if _latency_file.tell() >= LATENCY_MAX_BYTES:
+            _latency_file.close()
+            _latency_file = None
+            init_latency_csv(rotate=True)
+    except Exception as e:
+        print(f"[WARN] Failed to write latency CSV: {e}")
+
+
+def log_turn(turn: Turn):
+    global stt_rtf
+    total_ms = (time.time() - turn.captured_at) * 1000.0
+    row = [turn.idx, f"{turn.captured_at:.3f}", f"{turn.audio_ms:.2f}", f"{turn.endpoint_ms:.2f}"]
+    row += [f"{turn.stage_ms.get(s, 0.0):.2f}" for s in STAGES]
+    # time-to-first-audio: hand-off from capture -> first sentence sent to NAO
+    ttfa_ms = ((turn.first_audio_at or time.time()) - turn.captured_at) * 1000.0
+    row += [f"{total_ms:.2f}", f"{ttfa_ms:.2f}"]
+    row += [f"{turn.wait_ms.get(s, 0.0):.2f}" for s in STAGES]
+    row += [turn.depth.get(s, 0) for s in STAGES]
+    row += [turn.intent, turn.source, turn.spec, f"{turn.spec_saved_ms:.2f}", ""]
+    write_latency_row(row)
+    if turn.audio_ms and "stt" in turn.stage_ms:
+        rtf = turn.stage_ms["stt"] / turn.audio_ms
+        stt_rtf = rtf if stt_rtf is None else 0.8 * stt_rtf + 0.2 * rtf
+
+    if turn.trace is not None and trace_writer is not None:
+        record = turn.trace.finish(intent=turn.intent, source=turn.source,
+                                   audio_ms=round(turn.audio_ms, 1))
+        trace_writer.write(record)
+        span_stats.add(record)
+
+
+def log_skipped(reason: str, audio_s: float):
+    """
+    A chunk that never reached Whisper ("echo": NAO's own output, "noise":
+    below the noise floor). Logged as a latency row with source skip:<reason>
+    and stt_avoided_ms, its length x the STT real-time factor of recent turns.
+    """
+    avoided_ms = audio_s * 1000.0 * (stt_rtf or 0.0)
+    st = skip_stats.setdefault(reason, [0, 0.0, 0.0])
+    st[0] += 1
+    st[1] += audio_s
+    st[2] += avoided_ms
+    row = dict.fromkeys(LATENCY_FIELDS, "")
+    row.update(ts=f"{time.time():.3f}", audio_ms=f"{audio_s * 1000.0:.2f}",
+               source=f"skip:{reason}", stt_avoided_ms=f"{avoided_ms:.2f}")
+    write_latency_row([row[f] for f in LATENCY_FIELDS])
+
+
+def build_pipeline(stt: WhisperSTT, on_done=log_turn, on_drop=None):
+    """
+    Start the stt -> plan -> speak stages (see pipeline.py).
+    Returns (head stage, robot_talking BusyWindow, barged_in Event); also
+    used by replay.py to push recorded utterances through the same code.
+    """
+    robot_talking = BusyWindow(tail_s=ECHO_TAIL_S)
+    barged_in = threading.Event()
+
+    # ---- stage workers (each runs on its own thread) ----
+    def transcribe(turn: Turn):
+        turn.text = stt.transcribe(turn.pcm, turn.sample_rate)
+        turn.pcm = None
+        print(f"\n===== CHUNK {turn.idx} (sr={turn.sample_rate}) =====")
+        print("User (transcribed):", turn.text or "[no text recognized]")
+        if not turn.text.strip():
+            print("No speech detected, skipping reply.")
+            if turn.speculation is not None:
+                turn.speculation.drop()
+            return None
+        return turn
+
+    def plan(turn: Turn):
+        spec, turn.speculation = turn.speculation, None
+        if not STREAM_REPLIES:
+            info = {}
+            turn.reply, turn.intent = format.plan_reply(turn.text, info=info, speculation=spec)
+            turn.source = info.get("source", "")
+            turn.spec, turn.spec_saved_ms = info.get("spec", ""), info.get("spec_saved_ms", 0.0)
+            print(f"Bot reply (chunk {turn.idx}):", turn.reply)
+            return turn
+
+        # Hand the turn to the speak stage after the first sentence and keep
+        # feeding it sentences while the LLM is still generating.
+        info = {}
+        sentences, turn.intent = format.plan_reply_stream(turn.text, info=info, speculation=spec)
+        turn.source = info.get("source", "")
+        turn.spec, turn.spec_saved_ms = info.get("spec", ""), info.get("spec_saved_ms", 0.0)
+        turn.sentences = queue.Queue()
+        parts = []
+        try:
+            for sentence in sentences:
+                parts.append(sentence)
+                turn.sentences.put(sentence)
+                if len(parts) == 1:
+                    plan_stage.emit(turn)
+        finally:
+            turn.sentences.put(None)
+        turn.reply = " ".join(parts)
+        print(f"Bot reply (chunk {turn.idx}):", turn.reply)
+        # already emitted unless the reply came back empty
+        return None if parts else turn
+
+    def actuate(turn: Turn):
+        # Sentences are queued on NAO as they arrive (no round trip between
+        # them); the stage then waits for the last one so the echo window
+        # covers the whole reply. With body.py publishing its output events
+        # (OutputMonitor) the window follows those instead.
+        local = not robot_talking.external
+        if local:
+            robot_talking.begin()
+        barged_in.clear()
+        try:
+            if turn.sentences is None:
+                turn.first_audio_at = time.time()
+                wait_speech(speak(turn.reply, turn.intent))
+                return turn
+
+            # gesture goes with the first sentence only
+            intent = turn.intent
+            job_id = None
+            while (sentence := turn.sentences.get()) is not None:
+                if barged_in.is_set():
+                    continue
+                if turn.first_audio_at is None:
+                    turn.first_audio_at = time.time()
+                job_id = speak(sentence, intent)
+                intent = None
+            if job_id is not None:
+                wait_speech(job_id)
+        finally:
+            if local:
+                robot_talking.end()
+        return turn
+
+    plan_stage = Stage("plan", plan, maxsize=PLAN_QUEUE_SIZE)
+    head = chain(
+        Stage("stt", transcribe, maxsize=STT_QUEUE_SIZE),
+        plan_stage,
+        Stage("speak", actuate, maxsize=SPEAK_QUEUE_SIZE, on_done=on_done),
+        on_drop=on_drop,
+    )
+    return head, robot_talking, barged_in
 
-            # 1) record a chunk (we do NOT include the fixed record time in timings)
-            audio_np, sr = record_once(device_index=DEVICE_INDEX)
 
-            # 2) STT timing
-            t0 = time.time()
-            text = stt.transcribe(audio_np, sr)
-            t1 = time.time()
+def ping_body():
+    """Check body.py is up (and open the keep-alive connection to it)."""
+    try:
+        nao_http.get(f"{BASE}/speaking", timeout=HTTP_TIMEOUT_S)
+    except requests.RequestException as e:
+        print(f"[Startup] body.py not reachable at {BASE} yet: {e}")
 
-            print(f"\n===== CHUNK {chunk_idx} (sr={sr}) =====")
-            print("User (transcribed):", text or "[no text recognized]")
 
-            if not text.strip():
-                print("No speech detected, skipping reply.")
-                time.sleep(2)
-                continue
+def startup():
+    """
+    Cold start in parallel: Whisper model load, KB indexes, LLM client,
+    PyAudio import and a body.py ping run at the same time; then Whisper is
+    warmed up on a silent buffer. Returns (stt, phase timings in ms) once the
+    sidecar is ready to take audio.
+    """
+    t0 = time.time()
+    phases = {}
+
+    def timed(name, fn):
+        t = time.time()
+        out = fn()
+        phases[name] = round((time.time() - t) * 1000.0, 1)
+        return out
+
+    with ThreadPoolExecutor(max_workers=5, thread_name_prefix="startup") as pool:
+        jobs = [
+            pool.submit(timed, "whisper_load", make_stt),   # STT is instantiated once
+            pool.submit(timed, "kb_index", format.load_kb),
+            pool.submit(timed, "llm_client", format.get_client),
+            pool.submit(timed, "pyaudio_import", lambda: importlib.import_module("pyaudio")),
+            pool.submit(timed, "body_ping", ping_body),
+        ]
+        stt = jobs[0].result()
+        for job in jobs[1:]:
+            job.result()
+    phases["parallel"] = round((time.time() - t0) * 1000.0, 1)
+    timed("whisper_warmup", stt.warm_up)
+    phases["ready"] = round((time.time() - t0) * 1000.0, 1)
+
+    print(f"[Startup] Ready in {phases['ready']:.0f} ms: "
+          + ", ".join(f"{k} {v:.0f}" for k, v in phases.items() if k != "ready"))
+    if STARTUP_LOG:
+        with open(STARTUP_LOG, "a") as f:
+            f.write(json.dumps({"ts": round(t0, 3), "model": stt.model_name, **phases}) + "\n")
+    return stt, phases
+
+
+def calibrate_noise(capture: Capture, robot_talking: BusyWindow, seconds: float = NOISE_CALIBRATION_S):
+    """
+    Seed the noise floor from `seconds` of ambient audio, recorded while NAO
+    is quiet, instead of the VAD_THRESHOLD / VAD_NOISE_RATIO guess.
+    """
+    ring, sr = capture.mic.ring, capture.mic.sample_rate
+    while robot_talking.active():
+        time.sleep(0.1)
+    start = ring.write_pos
+    while not ring.wait_until(start + int(seconds * sr), timeout=1.0):
+        pass
+    floor = noise_level(ring.view(start, start + int(seconds * sr)), FRAMES_PER_BUFFER)
+    capture.endpointer.noise_floor = capture.echo.noise_floor = floor
+    capture.skip_to_now()
+    print(f"[Record] Noise floor {floor:.4f} (speech above "
+          f"{max(VAD_THRESHOLD, floor * VAD_NOISE_RATIO):.4f}), from {seconds:.1f}s of ambient audio")
+    return floor
 
-            # 3) KB + LLM planning timing
-            t2_start = time.time()
-            reply, intent = format.plan_reply(text)
-            t2_end = time.time()
-            print("Bot reply:", reply)
 
-            # 4) NAO TTS / speak timing
-            t3_start = time.time()
-            speak(reply, intent)
-            t3_end = time.time()
-            print("=================================\n")
+def main():
+    global stt_rtf
+    stt, phases = startup()
+    if isinstance(stt, WhisperSTT):
+        stt_rtf = phases["whisper_warmup"] / 1000.0   # warm_up() decodes 1 s of audio
+    init_latency_csv()
+    init_tracing()
+    head, robot_talking, barged_in = build_pipeline(stt)
+    OutputMonitor(robot_talking).start()
+    gate = robot_talking.active if GATE_ROBOT_OUTPUT and not BARGE_IN else None
+    # audio is only accepted once everything above is loaded and warm
+    speculator = Speculator(stt, STREAM_REPLIES) if SPECULATE and CAPTURE_MODE == "vad" else None
+
+    def on_partial(view, sr, start, paused):
+        # no early LLM calls on NAO's own voice coming back through the mic
+        now = time.time()
+        if BARGE_IN or not robot_talking.covers(now - len(view) / sr, now):
+            speculator.offer(view, sr, start, paused)
+
+    mic = MicStream(DEVICE_INDEX, FRAMES_PER_BUFFER, ring_seconds=RING_SECONDS).open()
+    capture = Capture(mic, on_partial=on_partial if speculator else None, gate=gate, on_skip=log_skipped)
+    if NOISE_CALIBRATION_S:
+        calibrate_noise(capture, robot_talking)
 
-            # --- compute and log latencies ---
-            stt_ms   = (t1 - t0) * 1000.0
-            plan_ms  = (t2_end - t2_start) * 1000.0
-            speak_ms = (t3_end - t3_start) * 1000.0
-            total_ms = (t3_end - t0) * 1000.0
+    print("\n=== Continuous voice → STT → KB/LLM → NAO TTS ===")
+    if CAPTURE_MODE == "vad":
+        print(f"Listening for VAD-endpointed utterances on device index {DEVICE_INDEX}")
+    else:
+        print(f"Recording {RECORD_SECONDS}-second chunks from device index {DEVICE_INDEX}")
+    print("Capture, STT, planning and speech run as pipelined stages:")
+    print("  1) Transcribe speech")
+    print("  2) Run plan_reply (intent + kb + LLM)")
+    print("  3) Send final reply to NAO via speak(...)")
+    if gate is not None:
+        print("Audio heard while NAO speaks or gestures is ignored (GATE_ROBOT_OUTPUT).")
+    else:
+        print("The next utterance is captured and transcribed while NAO is still talking.")
+    print("Press Ctrl+C to stop.\n")
 
-            try:
-                with open(LATENCY_CSV, mode="a", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([chunk_idx, f"{stt_ms:.2f}", f"{plan_ms:.2f}",
-                                        f"{speak_ms:.2f}", f"{total_ms:.2f}"])
-            except Exception as e:
-                print(f"[WARN] Failed to write latency CSV: {e}")
+    chunk_idx = 0
+
+    try:
+        while True:
+            # Capture runs on the main thread and feeds the STT stage; put()
+            # blocks if STT falls behind. The visitor's own speaking time is
+            # not part of total_ms; the hangover is logged as endpoint_ms.
+            view, sr, endpoint_ms = capture.next()
+            end = time.time()
+            speculation = speculator.finish() if speculator else None
+            over_nao = robot_talking.covers(end - len(view) / sr, end)
+            skip = None
+            if over_nao and not BARGE_IN:
+                print("[Record] Utterance overlaps NAO's own speech, dropping.")
+                skip = "echo"
+            elif capture.endpointer.speech_ms(view) < VAD_MIN_SPEECH_MS:
+                print(f"[Record] {len(view)/sr:.2f}s chunk is below the noise floor, skipping STT.")
+                skip = "noise"
+            if skip:
+                log_skipped(skip, len(view) / sr)
+                if speculation is not None:
+                    speculation.drop()
+                continue
+            if over_nao:
+                print("[Record] Visitor spoke over NAO, stopping speech.")
+                barged_in.set()
+                stop_speaking()
 
-            # Small pause 
-            time.sleep(3)
+            chunk_idx += 1
+            # Copy out of the ring: the turn may sit in a queue long enough
+            # for the ring to wrap over the view.
+            turn = Turn(chunk_idx, view.copy(), sr, endpoint_ms)
+            turn.speculation = speculation
+            if trace_writer is not None:
+                # capture ran before the trace existed: add its spans after the fact
+                turn.trace = tracing.Trace(chunk_idx)
+                heard = end - endpoint_ms / 1000.0
+                turn.trace.add("record", end - len(view) / sr, heard)
+                turn.trace.add("endpoint", heard, end)
+            head.put(turn)
 
     except KeyboardInterrupt:
             print("\n[Main] Stopped by user.")
+            print(f"[Cache] {format.cache_stats()}")
+            for reason, (n, audio_s, avoided_ms) in skip_stats.items():
+                print(f"[Gate] {reason}: {n} chunks ({audio_s:.1f}s of audio) not transcribed, "
+                      f"~{avoided_ms / 1000.0:.1f}s of STT avoided")
+            if speculator:
+                print(f"[Spec] {format.speculation_stats()}")
+    finally:
+        mic.close()
+        if trace_writer is not None:
+            trace_writer.close()
 
 
 if __name__ == "__main__":
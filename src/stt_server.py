@@ -0,0 +1,311 @@
+"""
+Shared Whisper service: one model in one process for several sidecars
+(one per reception point), instead of a model per sidecar.
+
+Utterances arrive over a local TCP socket. Requests that come in within
+BATCH_WINDOW_MS of each other (or that queue up while a batch is decoding)
+are decoded together by WhisperSTT.transcribe_batch, and each transcript
+goes back on the connection it came from.
+
+    python3 stt_server.py                          # 127.0.0.1:5010, model from stt_profile.json
+    python3 stt_server.py --port 5010 --max-batch 8 --window-ms 30
+
+A sidecar uses it with STT_SERVER = "127.0.0.1:5010" (or NAO_STT_SERVER).
+
+Wire format, both ways: 8-byte header (JSON length, payload length, network
+order), a JSON object, then the payload.
+- request  {"op": "transcribe", "id": n, "sr": 48000, "client": "...", "partial": false}
+  + int16 mono PCM; reply {"id": n, "text": "...", "queue_ms", "decode_ms", "batch"}
+- request  {"op": "stats"}; reply the server's counters
+"""
+
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+from audio import to_int16
+
+HOST = "127.0.0.1"
+PORT = 5010
+MAX_BATCH = 8             # utterances decoded together at most
+BATCH_WINDOW_MS = 30      # how long the first request of a batch waits for company
+CLIENT_TIMEOUT_S = 60.0   # socket timeout on the sidecar side
+
+_HEADER = struct.Struct("!II")
+
+
+def send_msg(sock: socket.socket, header: dict, payload: bytes = b""):
+    head = json.dumps(header).encode()
+    sock.sendall(_HEADER.pack(len(head), len(payload)) + head + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_msg(sock: socket.socket):
+    """(header, payload), or (None, None) once the peer has closed."""
+    head = _recv_exact(sock, _HEADER.size)
+    if head is None:
+        return None, None
+    n_head, n_payload = _HEADER.unpack(head)
+    header = json.loads(_recv_exact(sock, n_head) or b"{}")
+    payload = _recv_exact(sock, n_payload) if n_payload else b""
+    return header, payload
+
+
+class _Job:
+    def __init__(self, header: dict, pcm: np.ndarray, reply):
+        self.id = header.get("id")
+        self.client = header.get("client") or "?"
+        self.sr = int(header["sr"])
+        self.partial = bool(header.get("partial"))
+        self.pcm = pcm
+        self.reply = reply
+        self.arrived = time.time()
+
+
+class STTServer:
+    """
+    ThreadingTCPServer in front of one WhisperSTT.
+    - A thread per connection reads requests into one queue
+    - A single batcher thread takes the first waiting request, collects more
+      for up to window_ms (or whatever queued up meanwhile, up to max_batch)
+      and decodes them as one batch
+    - stats(): requests, batch sizes and per-client server-side latency
+    """
+    def __init__(self, stt, host: str = HOST, port: int = PORT,
+                 max_batch: int = MAX_BATCH, window_ms: float = BATCH_WINDOW_MS):
+        self.stt = stt
+        self.max_batch = max_batch
+        self.window_s = window_ms / 1000.0
+        self.jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batch_sizes = {}         # batch size -> count
+        self.clients = {}             # client -> [requests, total ms, max ms]
+        self.server = socketserver.ThreadingTCPServer((host, port), self._handler(), bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.port = self.server.server_address[1]
+
+    def start(self) -> "STTServer":
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="stt-accept").start()
+        threading.Thread(target=self._batcher, daemon=True, name="stt-batch").start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                sock = self.request
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                send_lock = threading.Lock()
+
+                def reply(header):
+                    with send_lock:
+                        try:
+                            send_msg(sock, header)
+                        except OSError:
+                            pass      # client went away; nothing to tell it
+
+                while True:
+                    header, payload = recv_msg(sock)
+                    if header is None:
+                        return
+                    if header.get("op") == "stats":
+                        reply(server.stats())
+                        continue
+                    try:
+                        pcm = np.frombuffer(payload, dtype=np.int16)
+                        server.jobs.put(_Job(header, pcm, reply))
+                    except (KeyError, ValueError) as e:
+                        reply({"id": header.get("id"), "error": f"bad request: {e}"})
+
+        return Handler
+
+    def _next_batch(self) -> list:
+        batch = [self.jobs.get()]
+        deadline = batch[0].arrived + self.window_s
+        while len(batch) < self.max_batch:
+            try:
+                # past the window, still take whatever queued up meanwhile
+                batch.append(self.jobs.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batcher(self):
+        while True:
+            batch = self._next_batch()
+            t0 = time.time()
+            try:
+                texts = self.stt.transcribe_batch([(j.pcm, j.sr) for j in batch],
+                                                  partial=[j.partial for j in batch])
+                error = None
+            except Exception as e:
+                print(f"[STTServer] Batch of {len(batch)} failed: {e}")
+                texts, error = [""] * len(batch), str(e)
+            done = time.time()
+            for job, text in zip(batch, texts):
+                out = {"id": job.id, "text": text, "batch": len(batch),
+                       "queue_ms": round((t0 - job.arrived) * 1000.0, 1),
+                       "decode_ms": round((done - t0) * 1000.0, 1)}
+                if error:
+                    out["error"] = error
+                job.reply(out)
+            self._record(batch, done)
+
+    def _record(self, batch: list, done: float):
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            for job in batch:
+                ms = (done - job.arrived) * 1000.0
+                c = self.clients.setdefault(job.client, [0, 0.0, 0.0])
+                c[0] += 1
+                c[1] += ms
+                c[2] = max(c[2], ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = sum(c[0] for c in self.clients.values())
+            return {
+                "model": getattr(self.stt, "model_name", None),
+                "requests": requests,
+                "batches": self.batches,
+                "mean_batch": round(requests / self.batches, 2) if self.batches else 0.0,
+                "batch_sizes": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                "clients": {k: {"requests": c[0], "mean_ms": round(c[1] / c[0], 1), "max_ms": round(c[2], 1)}
+                            for k, c in sorted(self.clients.items())},
+            }
+
+
+class RemoteSTT:
+    """
+    WhisperSTT stand-in for a sidecar that uses stt_server.py.
+    - Same transcribe / transcribe_partial / warm_up interface
+    - One connection per calling thread (STT stage, speculator), reconnected
+      once if the server restarted
+    """
+    def __init__(self, address: str, client: str | None = None, timeout_s: float = CLIENT_TIMEOUT_S):
+        host, _, port = address.rpartition(":")
+        self.address = (host or HOST, int(port))
+        self.client = client or f"{socket.gethostname()}:{id(self) & 0xffff:x}"
+        self.timeout_s = timeout_s
+        self.model_name = f"remote {address}"
+        self.ids = itertools.count(1)
+        self._local = threading.local()
+
+    def _sock(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout_s)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, header: dict, payload: bytes = b"") -> dict:
+        for attempt in (1, 2):
+            try:
+                sock = self._sock()
+                send_msg(sock, header, payload)
+                reply, _ = recv_msg(sock)
+                if reply is None:
+                    raise ConnectionError("STT server closed the connection")
+                return reply
+            except OSError:
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def request(self, audio_np: np.ndarray, sample_rate: int, partial: bool = False) -> dict:
+        """The server's full reply: text, queue_ms, decode_ms and batch size."""
+        pcm = to_int16(audio_np)
+        header = {"op": "transcribe", "id": next(self.ids), "sr": int(sample_rate),
+                  "client": self.client, "partial": partial}
+        reply = self._call(header, pcm.tobytes())
+        if reply.get("error"):
+            raise RuntimeError(f"STT server: {reply['error']}")
+        return reply
+
+    def transcribe(self, audio_np: np.ndarray, sample_rate: int) -> str:
+        if audio_np.size == 0:
+            return ""
+        print(f"[STT] Sending chunk ({audio_np.size / sample_rate:.2f}s) to {self.address[0]}:{self.address[1]}...")
+        return self.request(audio_np, sample_rate)["text"]
+
+    def transcribe_partial(self, audio_np: np.ndarray, sample_rate: int) -> str:
+        return self.request(audio_np, sample_rate, partial=True)["text"]
+
+    def warm_up(self, seconds: float = 1.0, wait_s: float = 120.0):
+        """Connect early (waiting for the server to load its model), so the first visitor does not pay for it."""
+        deadline = time.time() + wait_s
+        while True:
+            try:
+                self.stats()
+                return
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(1.0)
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+def main():
+    import sidecar
+
+    p = argparse.ArgumentParser(description="Shared, micro-batched Whisper service for several sidecars.")
+    p.add_argument("--host", default=HOST)
+    p.add_argument("--port", type=int, default=PORT)
+    p.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    p.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS)
+    p.add_argument("--model", default=None, help="Whisper model (default: stt_profile.json / sidecar's)")
+    args = p.parse_args()
+
+    stt = sidecar.make_stt(model_name=args.model, debug_dump_dir=None, local=True)
+    stt.warm_up()
+    server = STTServer(stt, args.host, args.port, args.max_batch, args.window_ms).start()
+    print(f"[STTServer] {stt.model_name} on {args.host}:{server.port}, "
+          f"batches of up to {args.max_batch} within {args.window_ms:.0f} ms")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[STTServer] {json.dumps(server.stats())}")
+    except KeyboardInterrupt:
+        print(f"\n[STTServer] {json.dumps(server.stats())}")
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
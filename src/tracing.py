@@ -0,0 +1,238 @@
+"""
+Lightweight per-turn tracing: nested spans, written as one JSONL line per
+turn by a background writer with size-based rotation.
+
+    tr = Trace(turn_idx)
+    with tr.activate(), span("stt"):          # on the thread doing the work
+        with span("resample"):
+            ...
+    tr.add("record", start, end)              # span timed elsewhere
+    writer.write(tr.finish())
+
+- span() is a no-op when the current thread has no active trace, so the
+  instrumented code (format.py, WhisperSTT) also runs untraced
+- bind(fn) carries the active trace into executor threads
+- SpanStats keeps recent durations per span name; serve_stats() exposes
+  them as JSON over HTTP (GET /stats)
+"""
+
+from __future__ import annotations
+import contextlib
+import functools
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+
+_local = threading.local()
+_TICK = object()            # wakes the writer for a periodic flush
+
+
+class Trace:
+    def __init__(self, turn_idx: int, **attrs):
+        self.turn_idx = turn_idx
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.spans = []             # dicts, appended when a span ends
+        self.finished = False
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def activate(self, parent: int | None = None):
+        """
+        Make this the current thread's trace for the duration of the block;
+        new spans nest under `parent` (a span id) if given.
+        """
+        prev = getattr(_local, "trace", None), getattr(_local, "stack", None)
+        _local.trace, _local.stack = self, ([parent] if parent is not None else [])
+        try:
+            yield self
+        finally:
+            _local.trace, _local.stack = prev
+
+    def new_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, name: str, start: float, end: float, parent: int | None = None,
+            span_id: int | None = None, **attrs) -> int:
+        """Record a span timed outside span() (wall-clock seconds)."""
+        with self._lock:
+            if span_id is None:
+                span_id = next(self._ids)
+            if not self.finished:
+                self.spans.append({"id": span_id, "parent": parent, "name": name,
+                                   "start": round(start, 6), "ms": round((end - start) * 1000.0, 3),
+                                   "thread": threading.current_thread().name, **attrs})
+        return span_id
+
+    def finish(self, **attrs) -> dict:
+        with self._lock:
+            self.finished = True
+            self.attrs.update(attrs)
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        return {"turn": self.turn_idx, "ts": round(self.started_at, 6),
+                "ms": round((time.time() - self.started_at) * 1000.0, 3),
+                **self.attrs, "spans": spans}
+
+
+def current() -> Trace | None:
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Time the block as a child of the innermost open span. Yields a dict the
+    block can add attributes to.
+    """
+    tr = current()
+    if tr is None:
+        yield attrs
+        return
+    stack = _local.stack
+    parent = stack[-1] if stack else None
+    span_id = tr.new_id()
+    stack.append(span_id)
+    t0 = time.time()
+    try:
+        yield attrs
+    finally:
+        stack.pop()
+        tr.add(name, t0, time.time(), parent=parent, span_id=span_id, **attrs)
+
+
+def record(name: str, start: float, end: float, **attrs):
+    """Add a span timed elsewhere under the innermost open span (no-op untraced)."""
+    tr = current()
+    if tr is not None:
+        tr.add(name, start, end, parent=_local.stack[-1] if _local.stack else None, **attrs)
+
+
+def bind(fn):
+    """fn wrapped to run under the caller's current trace (for thread pools)."""
+    tr = current()
+    if tr is None:
+        return fn
+    parent = _local.stack[-1] if _local.stack else None
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with tr.activate(parent):
+            return fn(*args, **kwargs)
+    return run
+
+
+class TraceWriter:
+    """
+    Background JSONL writer.
+    - write() only enqueues; one thread serialises and writes, flushing at
+      most every flush_s seconds
+    - The file is rotated at max_bytes: trace.jsonl -> trace.jsonl.1 ... .N
+    - close() drains the queue
+    """
+    def __init__(self, path: str, max_bytes: int = 10_000_000, backups: int = 5,
+                 flush_s: float = 1.0, maxsize: int = 10_000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_s = flush_s
+        self.dropped = 0
+        self._q = queue.Queue(maxsize=maxsize)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            try:
+                record = self._q.get(timeout=self.flush_s)
+            except queue.Empty:
+                record = _TICK
+            if record is None:
+                break
+            if record is not _TICK:
+                self._f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            if record is _TICK or time.time() - last_flush >= self.flush_s:
+                self._f.flush()
+                last_flush = time.time()
+                if self._f.tell() >= self.max_bytes:
+                    self._rotate()
+        self._f.close()
+
+    def _rotate(self):
+        self._f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join(timeout=5)
+
+
+class SpanStats:
+    """Durations of the last `keep` spans per name, for live percentiles."""
+    def __init__(self, keep: int = 500):
+        self.keep = keep
+        self.turns = 0
+        self._ms = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.turns += 1
+            for s in record["spans"]:
+                values = self._ms.setdefault(s["name"], [])
+                values.append(s["ms"])
+                if len(values) > self.keep:
+                    del values[0]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {"turns": self.turns, "spans": {}}
+            for name, values in sorted(self._ms.items()):
+                v = sorted(values)
+                pick = lambda p: v[min(len(v) - 1, int(p / 100 * len(v)))]
+                out["spans"][name] = {"n": len(v), "p50": pick(50), "p95": pick(95), "max": v[-1]}
+            return out
+
+
+def serve_stats(stats: SpanStats, port: int):
+    """GET /stats on 127.0.0.1:port from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/stats":
+                self.send_error(404)
+                return
+            data = json.dumps(stats.snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, name="trace-stats", daemon=True).start()
+    return server
@@ -0,0 +1,17 @@
+# The modules under test live in src/ and import each other by name, as the
+# scripts there do when run from that directory.
+import json
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+os.environ.setdefault("NAO_LLM_BACKEND", "fake")    # format.py never reaches Gemini
+
+
+@pytest.fixture(scope="session")
+def kb_data():
+    with open(os.path.join(SRC, "kb.json")) as f:
+        return json.load(f)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from audio import to_int16
+
+
+def test_int16_unchanged():
+    pcm = np.array([0, 1000, -32768, 32767], dtype=np.int16)
+    assert np.array_equal(to_int16(pcm), pcm)
+
+
+def test_float_scaled_and_clipped():
+    out = to_int16(np.array([0.0, 0.5, -1.0, 1.0, 2.0, -3.0], dtype=np.float32))
+    assert out.dtype == np.int16
+    assert out.tolist() == [0, 16383, -32767, 32767, 32767, -32767]
+
+
+def test_other_dtypes_rejected():
+    with pytest.raises(TypeError):
+        to_int16(np.zeros(4, dtype=np.int32))
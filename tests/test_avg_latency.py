@@ -0,0 +1,85 @@
+import math
+import random
+
+import pytest
+
+from avg_latency import QuantileSketch, Report, log_files, parse_window
+
+
+def exact(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_quantiles_within_relative_accuracy(seed):
+    rng = random.Random(seed)
+    values = [rng.lognormvariate(6, 1) for _ in range(20000)]
+    sketch = QuantileSketch(accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.9, 0.95, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact(values, q), rel=0.01)
+    assert (sketch.min, sketch.max, sketch.count) == (min(values), max(values), len(values))
+
+
+def test_merge_equals_one_sketch():
+    rng = random.Random(3)
+    values = [rng.uniform(1, 5000) for _ in range(5000)]
+    whole, a, b = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, v in enumerate(values):
+        whole.add(v)
+        (a if i % 2 else b).add(v)
+    a.merge(b)
+    assert a.summary() == whole.summary()
+
+
+def test_zeros_and_empty():
+    sketch = QuantileSketch()
+    assert math.isnan(sketch.quantile(0.5))
+    for v in (0, 0, 0, 10):
+        sketch.add(v)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(10, rel=0.01)
+
+
+def test_parse_window():
+    assert [parse_window(w) for w in ("90s", "15m", "1h", "1d", "30")] == [90, 900, 3600, 86400, 30]
+
+
+def test_windows_without_step_do_not_overlap():
+    report = Report(window_s=3600)
+    for ts in (7200, 7200 + 3599, 7200 + 3600):
+        report.add({"ts": ts, "total_ms": 100})
+    assert sorted(report.to_json()["windows"]) == ["10800", "7200"]
+
+
+def test_rolling_windows_overlap():
+    report = Report(window_s=3600, step_s=900)
+    for ts in range(0, 7200, 60):
+        report.add({"ts": ts, "total_ms": 100})
+    windows = report.to_json()["windows"]
+    # every full window holds one hour of rows, one per minute
+    assert windows["900"]["total_ms"]["count"] == windows["3600"]["total_ms"]["count"] == 60
+    assert windows["6300"]["total_ms"]["count"] == 15
+    assert len(windows) == 8 + 3        # starts 0..6300, plus three that began before t=0
+
+
+def test_old_windows_are_evicted():
+    report = Report(window_s=60, max_windows=3)
+    for ts in range(0, 600, 10):
+        report.add({"ts": ts, "total_ms": 100})
+    report.add({"ts": 5, "total_ms": 100})          # late row for an evicted window
+    out = report.to_json()
+    assert sorted(out["windows"], key=int) == ["420", "480", "540"]
+    assert out["windows_dropped"] == 7
+
+
+def test_default_logs_skip_kiosk_logs(tmp_path, monkeypatch):
+    for name in ("latency_log.csv", "latency_log.20260101-000000.csv",
+                 "latency_log_lobby.csv", "latency_log_lobby.20260102-000000.csv"):
+        (tmp_path / name).write_text("ts,total_ms\n")
+    monkeypatch.chdir(tmp_path)
+    assert log_files([]) == ["latency_log.20260101-000000.csv", "latency_log.csv"]
+    assert log_files([], ["lobby"]) == ["latency_log_lobby.20260102-000000.csv", "latency_log_lobby.csv"]
+    assert len(log_files(["*.csv"])) == 4
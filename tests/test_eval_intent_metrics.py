@@ -0,0 +1,20 @@
+from eval_intent_metrics import classify_batch, read_dataset
+from intent import classify_intent
+
+
+def test_rows_without_gold_label_are_skipped(tmp_path, capsys):
+    path = tmp_path / "ds.jsonl"
+    path.write_text('{"text": "hello", "intent": "greeting"}\n'
+                    '{"text": "where is the lab"}\n'
+                    '{"text": "bye", "label": "close"}\n'
+                    '[1, 2]\n'
+                    'not json\n')
+    assert list(read_dataset(str(path))) == [("hello", "greeting"), ("bye", "close")]
+    assert capsys.readouterr().err.count("[WARN]") == 3
+
+
+def test_classify_batch_matches_single_queries():
+    texts = ["hello", "where is the midas lab", "who is professor sharma", "tell me a joke"]
+    preds, us = classify_batch(texts)
+    assert preds == [classify_intent(t) for t in texts]
+    assert len(us) == len(texts)
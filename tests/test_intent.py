@@ -0,0 +1,47 @@
+import pytest
+
+from bench_intent import corpus, legacy_classify_intent
+from eval_intent_metrics import TEST_DATA
+from intent import classify_intent, classify_intents
+
+
+@pytest.mark.parametrize("text, gold", TEST_DATA)
+def test_test_data_labels(text, gold):
+    assert classify_intent(text) == gold
+
+
+# (query, old format.classify_intent label, label now): the intended changes listed in intent.py
+CHANGED = [
+    ("which bus goes to the metro", "greeting", "out_of_scope"),
+    ("what is the population of delhi", "greeting", "out_of_scope"),
+    ("is the midas lab open on sunday", "directory", "hours"),
+    ("hello, thank you", "greeting", "close"),
+    ("hi, when does the library open", "greeting", "hours"),
+    ("what are the gym timings", "out_of_scope", "hours"),
+]
+
+
+@pytest.mark.parametrize("text, old, new", CHANGED)
+def test_intended_changes_from_legacy(text, old, new):
+    assert legacy_classify_intent(text) == old
+    assert classify_intent(text) == new
+
+
+@pytest.mark.parametrize("text, gold", [
+    ("where is the robotics lab", "directory"),
+    ("who is professor sharma", "contact"),
+    ("thank you, bye", "close"),
+    ("hey", "greeting"),
+    ("what is the weather like today", "out_of_scope"),
+])
+def test_unchanged_from_legacy(text, gold):
+    assert legacy_classify_intent(text) == classify_intent(text) == gold
+
+
+def test_batch_matches_single_queries():
+    queries = corpus(2000, seed=1) + ["", "hi\nthere"]
+    assert classify_intents(queries) == [classify_intent(q.replace("\n", " ")) for q in queries]
+
+
+def test_batch_of_nothing():
+    assert classify_intents([]) == []
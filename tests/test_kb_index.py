@@ -0,0 +1,53 @@
+import pytest
+
+import format
+from kb_index import KBIndex, tokenize
+from kb_store import KBSnapshot
+
+DIRECTORY = ("rooms", "labs")
+
+
+@pytest.fixture(scope="module")
+def snap(kb_data):
+    return KBSnapshot.build(kb_data)
+
+
+def keys(hits):
+    return [key for _, _, key, _ in hits]
+
+
+def test_tokenize_drops_stop_words():
+    assert "where" not in tokenize("where is the MIDAS lab")
+    assert "midas" in tokenize("where is the MIDAS lab")
+
+
+@pytest.mark.parametrize("query, sections, top", [
+    ("where is the midas lab", DIRECTORY, "MIDAS_Lab"),
+    ("who is jainendra shukla", ("contacts",), "Jainendra_Shukla"),
+    ("when is the canteen open", ("hours",), "canteen"),
+])
+def test_exact_tokens_rank_first(snap, query, sections, top):
+    assert keys(snap.index.search(query, sections))[0] == top
+
+
+def test_generic_only_query_falls_back_to_generic_entries(snap):
+    hits = keys(format.search_kb("where is the lab", DIRECTORY, snap))
+    assert hits and all(key in snap.data["labs"] for key in hits)
+
+
+@pytest.mark.parametrize("query", [
+    "where is room A-410",
+    "find the innovation lab",
+    "where is the cafeteria lab",
+])
+def test_unknown_words_do_not_hit_on_generic_words(snap, query):
+    assert format.search_kb(query, DIRECTORY, snap) == []
+
+
+def test_updated_rebuilds_only_changed_sections(kb_data):
+    index = KBIndex(kb_data)
+    edited = dict(kb_data, labs=dict(kb_data["labs"], Zephyr_Lab={"name": "Zephyr Lab", "location": "Block Z"}))
+    new = index.updated(edited, ["labs"])
+    assert keys(new.search("zephyr lab", DIRECTORY))[0] == "Zephyr_Lab"
+    assert not index.search("zephyr lab", DIRECTORY, common_fallback=False)
+    assert new.sections["rooms"] is index.sections["rooms"]
@@ -0,0 +1,96 @@
+import copy
+import json
+import os
+
+import pytest
+
+import format
+from kb_store import KBSnapshot, KBStore, parse_sections
+
+
+def write_kb(path, data):
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+@pytest.fixture
+def store(tmp_path, kb_data):
+    path = tmp_path / "kb.json"
+    write_kb(path, kb_data)
+    store = KBStore(str(path))
+    store.load()
+    return store
+
+
+def test_parse_sections_keeps_each_section_text():
+    data, raw = parse_sections('{"labs": {"a": {"name": "A Lab"}} ,\n "hours": {"gym": "9-5"}}\n')
+    assert data == {"labs": {"a": {"name": "A Lab"}}, "hours": {"gym": "9-5"}}
+    assert raw == {"labs": '{"a": {"name": "A Lab"}}', "hours": '{"gym": "9-5"}'}
+    for broken in ('[]', '{"labs": {}', '{"labs": {}} x', '{"labs" {}}'):
+        with pytest.raises(ValueError):
+            parse_sections(broken)
+
+
+def test_unchanged_file_is_not_reloaded(store):
+    assert store.reload() is None
+    assert store.current.version == 1
+
+
+def test_reload_rebuilds_only_the_edited_section(store, kb_data):
+    before = store.current
+    edited = copy.deepcopy(kb_data)
+    edited["labs"]["Zephyr_Lab"] = {"name": "Zephyr Lab", "location": "Block Z, Room 999"}
+    write_kb(store.path, edited)
+
+    snap = store.reload()
+    assert snap is store.current and snap.version == 2
+    assert snap.changed == ["labs"]
+    assert snap.index.sections["contacts"] is before.index.sections["contacts"]
+    assert snap.matcher.sections["contacts"] is before.matcher.sections["contacts"]
+    assert [key for _, _, key, _ in format.search_kb("where is zephyr lab", ("rooms", "labs"), snap)] == ["Zephyr_Lab"]
+    # readers holding the old snapshot keep a consistent view
+    assert format.search_kb("where is zephyr lab", ("rooms", "labs"), before) == []
+
+
+@pytest.mark.parametrize("query, sections", [
+    ("where is iris lab", ("rooms", "labs")),
+    ("where is the lab", ("rooms", "labs")),
+    ("where is room A-410", ("rooms", "labs")),
+    ("who is jeynendra shukla", ("contacts",)),
+])
+def test_reload_matches_full_build(kb_data, query, sections):
+    edited = copy.deepcopy(kb_data)
+    edited["rooms"]["999"] = {"name": "Seminar Hall", "location": "Block D, ground floor"}
+    reloaded = KBSnapshot.build(edited, KBSnapshot.build(kb_data))
+    assert format.search_kb(query, sections, reloaded) == format.search_kb(query, sections, KBSnapshot.build(edited))
+
+
+def test_unchanged_sections_are_shared_when_another_is_reformatted(store, kb_data):
+    before = store.current
+    text = json.dumps(kb_data)
+    labs = json.dumps(kb_data["labs"])
+    with open(store.path, "w") as f:
+        f.write(text.replace(labs, json.dumps(kb_data["labs"], indent=2)))
+    snap = store.reload()
+    assert snap.changed == ["labs"]
+    assert snap.index.sections["contacts"] is before.index.sections["contacts"]
+
+
+def test_broken_file_keeps_the_current_snapshot(store):
+    before = store.current
+    with open(store.path, "w") as f:
+        f.write('{"labs": {')
+    assert store.reload() is None
+    assert store.current is before
+
+
+def test_on_reload_callbacks_get_the_new_snapshot(store, kb_data):
+    seen = []
+    store.on_reload.append(seen.append)
+    edited = copy.deepcopy(kb_data)
+    edited["hours"]["gym"] = "6 AM - 10 PM"
+    write_kb(store.path, edited)
+    snap = store.reload()
+    assert seen == [snap] and snap.changed == ["hours"]
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+import format
+from cache import ResponseCache, SemanticCache
+from fake_llm import FakeClient
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(format, "response_cache", ResponseCache(path=None))
+    monkeypatch.setattr(format, "semantic_cache", SemanticCache(path=None))
+    monkeypatch.setattr(format, "STREAM_STALL_S", 0.3)
+    monkeypatch.setattr(format, "KB_PATH", os.path.join(os.path.dirname(format.__file__), "kb.json"))
+    monkeypatch.setattr(format, "KB_WATCH_S", None)
+
+    def use(**kw):
+        client = FakeClient(**kw)
+        monkeypatch.setattr(format, "client", client)
+        return client
+    return use
+
+
+def wait_closed(client, timeout=1.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not all(s.closed.is_set() for s in client.streams):
+        time.sleep(0.01)
+    return [s.closed.is_set() for s in client.streams]
+
+
+def test_stalled_stream_ends_with_text_so_far(fake):
+    client = fake(delay_s=0.05, chunk_delay_s=0.0, stall_after=4)
+    t0 = time.time()
+    sentences, _ = format.plan_reply_stream("what is the capital of france")
+    assert "".join(sentences) == "I am a test"
+    assert time.time() - t0 < 2.0
+    assert wait_closed(client) == [True]
+    # a cut-off reply is not cached
+    assert format.semantic_cache.get("what is the capital of france") is None
+
+
+def test_complete_stream_is_cached(fake):
+    fake(delay_s=0.05, chunk_delay_s=0.0)
+    sentences, _ = format.plan_reply_stream("what is the capital of france")
+    assert list(sentences)[-1] == "Please ask at the front desk."
+    assert format.semantic_cache.get("what is the capital of france") is not None
+
+
+def test_losing_hedge_is_closed(fake, monkeypatch):
+    monkeypatch.setattr(format, "HEDGE_AFTER_S", 0.1)
+    client = fake(delay_s=0.05, slow_every=2, slow_delay_s=30.0, chunk_delay_s=0.0)
+    next(client.calls)              # the first request is the slow one
+    sentences, _ = format.plan_reply_stream("what is the capital of france", budget=2.0)
+    list(sentences)
+    assert len(client.streams) == 2
+    assert wait_closed(client) == [True, True]
+
+
+def test_abandoned_stream_is_closed(fake):
+    client = fake(delay_s=0.05, chunk_delay_s=0.05)
+    sentences, _ = format.plan_reply_stream("what is the capital of france")
+    next(sentences)
+    sentences.close()
+    assert wait_closed(client) == [True]
@@ -0,0 +1,70 @@
+import pytest
+
+from name_match import NameMatcher, levenshtein, soundex
+
+
+@pytest.fixture(scope="module")
+def matcher(kb_data):
+    return NameMatcher(kb_data)
+
+
+def top_key(hits):
+    return hits[0][2] if hits else None
+
+
+def test_soundex_groups_sound_alikes():
+    assert soundex("shukla") == soundex("shookla")
+    assert soundex("robert") != soundex("midas")
+
+
+def test_levenshtein():
+    assert levenshtein("iras", "iris") == 1
+    assert levenshtein("", "lab") == 3
+
+
+@pytest.mark.parametrize("query, sections, top", [
+    ("iris", ("rooms", "labs"), "IRAS_Lab"),
+    ("meedas", ("rooms", "labs"), "MIDAS_Lab"),
+    ("jeynendra shukla", ("contacts",), "Jainendra_Shukla"),
+    ("rajeev shah", ("contacts",), "Rajiv_Ratan_Shah"),
+])
+def test_misheard_names(matcher, query, sections, top):
+    assert top_key(matcher.match(query, sections)) == top
+
+
+def test_generic_words_match_nothing(matcher):
+    # "lab" names most labs, so it cannot pick one
+    assert matcher.match("lab", ("rooms", "labs")) == []
+    assert matcher.match("lbs", ("rooms", "labs")) == []
+
+
+def test_generic_words_are_kb_wide(kb_data):
+    # a word generic in one section ("lab") is dropped from the others too
+    kb = dict(kb_data, rooms=dict(kb_data["rooms"], **{"999": {"name": "Lab Annexe", "location": "Block D"}}))
+    matcher = NameMatcher(kb)
+    assert top_key(matcher.match("lab", ("rooms",))) is None
+
+
+def test_updated_matches_full_build(kb_data):
+    edited = dict(kb_data, contacts=dict(kb_data["contacts"],
+                                         Zoya_Qureshi={"name": "Zoya Qureshi", "email": "zq@iiitd.ac.in",
+                                                       "office": "B-999"}))
+    before = NameMatcher(kb_data)
+    reloaded = before.updated(edited, ["contacts"])
+    full = NameMatcher(edited)
+    assert top_key(reloaded.match("zoya kureshi", ("contacts",))) == "Zoya_Qureshi"
+    for query in ("iris", "jeynendra shukla", "zoya kureshi"):
+        assert reloaded.match(query, ("rooms", "labs", "contacts")) == full.match(query, ("rooms", "labs", "contacts"))
+    assert reloaded.sections["labs"] is before.sections["labs"]
+
+
+def test_updated_keeps_other_sections_when_generic_words_change(kb_data):
+    contacts = dict(kb_data["contacts"])
+    for i in range(40):
+        contacts[f"visiting_{i}"] = {"name": f"Visiting Fellow {i}", "email": "", "office": ""}
+    edited = dict(kb_data, contacts=contacts)
+    before = NameMatcher(kb_data)
+    reloaded = before.updated(edited, ["contacts"])
+    assert "visiting" in reloaded.generic and "visiting" not in before.generic
+    assert reloaded.sections["labs"] is before.sections["labs"]
+    assert reloaded.match("visiting", ("contacts",)) == NameMatcher(edited).match("visiting", ("contacts",)) == []
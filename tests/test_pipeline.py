@@ -0,0 +1,59 @@
+import threading
+import time
+
+import numpy as np
+
+from pipeline import Stage, Turn, chain
+
+
+def run(turns, *stages):
+    done, dropped = [], []
+    finished = threading.Event()
+
+    def on_done(turn):
+        done.append(dict(turn.stage_ms))
+        if len(done) + len(dropped) == len(turns):
+            finished.set()
+
+    def on_drop(turn):
+        dropped.append(turn)
+        if len(done) + len(dropped) == len(turns):
+            finished.set()
+
+    stages[-1].on_done = on_done
+    head = chain(*stages, on_drop=on_drop)
+    for turn in turns:
+        head.put(turn)
+    assert finished.wait(5.0)
+    return done, dropped
+
+
+def turn(idx=1):
+    return Turn(idx, np.zeros(1600, dtype=np.int16), 16000)
+
+
+def test_stage_time_is_set_when_the_turn_is_handed_on_early():
+    def plan(t):
+        time.sleep(0.05)
+        early.emit(t)               # e.g. first streamed sentence
+        time.sleep(0.3)             # keeps producing after the hand-off
+        return None
+
+    early = Stage("plan", plan)
+    speak = Stage("speak", lambda t: t)
+    (stage_ms,), dropped = run([turn()], early, speak)
+    assert not dropped
+    assert 40 <= stage_ms["plan"] < 300
+    assert "speak" in stage_ms
+
+
+def test_dropped_turns_get_their_stage_time():
+    (_, dropped) = run([turn()], Stage("stt", lambda t: time.sleep(0.02)))
+    assert dropped[0].stage_ms["stt"] >= 15
+
+
+def test_turns_stay_in_order():
+    stage_order = []
+    stages = [Stage("a", lambda t: t), Stage("b", lambda t: stage_order.append(t.idx) or t)]
+    done, _ = run([turn(i) for i in range(20)], *stages)
+    assert stage_order == list(range(20)) and len(done) == 20
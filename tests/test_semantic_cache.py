@@ -0,0 +1,67 @@
+import pytest
+
+import format
+from bench_semantic_cache import PAIRS
+from cache import SemanticCache, same_content
+
+
+@pytest.mark.parametrize("stored, query, same", PAIRS)
+def test_labelled_pairs(stored, query, same):
+    cache = SemanticCache(threshold=format.SEMANTIC_CACHE_THRESHOLD)
+    cache.put(stored, "answer")
+    assert (cache.get(query) == "answer") is same
+
+
+def test_same_content_tolerates_spelling():
+    assert same_content("wifi password", "wi fi password")
+    assert same_content("colour logo", "color logo")
+    assert not same_content("btech fee", "mtech fee")
+
+
+def test_stats_count_hits_and_misses():
+    cache = SemanticCache()
+    cache.put("tell me a joke", "answer", cost_ms=800.0)
+    assert cache.get("can you tell me a joke") == "answer"
+    assert cache.get("tell me a fact") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["llm_ms_saved"]) == (1, 1, 800.0)
+
+
+def test_best_match_naming_other_things_is_skipped():
+    # "mtech fee" scores 0.75 but names another course; "b tech fees" (0.67) matches
+    cache = SemanticCache(threshold=0.6)
+    cache.put("b tech fees", "btech")
+    cache.put("what is the mtech fee", "mtech")
+    assert cache.get("what is the btech fee") == "btech"
+
+
+def test_expired_answers_miss():
+    cache = SemanticCache(ttl_s=-1)
+    cache.put("tell me a joke", "answer")
+    assert cache.get("tell me a joke") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.put("tell me a joke", "joke")
+    cache.put("what is the wifi password", "wifi")
+    assert cache.get("tell me a joke") == "joke"
+    cache.put("how far is the airport", "airport")
+    assert cache.get("what is the wifi password") is None
+    assert cache.get("tell me a joke") == "joke"
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "semantic_cache.json")
+    cache = SemanticCache(path=path)
+    cache.put("tell me a joke", "answer")
+    cache.save()
+    assert SemanticCache(path=path).get("can you tell me a joke") == "answer"
+
+
+def test_clear_forgets_answers():
+    cache = SemanticCache()
+    cache.put("tell me a joke", "answer")
+    cache.clear()
+    assert cache.get("tell me a joke") is None